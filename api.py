@@ -3,18 +3,57 @@
 104爬蟲API - 供Make.com或其他服務呼叫
 """
 
-from flask import Flask, jsonify, request
-import subprocess
+from flask import Flask, Response, jsonify, request, send_file
 import os
-import glob
 from datetime import datetime
+import gzip
+import hashlib
 import json
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from scraper.downloads import FORMATS as DOWNLOAD_FORMATS, open_variant
+from scraper.jobindex import JobIndex
+from scraper.manifest import find_output, latest_output, load_manifest
+from scraper.progress import CrawlProgress
+from scraper.runner import start_crawl
+from scraper.salary import GROUP_FIELDS, latest_columns, load_columns, salary_stats
+from scraper.storage import JobDatabase
 
 app = Flask(__name__)
 
 # 設定爬蟲專案路徑
 SCRAPER_PATH = os.path.dirname(os.path.abspath(__file__))
 
+# 爬蟲執行超過這個時間 (秒) 就停止
+CRAWL_TIMEOUT = 600
+
+# 保留最近幾次爬取的進度與結果 (crawl_id -> CrawlProgress)
+# 只存在這個行程的記憶體中: 必須以單一行程執行 (gunicorn -w 1 --worker-class gthread),
+# 多個 worker 時查詢進度的請求可能被分到沒有這個爬取的 worker
+MAX_CRAWLS = 100
+crawls = {}
+crawls_lock = threading.Lock()
+
+# /jobs 查詢索引與下載版本的目錄 (和爬蟲的 STATE_DIR 相同)
+STATE_DIR = os.getenv("STATE_DIR", ".jobscout")
+
+# /jobs 每頁最多幾筆
+MAX_PAGE_SIZE = 200
+
+# 小於這個大小的回應不壓縮
+MIN_COMPRESS_SIZE = 1024
+
+# 最近的 /jobs 回應 (ETag, 編碼) -> 已壓縮的內容;輸出檔不會變動,同樣的查詢不需要重新查詢與壓縮
+MAX_CACHED_RESPONSES = 256
+responses = OrderedDict()
+responses_lock = threading.Lock()
+
 @app.route('/')
 def index():
     """API首頁"""
@@ -23,66 +62,37 @@ def index():
         'version': '1.0',
         'endpoints': {
             'trigger': '/trigger-scraper (POST)',
+            'crawl': '/crawls/<crawl_id> (GET)',
+            'crawl_events': '/crawls/<crawl_id>/events (GET, SSE)',
             'status': '/status (GET)',
-            'latest': '/latest-file (GET)'
+            'latest': '/latest-file (GET)',
+            'jobs': '/jobs (GET)',
+            'download': '/download/<csv|ndjson|parquet> (GET)',
+            'salary_stats': '/salary-stats (GET)'
         }
     })
 
 @app.route('/trigger-scraper', methods=['POST'])
 def trigger_scraper():
-    """觸發爬蟲執行"""
+    """啟動爬蟲後立即回傳 crawl_id,進度由 /crawls/<crawl_id>/events (SSE) 或 /crawls/<crawl_id> 取得"""
     try:
         print(f"[{datetime.now()}] 收到爬蟲觸發請求")
-        
-        # 執行爬蟲
-        result = subprocess.run(
-            ['scrapy', 'crawl', '104_ai_jobs'],
-            cwd=SCRAPER_PATH,
-            capture_output=True,
-            text=True,
-            timeout=600  # 10分鐘超時
-        )
-        
-        # 檢查執行結果
-        if result.returncode != 0:
-            return jsonify({
-                'status': 'error',
-                'message': '爬蟲執行失敗',
-                'error': result.stderr
-            }), 500
-        
-        # 找到最新的CSV檔案
-        csv_files = sorted(glob.glob(os.path.join(SCRAPER_PATH, 'ai_jobs_*.csv')))
-        
-        if not csv_files:
-            return jsonify({
-                'status': 'error',
-                'message': '找不到輸出的CSV檔案'
-            }), 500
-        
-        latest_csv = os.path.basename(csv_files[-1])
-        
-        # 計算職缺數量
-        with open(csv_files[-1], 'r', encoding='utf-8') as f:
-            job_count = sum(1 for line in f) - 1  # 扣除標題行
-        
-        print(f"[{datetime.now()}] 爬蟲執行成功,產生檔案: {latest_csv}")
-        
+
+        # 在背景執行爬蟲,不佔用處理請求的執行緒
+        handle = start_crawl(output_dir=SCRAPER_PATH, collect_items=False)
+        _add_crawl(CrawlProgress(handle, timeout=CRAWL_TIMEOUT))
+
+        print(f"[{datetime.now()}] 爬蟲已啟動: {handle.crawl_id}")
+
         return jsonify({
-            'status': 'success',
-            'message': '爬蟲執行完成',
-            'csv_file': latest_csv,
-            'full_path': csv_files[-1],
-            'job_count': job_count,
+            'status': 'started',
+            'message': '爬蟲已開始執行',
+            'crawl_id': handle.crawl_id,
+            'status_url': f'/crawls/{handle.crawl_id}',
+            'events_url': f'/crawls/{handle.crawl_id}/events',
             'timestamp': datetime.now().isoformat()
-        })
-        
-    except subprocess.TimeoutExpired:
-        return jsonify({
-            'status': 'error',
-            'message': '爬蟲執行超時(>10分鐘)'
-        }), 500
-        
+        }), 202
+
     except Exception as e:
         print(f"[{datetime.now()}] 錯誤: {str(e)}")
         return jsonify({
@@ -90,20 +100,69 @@ def trigger_scraper():
             'message': f'執行錯誤: {str(e)}'
         }), 500
 
+def _add_crawl(progress):
+    """記錄爬取,超過 MAX_CRAWLS 筆時移除最舊的已結束爬取"""
+    with crawls_lock:
+        crawls[progress.crawl_id] = progress
+        finished = [crawl_id for crawl_id, p in crawls.items() if p.done]
+        for crawl_id in finished[:max(len(crawls) - MAX_CRAWLS, 0)]:
+            del crawls[crawl_id]
+
+@app.route('/crawls/<crawl_id>', methods=['GET'])
+def get_crawl(crawl_id):
+    """爬取的目前進度,結束後為結果 (status: running / finished / timeout / failed)"""
+    progress = crawls.get(crawl_id)
+    if progress is None:
+        return jsonify({'status': 'error', 'message': f'找不到爬取: {crawl_id}'}), 404
+    return jsonify(progress.snapshot)
+
+@app.route('/crawls/<crawl_id>/events', methods=['GET'])
+def crawl_events(crawl_id):
+    """以 Server-Sent Events 推送爬取進度
+
+    事件: progress (頁數、職缺數、目前的關鍵字等,有變化時才送出)、done (結束時的結果,之後連線關閉)
+    """
+    progress = crawls.get(crawl_id)
+    if progress is None:
+        return jsonify({'status': 'error', 'message': f'找不到爬取: {crawl_id}'}), 404
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_id = 0
+    return Response(progress.subscribe(last_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 不讓 nginx 緩衝事件
+    })
+
 @app.route('/status', methods=['GET'])
 def get_status():
     """取得API狀態"""
-    csv_files = glob.glob(os.path.join(SCRAPER_PATH, 'ai_jobs_*.csv'))
-    
-    if csv_files:
-        latest_file = max(csv_files, key=os.path.getctime)
-        file_time = datetime.fromtimestamp(os.path.getctime(latest_file))
-        
+    # 有資料庫 (SQLITE_ENABLED=true) 時從執行紀錄取得最後一次爬取的資訊
+    db = JobDatabase.open_existing()
+    if db is not None:
+        try:
+            run = db.latest_run()
+            if run is not None:
+                return jsonify({
+                    'status': 'online',
+                    'last_scrape': run['finished_at'],
+                    'last_run': run,
+                    'total_jobs': db.count_jobs(),
+                    'database': db.path
+                })
+        finally:
+            db.close()
+
+    # 從輸出檔索引取得最新的輸出檔,不需要掃描目錄
+    manifest = load_manifest(SCRAPER_PATH)
+    if manifest is not None:
+        latest = manifest['latest']
         return jsonify({
             'status': 'online',
-            'last_scrape': file_time.isoformat(),
-            'latest_file': os.path.basename(latest_file),
-            'total_files': len(csv_files)
+            'last_scrape': latest['finished_at'],
+            'latest_file': latest['file'],
+            'job_count': latest['row_count'],
+            'total_files': len(manifest['runs'])
         })
     else:
         return jsonify({
@@ -115,34 +174,215 @@ def get_status():
 @app.route('/latest-file', methods=['GET'])
 def get_latest_file():
     """取得最新CSV檔案資訊"""
-    csv_files = glob.glob(os.path.join(SCRAPER_PATH, 'ai_jobs_*.csv'))
-    
-    if not csv_files:
+    latest = latest_output(SCRAPER_PATH)
+
+    if latest is None:
         return jsonify({
             'status': 'error',
             'message': '找不到CSV檔案'
         }), 404
-    
-    latest_file = max(csv_files, key=os.path.getctime)
-    file_time = datetime.fromtimestamp(os.path.getctime(latest_file))
-    
-    # 讀取前5筆資料作為預覽
-    preview_data = []
-    with open(latest_file, 'r', encoding='utf-8') as f:
-        import csv
-        reader = csv.DictReader(f)
-        for i, row in enumerate(reader):
-            if i >= 5:
-                break
-            preview_data.append(row)
-    
+
+    # 筆數、大小與前5筆預覽都在爬取結束時記錄在輸出檔索引中
+    return jsonify({
+        'status': 'success',
+        'filename': latest['file'],
+        'full_path': latest['path'],
+        'created_at': latest['finished_at'],
+        'file_size': latest['byte_size'],
+        'job_count': latest['row_count'],
+        'format': latest['format'],
+        'fields': latest['fields'],
+        'checksum': latest['checksum'],
+        'params': latest['params'],
+        'crawl_id': latest['crawl_id'],
+        'preview': latest['preview'],
+        'downloads': {fmt: f"/download/{fmt}?run={latest['file']}" for fmt in DOWNLOAD_FORMATS}
+    })
+
+@app.route('/jobs', methods=['GET'])
+def get_jobs():
+    """查詢輸出檔中的職缺 (篩選、排序、分頁)
+
+    參數: run=crawl_id 或檔名 (預設為最近一次爬取)、keyword、company、area (地區前綴,例如 台北市)、
+    salary_min / salary_max、remote=none|full|partial、since / until (appearDate,2025-01-01 或 20250101)、
+    sort=appearDate|salaryLow|salaryHigh|applyCnt (前面加 - 表示由大到小,預設 -appearDate)、
+    limit (預設 50,最多 200)、cursor (上一頁回傳的 next_cursor)
+
+    回應有 ETag,客戶端帶 If-None-Match 重新查詢時,輸出檔和參數都沒變就回傳 304;
+    依 Accept-Encoding 以 br 或 gzip 壓縮。
+    """
+    entry, error = _requested_output()
+    if error is not None:
+        return error
+
+    # 輸出檔寫完就不會變動,ETag 由輸出檔的 sha256 和查詢參數決定,不需要查詢就能判斷是否為 304
+    encoding = _accepted_encoding()
+    params = sorted((key, value) for key, value in request.args.items(multi=True) if key != 'run')
+    digest = hashlib.sha256(json.dumps([entry['checksum'], params], ensure_ascii=False).encode('utf-8'))
+    etag = digest.hexdigest()[:32]
+    matched = _matching_etag(etag)
+    if matched is not None:
+        response = Response(status=304)
+        response.set_etag(matched)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    with responses_lock:
+        cached = responses.get((etag, encoding))
+        if cached is not None:
+            responses.move_to_end((etag, encoding))
+    if cached is not None:
+        return _jobs_response(*cached, etag)
+
+    try:
+        limit = min(int(request.args.get('limit', 50)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit 必須大於 0")
+        salary_min, salary_max = (
+            int(request.args[key]) if request.args.get(key) else None for key in ('salary_min', 'salary_max'))
+        index = JobIndex.open(entry, STATE_DIR)
+        try:
+            jobs, total, next_cursor = index.query(
+                keyword=request.args.get('keyword'),
+                company=request.args.get('company'),
+                area=request.args.get('area'),
+                salary_min=salary_min,
+                salary_max=salary_max,
+                remote=request.args.get('remote') or None,
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                sort=request.args.get('sort') or '-appearDate',
+                limit=limit,
+                cursor=request.args.get('cursor'),
+            )
+        finally:
+            index.close()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    body = json.dumps({
+        'status': 'success',
+        'source': {'file': entry['file'], 'crawl_id': entry['crawl_id'], 'finished_at': entry['finished_at']},
+        'total': total,
+        'count': len(jobs),
+        'jobs': jobs,
+        'next_cursor': next_cursor
+    }, ensure_ascii=False).encode('utf-8')
+    accepted = encoding
+    if len(body) < MIN_COMPRESS_SIZE:
+        encoding = None
+    elif encoding == 'br':
+        body = brotli.compress(body, quality=5)
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=6)
+    with responses_lock:
+        responses[(etag, accepted)] = (body, encoding)
+        while len(responses) > MAX_CACHED_RESPONSES:
+            responses.popitem(last=False)
+    return _jobs_response(body, encoding, etag)
+
+def _requested_output():
+    """run 參數 (crawl_id 或檔名) 指定的輸出檔紀錄,沒有指定時為最近一次爬取;回傳 (紀錄, 錯誤回應)"""
+    run = request.args.get('run')
+    if run:
+        entry = find_output(SCRAPER_PATH, crawl_id=run) or \
+            find_output(SCRAPER_PATH, path=os.path.join(SCRAPER_PATH, os.path.basename(run)))
+        if entry is None or not os.path.exists(entry['path']):
+            return None, (jsonify({'status': 'error', 'message': f'找不到輸出檔: {run}'}), 404)
+    else:
+        entry = latest_output(SCRAPER_PATH)
+        if entry is None:
+            return None, (jsonify({'status': 'error', 'message': '尚未執行過爬蟲'}), 404)
+    return entry, None
+
+def _accepted_encoding():
+    """依 Accept-Encoding 選擇壓縮方式 (br 優先,沒有安裝 brotli 時用 gzip)"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def _matching_etag(etag):
+    """If-None-Match 中和 etag 相同的 ETag (不分壓縮方式);沒有時回傳 None"""
+    if request.if_none_match.star_tag:
+        return etag
+    for tag in request.if_none_match.as_set(include_weak=True):
+        if tag.split('-', 1)[0] == etag:
+            return tag
+    return None
+
+def _jobs_response(body, encoding, etag):
+    response = Response(body, mimetype='application/json')
+    # 不同壓縮方式的內容不同,強 ETag 要跟著不同
+    response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/download/<fmt>', methods=['GET'])
+def download(fmt):
+    """下載輸出檔 (fmt: csv / ndjson / parquet),參數: run=crawl_id 或檔名 (預設為最近一次爬取)
+
+    回應預先壓縮好的檔案 (Accept-Encoding 有 zstd 或 gzip 時),支援 Range 續傳與 If-None-Match / If-Range。
+    """
+    entry, error = _requested_output()
+    if error is not None:
+        return error
+    try:
+        variant = open_variant(entry, STATE_DIR, fmt, request.accept_encodings)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    name = os.path.splitext(entry['file'])[0] + DOWNLOAD_FORMATS[fmt][1]
+    return _send_variant(variant, name)
+
+def _send_variant(variant, download_name):
+    """以檔案回應下載版本 (由 werkzeug 處理 Range 與條件式請求,不把檔案讀進記憶體)"""
+    response = send_file(
+        variant['path'],
+        mimetype=variant['mimetype'],
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=variant['etag']
+    )
+    if variant['encoding']:
+        response.headers['Content-Encoding'] = variant['encoding']
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/salary-stats', methods=['GET'])
+def get_salary_stats():
+    """最近一次爬取的薪資統計 (換算成月薪)
+
+    參數: group_by=keyword|industry|area|city (不指定則不分組)、file=指定的CSV檔名
+    """
+    group_by = request.args.get('group_by') or None
+    if group_by is not None and group_by not in GROUP_FIELDS:
+        return jsonify({
+            'status': 'error',
+            'message': f"group_by 必須是 {', '.join(GROUP_FIELDS)} 其中之一"
+        }), 400
+
+    filename = request.args.get('file')
+    if filename:
+        path = os.path.join(SCRAPER_PATH, os.path.basename(filename))
+        if not os.path.exists(path):
+            return jsonify({'status': 'error', 'message': f'找不到檔案: {filename}'}), 404
+        source, columns = os.path.basename(path), load_columns(path)
+    else:
+        source, columns = latest_columns(SCRAPER_PATH)
+        if columns is None:
+            return jsonify({'status': 'error', 'message': '尚未執行過爬蟲'}), 404
+
     return jsonify({
         'status': 'success',
-        'filename': os.path.basename(latest_file),
-        'full_path': latest_file,
-        'created_at': file_time.isoformat(),
-        'file_size': os.path.getsize(latest_file),
-        'preview': preview_data
+        'source': source,
+        **salary_stats(columns, group_by)
     })
 
 @app.route('/health', methods=['GET'])
@@ -161,13 +401,18 @@ if __name__ == '__main__':
     print(f"API端點:")
     print(f"  - http://localhost:5000/")
     print(f"  - http://localhost:5000/trigger-scraper (POST)")
+    print(f"  - http://localhost:5000/crawls/<crawl_id>/events (GET, SSE)")
     print(f"  - http://localhost:5000/status (GET)")
     print(f"  - http://localhost:5000/latest-file (GET)")
+    print(f"  - http://localhost:5000/jobs (GET)")
+    print(f"  - http://localhost:5000/download/<csv|ndjson|parquet> (GET)")
+    print(f"  - http://localhost:5000/salary-stats (GET)")
     print("=" * 50)
     
     # 啟動Flask伺服器
     app.run(
         host='0.0.0.0',  # 允許外部存取
         port=5000,
-        debug=False
+        debug=False,
+        threaded=True  # 每個 SSE 連線佔用一個執行緒
     )
@@ -20,6 +20,10 @@ from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
 
+from scraper.downloads import FORMATS as DOWNLOAD_FORMATS, default_format, file_entry, open_variant
+from scraper.manifest import find_output
+from scraper.runner import run_crawl
+
 load_dotenv()
 
 # ============================================
@@ -71,6 +75,9 @@ app.logger.addHandler(file_handler)
 app.logger.setLevel(logging.INFO)
 app.logger.info('Scraper API startup')
 
+# 下載版本的目錄 (和爬蟲的 STATE_DIR 相同)
+STATE_DIR = os.getenv("STATE_DIR", ".jobscout")
+
 # ============================================
 # 認證裝飾器
 # ============================================
@@ -193,42 +200,28 @@ def run_scraper_task(self, task_id, keywords, pages=5, area_codes=None):
         )
         redis_client.expire(f'task:{task_id}', 86400)  # 24小時過期
         
-        # 執行爬蟲
-        # 這裡需要實際執行Scrapy
-        # 方法1: 使用subprocess
-        import subprocess
-        
-        # 建立臨時.env設定
-        temp_env = {
-            'SEARCH_KEYWORDS': ','.join(keywords),
-            'SCRAPY_PAGES_PER_KEYWORD': str(pages),
-            'AREA_CODES': ','.join(area_codes) if area_codes else ''
-        }
-        
-        # 執行scrapy
-        result = subprocess.run(
-            ['scrapy', 'crawl', '104_ai_jobs'],
-            cwd=os.path.join(os.path.dirname(__file__), 'scraper'),
-            capture_output=True,
-            text=True,
-            timeout=600,
-            env={**os.environ, **temp_env}
+        # 在同一個Worker行程內執行爬蟲,直接取得輸出檔與職缺數量
+        result = run_crawl(
+            keywords=keywords,
+            pages=pages,
+            area_codes=area_codes,
+            crawl_id=task_id,
+            task_id=task_id,  # 啟用檢查點,中斷後可用同一個任務ID接續
+            output_dir=os.path.dirname(os.path.abspath(__file__)),
+            collect_items=False,
+            timeout=600
         )
         
-        if result.returncode != 0:
-            raise Exception(f'Scraper failed: {result.stderr}')
-        
-        # 找到產生的CSV檔案
-        import glob
-        csv_files = sorted(glob.glob('ai_jobs_*.csv'))
-        if not csv_files:
+        if not result.output or not os.path.exists(result.output):
             raise Exception('No CSV file generated')
         
-        latest_csv = csv_files[-1]
+        latest_csv = result.output
+        job_count = result.item_count
         
-        # 計算職缺數量
-        with open(latest_csv, 'r', encoding='utf-8') as f:
-            job_count = sum(1 for line in f) - 1  # 扣除標題行
+        # 輸出檔索引中的筆數包含接續前已寫入的職缺,另外記錄檔案大小與 sha256
+        manifest = find_output(os.path.dirname(latest_csv), crawl_id=task_id)
+        if manifest is not None:
+            job_count = manifest['row_count']
         
         # 更新任務完成狀態
         result_data = {
@@ -236,6 +229,8 @@ def run_scraper_task(self, task_id, keywords, pages=5, area_codes=None):
             'completed_at': datetime.now().isoformat(),
             'csv_file': latest_csv,
             'job_count': job_count,
+            'file_size': manifest['byte_size'] if manifest else None,
+            'checksum': manifest['checksum'] if manifest else None,
             'keywords': keywords,
             'pages': pages,
             'area_codes': area_codes
@@ -295,6 +290,7 @@ def index():
             'scraper': {
                 'start': 'POST /api/scrape',
                 'status': 'GET /api/tasks/<task_id>',
+                'resume': 'POST /api/tasks/<task_id>/resume',
                 'result': 'GET /api/tasks/<task_id>/result',
                 'list': 'GET /api/tasks'
             },
@@ -413,6 +409,83 @@ def start_scrape():
         app.logger.error(f'Error creating task: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
+def _celery_task_active(celery_id):
+    """Celery 任務是否還在排隊或執行中
+
+    PENDING 表示還在佇列中;STARTED / PROGRESS / RETRY 時再向 worker 確認,
+    worker 被強制結束 (OOM、重啟) 時狀態會停在 PROGRESS,但已經沒有 worker 在執行。
+    """
+    state = celery.AsyncResult(celery_id).state
+    if state == 'PENDING':
+        return True
+    if state not in ('STARTED', 'PROGRESS', 'RETRY'):
+        return False
+    inspect = celery.control.inspect(timeout=1.0)
+    for method in (inspect.active, inspect.reserved, inspect.scheduled):
+        for tasks in (method() or {}).values():
+            for task in tasks:
+                if (task.get('id') or task.get('request', {}).get('id')) == celery_id:
+                    return True
+    return False
+
+@app.route('/api/tasks/<task_id>/resume', methods=['POST'])
+@limiter.limit("10 per hour")
+@require_api_key
+def resume_task(task_id):
+    """
+    接續中斷的爬蟲任務 (逾時、Worker重啟等),從檢查點繼續並寫入同一個CSV檔案
+
+    Response:
+    {
+        "task_id": "uuid",
+        "status": "pending",
+        "message": "Task resumed"
+    }
+    """
+    try:
+        task_info = redis_client.hgetall(f'task:{task_id}')
+        if not task_info:
+            return jsonify({'error': 'Task not found'}), 404
+
+        status = task_info.get(b'status', b'').decode()
+        if status == 'completed':
+            return jsonify({'error': 'Task already completed'}), 400
+
+        # 同時收到多個接續請求時只處理一個
+        if not redis_client.set(f'task:{task_id}:resuming', 1, nx=True, ex=30):
+            return jsonify({'error': 'Task is being resumed'}), 409
+        try:
+            # 原本的任務還在執行 (或排隊) 時接續,會有兩個爬蟲寫入同一個檢查點與輸出檔
+            celery_id = task_info.get(b'celery_id', task_id.encode()).decode()
+            if status != 'failed' and _celery_task_active(celery_id):
+                return jsonify({'error': f'Task is still {status or "pending"}'}), 409
+
+            keywords = json.loads(task_info[b'keywords'].decode())
+            pages = int(task_info.get(b'pages', b'5'))
+            area_codes = task_info.get(b'area_codes', b'').decode()
+            area_codes = json.loads(area_codes) if area_codes else None
+
+            app.logger.info(f'Resume scrape task: {task_id}')
+            celery_id = f'{task_id}-resume-{uuid.uuid4().hex[:8]}'
+            redis_client.hset(f'task:{task_id}', mapping={'status': 'pending', 'celery_id': celery_id})
+            run_scraper_task.apply_async(
+                args=[task_id, keywords, pages, area_codes],
+                task_id=celery_id
+            )
+        finally:
+            redis_client.delete(f'task:{task_id}:resuming')
+
+        return jsonify({
+            'task_id': task_id,
+            'status': 'pending',
+            'message': 'Task resumed',
+            'check_status_url': f'/api/tasks/{task_id}'
+        }), 202
+
+    except Exception as e:
+        app.logger.error(f'Error resuming task: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
 @app.route('/api/tasks/<task_id>', methods=['GET'])
 @require_api_key
 def get_task_status(task_id):
@@ -461,7 +534,9 @@ def get_task_status(task_id):
 @require_api_key
 def get_task_result(task_id):
     """
-    下載任務結果(CSV檔案)
+    下載任務結果,參數: format=csv|ndjson|parquet (預設和輸出檔相同)
+
+    回應預先壓縮好的檔案 (Accept-Encoding 有 zstd 或 gzip 時),支援 Range 續傳
     """
     try:
         task_info = redis_client.hgetall(f'task:{task_id}')
@@ -480,13 +555,28 @@ def get_task_result(task_id):
         if not csv_file or not os.path.exists(csv_file):
             return jsonify({'error': 'Result file not found'}), 404
         
+        # 下載版本以輸出檔索引中的 sha256 區分;沒有索引紀錄 (MANIFEST_ENABLED=false 或較早的任務) 時臨時計算
+        manifest = find_output(os.path.dirname(csv_file), crawl_id=task_id) or file_entry(csv_file)
+        
+        fmt = request.args.get('format') or default_format(manifest)
+        try:
+            variant = open_variant(manifest, STATE_DIR, fmt, request.accept_encodings)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         from flask import send_file
-        return send_file(
-            csv_file,
+        response = send_file(
+            variant['path'],
+            mimetype=variant['mimetype'],
             as_attachment=True,
-            download_name=f'jobs_{task_id}.csv',
-            mimetype='text/csv'
+            download_name=f'jobs_{task_id}{DOWNLOAD_FORMATS[fmt][1]}',
+            conditional=True,
+            etag=variant['etag']
         )
+        if variant['encoding']:
+            response.headers['Content-Encoding'] = variant['encoding']
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
         
     except Exception as e:
         app.logger.error(f'Error getting task result: {str(e)}')
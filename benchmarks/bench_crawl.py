@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+完整爬取流程的效能測試: A104Spider → CsvPipeline → CSV 輸出,對象是本機的模擬伺服器
+
+模擬伺服器 (benchmarks/fake_104.py) 在另一個行程執行,量到的 CPU 時間與記憶體只包含爬蟲本身。
+結果以 JSON 輸出 (requests/sec、items/sec、峰值 RSS、CPU 時間),可存檔追蹤效能變化。
+
+使用方式:
+    python benchmarks/bench_crawl.py
+    python benchmarks/bench_crawl.py --keywords 8 --pages 10 --latency 50
+    python benchmarks/bench_crawl.py --detail --throttle-every 40 --output result.json
+    python benchmarks/bench_crawl.py --spider-arg adaptive=1 --setting RATE_CONTROL_ENABLED=true
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(args, port):
+    """在子行程啟動模擬伺服器,等到可以連線才回傳"""
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, 'fake_104.py'),
+        '--port', str(port),
+        '--jobs', str(args.jobs),
+        '--latency', str(args.latency),
+        '--jitter', str(args.jitter),
+        '--error-rate', str(args.error_rate),
+        '--throttle-every', str(args.throttle_every),
+        '--retry-after', str(args.retry_after),
+        '--overlap', str(args.overlap),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("模擬伺服器啟動失敗")
+
+
+def peak_rss_mb():
+    """目前行程的峰值記憶體 (MB),Linux 的單位是 KB,macOS 是 bytes"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def _parse_pairs(pairs):
+    return dict(pair.split('=', 1) for pair in pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="對本機模擬伺服器執行完整爬取,量測吞吐量與資源使用")
+    parser.add_argument('--keywords', type=int, default=4, help='關鍵字數量')
+    parser.add_argument('--pages', type=int, default=10, help='每個關鍵字爬取的頁數 (1~50)')
+    parser.add_argument('--jobs', type=int, default=600, help='每個查詢的職缺總數')
+    parser.add_argument('--latency', type=float, default=0.0, help='伺服器回應延遲 (毫秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延遲的隨機浮動 (毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 500 的比例 (0~1)')
+    parser.add_argument('--throttle-every', type=int, default=0, help='每幾個請求回一次 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='429 回應的 Retry-After (秒)')
+    parser.add_argument('--overlap', type=float, default=0.0, help='各關鍵字共用的職缺比例 (0~1)')
+    parser.add_argument('--concurrency', type=int, default=16, help='CONCURRENT_REQUESTS')
+    parser.add_argument('--detail', action='store_true', help='同時抓取職缺詳細頁')
+    parser.add_argument('--spider-arg', action='append', default=[], metavar='NAME=VALUE',
+                        help='額外的爬蟲參數,例如 adaptive=1')
+    parser.add_argument('--setting', action='append', default=[], metavar='NAME=VALUE',
+                        help='額外的 Scrapy 設定,例如 RATE_CONTROL_ENABLED=true')
+    parser.add_argument('--output', help='結果另外寫入此 JSON 檔')
+    args = parser.parse_args()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_fake_server(args, port)
+    work_dir = tempfile.mkdtemp(prefix='bench_crawl_')
+
+    try:
+        import scrapy
+        from scraper import runner
+        from scraper.parsing import JSON_DECODER
+
+        settings = {
+            'DOWNLOAD_DELAY': 0,
+            'DETAIL_DOWNLOAD_DELAY': 0,
+            'RANDOMIZE_DOWNLOAD_DELAY': False,
+            'AUTOTHROTTLE_ENABLED': False,
+            'HTTPCACHE_ENABLED': False,
+            'TELNETCONSOLE_ENABLED': False,
+            'CONCURRENT_REQUESTS': args.concurrency,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': args.concurrency,
+            'STATE_DIR': os.path.join(work_dir, 'state'),
+            'LOG_LEVEL': 'WARNING',
+        }
+        settings.update(_parse_pairs(args.setting))
+        spider_args = {
+            'start_url': f"{base_url}/jobs/search/list",
+            'detail_url': f"{base_url}/job/ajax/content/{{job_id}}",
+            'allowed_domains': ['127.0.0.1'],
+            'detail': args.detail,
+        }
+        spider_args.update(_parse_pairs(args.spider_arg))
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        result = runner.run_crawl(
+            keywords=[f"基準測試{i}" for i in range(args.keywords)],
+            pages=args.pages,
+            output_dir=work_dir,
+            collect_items=False,
+            settings=settings,
+            **spider_args,
+        )
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    finally:
+        server.terminate()
+        server.wait()
+
+    stats = result.stats
+    requests = stats.get('downloader/request_count', 0)
+    items = result.item_count
+    report = {
+        'config': {
+            'keywords': args.keywords,
+            'pages': args.pages,
+            'jobs_per_query': args.jobs,
+            'latency_ms': args.latency,
+            'jitter_ms': args.jitter,
+            'error_rate': args.error_rate,
+            'throttle_every': args.throttle_every,
+            'overlap': args.overlap,
+            'concurrency': args.concurrency,
+            'detail': args.detail,
+            'spider_args': _parse_pairs(args.spider_arg),
+            'settings': _parse_pairs(args.setting),
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'scrapy': scrapy.__version__,
+            'decoder': JSON_DECODER,
+            'platform': platform.platform(),
+        },
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'requests': requests,
+        'items': items,
+        'requests_per_sec': round(requests / wall, 1) if wall else None,
+        'items_per_sec': round(items / wall, 1) if wall else None,
+        'retries': stats.get('retry/count', 0),
+        'status_counts': {
+            key.rsplit('/', 1)[-1]: value for key, value in stats.items()
+            if key.startswith('downloader/response_status_count/')
+        },
+        'output_bytes': os.path.getsize(result.output) if result.output and os.path.exists(result.output) else 0,
+        'finish_reason': stats.get('finish_reason'),
+    }
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    return 0 if report['finish_reason'] == 'finished' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
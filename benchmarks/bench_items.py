@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+item 記憶體用量測試: 比較 dict item 與精簡 item (scraper.items.JobItem) 每筆職缺佔用的記憶體
+
+資料由模擬伺服器的產生器 (benchmarks/fake_104.py) 產生,每頁各自解碼 (和實際爬取一樣每頁是新的字串),
+解析後保留所有 item,以 tracemalloc 量測留下來的記憶體。
+
+使用方式:
+    python benchmarks/bench_items.py
+    python benchmarks/bench_items.py --keywords 20 --jobs 5000
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_104 import FakeConfig, make_search_page  # noqa: E402
+from scraper import items as job_items  # noqa: E402
+from scraper.parsing import decode_page, parse_jobs  # noqa: E402
+
+
+def make_bodies(args):
+    """每個關鍵字的所有搜尋結果頁 (JSON bytes)"""
+    config = FakeConfig(jobs=args.jobs, page_size=args.page_size, description_phrases=args.description_phrases)
+    pages = -(-args.jobs // args.page_size)
+    return [
+        (keyword, json.dumps(make_search_page(config, keyword, '', page), ensure_ascii=False).encode('utf-8'))
+        for keyword in (f"關鍵字{i}" for i in range(args.keywords))
+        for page in range(1, pages + 1)
+    ]
+
+
+def measure(bodies, compact):
+    """回傳 (item 數, 保留的記憶體 bytes)"""
+    # 共用表也算在精簡 item 的用量內,每次從空的表開始
+    job_items.intern_text.values.clear()
+    job_items.intern_number.values.clear()
+    gc.collect()
+    tracemalloc.start()
+    kept = []
+    for keyword, body in bodies:
+        kept += parse_jobs(decode_page(body)["list"], keyword, compact=compact)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(kept), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 dict item 與精簡 item 的記憶體用量")
+    parser.add_argument('--keywords', type=int, default=10, help='關鍵字數')
+    parser.add_argument('--jobs', type=int, default=2000, help='每個關鍵字的職缺數')
+    parser.add_argument('--page-size', type=int, default=20, help='每頁職缺數')
+    parser.add_argument('--description-phrases', type=int, default=6, help='職缺描述由幾個片語組成')
+    args = parser.parse_args()
+
+    bodies = make_bodies(args)
+    count, before = measure(bodies, compact=False)
+    _, after = measure(bodies, compact=True)
+
+    print(json.dumps({
+        'items': count,
+        'dict_bytes_per_item': round(before / count),
+        'compact_bytes_per_item': round(after / count),
+        'reduction': f"{1 - after / before:.1%}",
+        'interned_texts': len(job_items.intern_text),
+        'interned_numbers': len(job_items.intern_number),
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
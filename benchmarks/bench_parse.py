@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+搜尋結果解析的效能測試: 比較原本逐筆解析與批次解析 (scraper.parsing) 的 jobs/sec
+
+使用方式:
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --payload 錄製的回應.json
+    python benchmarks/bench_parse.py --from-cache .jobscout/httpcache.sqlite
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper.parsing import JSON_DECODER, decode_page, parse_jobs  # noqa: E402
+
+SAMPLE_PAYLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "search_list_sample.json")
+
+
+# ============================================
+# 原本的逐筆解析 (A104Spider.parse 改版前)
+# ============================================
+
+def _get_job_role_text(role):
+    role_map = {1: '正職', 2: '兼職', 3: '高階'}
+    return role_map.get(role, '未知')
+
+
+def _get_remote_work_text(remote_type):
+    remote_map = {0: '不可遠端', 1: '完全遠端', 2: '部分遠端'}
+    return remote_map.get(remote_type, '未知')
+
+
+def _get_salary_type_text(salary_type):
+    # 日薪 (D) 為之後補上的類型,加在這裡才能和批次解析的結果比對
+    salary_map = {'H': '時薪', 'D': '日薪', 'M': '月薪', 'Y': '年薪', '': '面議'}
+    return salary_map.get(salary_type, salary_type)
+
+
+def legacy_parse(body, keyword):
+    jobs = json.loads(body)["data"]["list"]
+    items = []
+    for job in jobs:
+        items.append({
+            'search_keyword': keyword,
+            'jobName': job.get('jobName', ''),
+            'jobRole': _get_job_role_text(job.get('jobRole', '')),
+            'jobAddrNoDesc': job.get('jobAddrNoDesc', ''),
+            'jobAddress': job.get('jobAddress', ''),
+            'description': job.get('description', ''),
+            'optionEdu': job.get('optionEdu', ''),
+            'periodDesc': job.get('periodDesc', ''),
+            'applyCnt': job.get('applyCnt', 0),
+            'custName': job.get('custName', ''),
+            'coIndustryDesc': job.get('coIndustryDesc', ''),
+            'salaryLow': job.get('salaryLow', 0),
+            'salaryHigh': job.get('salaryHigh', 0),
+            'appearDate': datetime.strptime(job['appearDate'], "%Y%m%d").strftime("%Y-%m-%d") if job.get('appearDate') else '',
+            'jobLink': "https:" + job["link"]["job"].split("?")[0] if job.get('link') and job['link'].get('job') else '',
+            'remoteWorkType': _get_remote_work_text(job.get('remoteWorkType', 0)),
+            'major': ','.join(job.get('major', [])) if job.get('major') else '',
+            'salaryType': _get_salary_type_text(job.get('salaryType', '')),
+        })
+    return items
+
+
+def batch_parse(body, keyword):
+    return parse_jobs(decode_page(body)["list"], keyword)
+
+
+# ============================================
+# 測試資料
+# ============================================
+
+def _decode_body(body, headers):
+    """快取中有 Content-Encoding 的回應存的是壓縮前的原始內容 (快取在解壓縮之前),依編碼解開"""
+    encodings = [
+        encoding.strip().lower()
+        for name, values in json.loads(headers or '{}').items() if name.lower() == 'content-encoding'
+        for value in values for encoding in value.split(',')
+    ]
+    for encoding in reversed(encodings):
+        if encoding in ('gzip', 'x-gzip'):
+            body = gzip.decompress(body)
+        elif encoding == 'deflate':
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                body = zlib.decompress(body, -zlib.MAX_WBITS)
+        elif encoding == 'br':
+            import brotli
+            body = brotli.decompress(body)
+        elif encoding not in ('', 'identity'):
+            raise ValueError(f"不支援的 Content-Encoding: {encoding}")
+    return body
+
+
+def load_bodies(args):
+    """回傳要解析的回應內容 (bytes) 列表"""
+    if args.from_cache:
+        db = sqlite3.connect(args.from_cache)
+        bodies = [
+            zlib.decompress(body) if compressed else _decode_body(body, headers)
+            for body, compressed, headers in db.execute(
+                "SELECT body, compressed, headers FROM responses WHERE url LIKE '%/jobs/search/list%' AND status = 200"
+            )
+        ]
+        db.close()
+        return [b for b in bodies if b]
+    with open(args.payload, 'rb') as f:
+        return [f.read()]
+
+
+def run(parse, bodies, rounds):
+    jobs = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for body in bodies:
+            jobs += len(parse(body, 'AI工程師'))
+    elapsed = time.perf_counter() - start
+    return jobs / elapsed if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較逐筆解析與批次解析的 jobs/sec")
+    parser.add_argument('--payload', default=SAMPLE_PAYLOAD, help='錄製的 /jobs/search/list 回應 (JSON)')
+    parser.add_argument('--from-cache', help='從 HTTP 快取 (httpcache.sqlite) 讀取錄製的回應')
+    parser.add_argument('--rounds', type=int, default=2000, help='重複解析的次數')
+    args = parser.parse_args()
+
+    bodies = load_bodies(args)
+    if not bodies:
+        print("找不到可用的回應資料")
+        return 1
+
+    # 確認兩種解析方式的輸出一致
+    assert legacy_parse(bodies[0], 'k') == batch_parse(bodies[0], 'k'), "批次解析結果與原本不一致"
+
+    rounds = max(1, args.rounds // len(bodies))
+    before = run(legacy_parse, bodies, rounds)
+    after = run(batch_parse, bodies, rounds)
+
+    print(json.dumps({
+        'pages': len(bodies),
+        'rounds': rounds,
+        'decoder': JSON_DECODER,
+        'legacy_jobs_per_sec': round(before),
+        'batch_jobs_per_sec': round(after),
+        'speedup': round(after / before, 2) if before else None,
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+本機模擬的 104 API 伺服器,供效能測試使用,不會連到真正的 104 網站
+
+提供 /jobs/search/list 與 /job/ajax/content/<職缺代碼>,回應格式與 104 相同。
+同樣的參數 (seed、關鍵字、地區、頁數) 每次都產生一樣的職缺資料,
+並可設定回應延遲、錯誤率與 429 限流。
+
+使用方式:
+    python benchmarks/fake_104.py --port 8104 --jobs 600 --latency 50
+    python benchmarks/fake_104.py --error-rate 0.02 --throttle-every 50
+
+爬蟲指向這個伺服器:
+    scrapy crawl 104_ai_jobs -a start_url=http://127.0.0.1:8104/jobs/search/list \\
+        -a detail_url="http://127.0.0.1:8104/job/ajax/content/{job_id}" -a allowed_domains=127.0.0.1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ============================================
+# 產生職缺資料用的詞庫 (以中文為主,接近真實回應的內容)
+# ============================================
+
+JOB_TITLES = [
+    'AI應用工程師', 'RPA開發工程師', '數位轉型專案經理', '資料科學家', '機器學習工程師',
+    '流程自動化顧問', '生成式AI產品經理', '後端工程師(Python)', 'MLOps工程師', '資料工程師',
+]
+
+COMPANIES = [
+    ('台灣積體電路製造股份有限公司', '半導體製造業'),
+    ('鴻海精密工業股份有限公司', '電子零組件相關業'),
+    ('國泰金融控股股份有限公司', '金融控股業'),
+    ('中華電信股份有限公司', '電信業'),
+    ('趨勢科技股份有限公司', '電腦軟體服務業'),
+    ('緯創資通股份有限公司', '電腦及消費性電子製造業'),
+]
+
+DESCRIPTION_PHRASES = [
+    '負責導入生成式AI與大型語言模型(LLM)應用',
+    '與跨部門合作推動數位轉型專案',
+    '熟悉Python、SQL與雲端服務(Azure/AWS/GCP)',
+    '建置資料管線與機器學習模型並部署至雲端環境',
+    '規劃並開發RPA流程機器人,提升營運效率',
+    '分析業務流程並提出自動化改善方案',
+    '撰寫技術文件並協助教育訓練',
+    '具備良好溝通能力與問題解決能力',
+]
+
+AREAS = [
+    ('6001001005', '台北市信義區'), ('6001001001', '台北市中正區'), ('6001002003', '新北市板橋區'),
+    ('6001004001', '桃園市桃園區'), ('6001005001', '新竹市東區'), ('6001008005', '台中市西屯區'),
+    ('6001013007', '台南市永康區'), ('6001016002', '高雄市前金區'),
+]
+
+EDUCATIONS = ['不拘', '專科', '大學', '碩士']
+PERIODS = [('0', '經歷不拘'), ('1', '1年以上'), ('3', '3年以上'), ('5', '5年以上')]
+MAJORS = [['資訊工程相關'], ['資訊管理相關'], ['統計學相關', '數學相關'], []]
+SALARY_TYPES = ['M', 'M', 'M', 'Y', 'H', '']
+SKILLS = ['Python', 'SQL', 'UiPath', 'Power Automate', 'Docker', 'PyTorch', 'LangChain']
+
+
+class FakeConfig:
+    """模擬伺服器的設定"""
+
+    def __init__(self, jobs=600, page_size=20, latency=0.0, jitter=0.0, error_rate=0.0,
+                 throttle_every=0, retry_after=1, description_phrases=6, overlap=0.0, seed=104):
+        self.jobs = jobs                               # 每個查詢的職缺總數
+        self.page_size = page_size                     # 每頁職缺數
+        self.latency = latency                         # 回應延遲 (秒)
+        self.jitter = jitter                           # 延遲的隨機浮動 (秒)
+        self.error_rate = error_rate                   # 回傳 500 的比例
+        self.throttle_every = throttle_every           # 每幾個請求回一次 429,0 表示不限流
+        self.retry_after = retry_after                 # 429 回應的 Retry-After (秒)
+        self.description_phrases = description_phrases  # 職缺描述由幾個片語組成
+        self.overlap = overlap                         # 各關鍵字共用的職缺比例 (同一職缺出現在多個關鍵字)
+        self.seed = seed
+
+
+def _job_code(seed, query, index):
+    """職缺代碼 (104 的代碼是 36 進位字串)"""
+    value = zlib.crc32(f"{seed}:{query}:{index}".encode('utf-8'))
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    code = ''
+    while value:
+        value, rem = divmod(value, 36)
+        code = digits[rem] + code
+    return code or '0'
+
+
+def make_job(config, keyword, area, index):
+    """產生第 index 筆職缺,同樣的參數一定產生同樣的資料"""
+    if config.overlap and random.Random(f"{config.seed}:overlap:{index}").random() < config.overlap:
+        # 共用職缺: 每個關鍵字在同一個位置都會出現同一筆職缺
+        keyword = '共用'
+    query = f"{keyword}|{area}"
+    rng = random.Random(f"{config.seed}:{query}:{index}")
+    code = _job_code(config.seed, query, index)
+    company, industry = rng.choice(COMPANIES)
+    area_no, area_desc = rng.choice(AREAS)
+    period, period_desc = rng.choice(PERIODS)
+    salary_low = rng.choice([0, 35000, 40000, 50000, 60000, 80000])
+    # 日期隨 index 遞減,模擬依日期排序的結果
+    appear_day = 28 - (index // 10) % 28
+    link = f"//www.104.com.tw/job/{code}?jobsource=jolist_a_relevance"
+    return {
+        'jobType': '1',
+        'jobNo': str(14000000 + index),
+        'jobName': f"{rng.choice(JOB_TITLES)} ({keyword})",
+        'jobRole': rng.choice([1, 1, 1, 2, 3]),
+        'jobAddrNo': area_no,
+        'jobAddrNoDesc': area_desc,
+        'jobAddress': f"忠孝東路四段{rng.randint(1, 500)}號",
+        'description': ','.join(rng.choice(DESCRIPTION_PHRASES) for _ in range(config.description_phrases)),
+        'optionEdu': rng.choice(EDUCATIONS),
+        'period': period,
+        'periodDesc': period_desc,
+        'applyCnt': str(rng.randint(0, 60)),
+        'custName': company,
+        'custNo': str(22000000 + rng.randint(0, 999)),
+        'coIndustryDesc': industry,
+        'salaryLow': str(salary_low),
+        'salaryHigh': str(salary_low + rng.choice([0, 10000, 20000, 40000])) if salary_low else '0',
+        'appearDate': f"202501{appear_day:02d}",
+        'tags': {'wf1': {'desc': '員工旅遊'}, 'emp': {'desc': '500人以上'}},
+        'landmark': f"距捷運站約{rng.randint(1, 9)}00公尺",
+        'link': {
+            'applyAnalyze': f"//www.104.com.tw/jobs/apply/analysis/{code}?channel=104rpt&jobsource=apply_analyze",
+            'job': link,
+            'cust': f"//www.104.com.tw/company/{code}?jobsource=jolist_a_relevance",
+        },
+        'remoteWorkType': rng.choice([0, 0, 1, 2]),
+        'major': rng.choice(MAJORS),
+        'salaryType': rng.choice(SALARY_TYPES),
+    }
+
+
+def make_search_page(config, keyword, area, page):
+    """產生 /jobs/search/list 的回應內容"""
+    total_page = -(-config.jobs // config.page_size)
+    start = (page - 1) * config.page_size
+    jobs = [make_job(config, keyword, area, i) for i in range(start, min(start + config.page_size, config.jobs))]
+    return {'data': {
+        'query': {'keyword': keyword, 'page': page},
+        'filterQuery': {},
+        'list': jobs,
+        'count': len(jobs),
+        'pageNo': page,
+        'totalPage': total_page,
+        'totalCount': config.jobs,
+    }}
+
+
+def make_detail(config, job_id):
+    """產生 /job/ajax/content/<職缺代碼> 的回應內容"""
+    rng = random.Random(f"{config.seed}:detail:{job_id}")
+    return {'data': {
+        'jobDetail': {'jobDescription': '\n'.join(rng.choice(DESCRIPTION_PHRASES) for _ in range(12))},
+        'condition': {
+            'workExp': rng.choice(PERIODS)[1],
+            'specialty': [{'description': s} for s in rng.sample(SKILLS, 2)],
+            'skill': [{'description': s} for s in rng.sample(SKILLS, 1)],
+            'other': '具備良好溝通能力與問題解決能力',
+        },
+        'welfare': {'welfare': '年終獎金、員工旅遊、彈性上下班、遠端工作'},
+    }}
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        config = server.config
+        index = server.next_request()
+
+        if config.latency or config.jitter:
+            time.sleep(config.latency + server.random(index) * config.jitter)
+        if config.throttle_every and index % config.throttle_every == 0:
+            return self._send(429, b'', {'Retry-After': str(config.retry_after)})
+        if config.error_rate and server.random(index + 1_000_000) < config.error_rate:
+            return self._send(500, b'')
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.rstrip('/').endswith('/jobs/search/list'):
+            page = int(query.get('page', ['1'])[0])
+            payload = make_search_page(config, query.get('keyword', [''])[0], query.get('area', [''])[0], page)
+        elif '/job/ajax/content/' in url.path:
+            payload = make_detail(config, url.path.rstrip('/').rsplit('/', 1)[-1])
+        else:
+            return self._send(404, b'')
+        self._send(200, json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                   {'Content-Type': 'application/json; charset=utf-8'})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeServer(ThreadingHTTPServer):
+    """模擬伺服器,可在背景執行緒啟動 (start) 或直接執行 (serve_forever)"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, config=None):
+        super().__init__((host, port), FakeRequestHandler)
+        self.config = config or FakeConfig()
+        self._lock = threading.Lock()
+        self.request_count = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_request(self):
+        with self._lock:
+            self.request_count += 1
+            return self.request_count
+
+    def random(self, index):
+        """依請求序號產生 0~1 的固定亂數"""
+        return random.Random(f"{self.config.seed}:{index}").random()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-104", daemon=True).start()
+        return self
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="本機模擬的 104 API 伺服器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8104)
+    parser.add_argument('--jobs', type=int, default=600, help='每個查詢的職缺總數')
+    parser.add_argument('--page-size', type=int, default=20, help='每頁職缺數')
+    parser.add_argument('--latency', type=float, default=0.0, help='回應延遲 (毫秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延遲的隨機浮動 (毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 500 的比例 (0~1)')
+    parser.add_argument('--throttle-every', type=int, default=0, help='每幾個請求回一次 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='429 回應的 Retry-After (秒)')
+    parser.add_argument('--description-phrases', type=int, default=6, help='職缺描述由幾個片語組成')
+    parser.add_argument('--overlap', type=float, default=0.0, help='各關鍵字共用的職缺比例 (0~1)')
+    parser.add_argument('--seed', type=int, default=104)
+    return parser
+
+
+def config_from_args(args):
+    return FakeConfig(
+        jobs=args.jobs,
+        page_size=args.page_size,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        throttle_every=args.throttle_every,
+        retry_after=args.retry_after,
+        description_phrases=args.description_phrases,
+        overlap=args.overlap,
+        seed=args.seed,
+    )
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    server = FakeServer(args.host, args.port, config_from_args(args))
+    print(f"模擬 104 API 伺服器: {server.base_url}/jobs/search/list", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
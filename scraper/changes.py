@@ -0,0 +1,133 @@
+# 職缺變動偵測: 記錄每個職缺重要欄位的指紋,比對出新增 / 變動 / 未變動 / 下架
+
+import json
+import sqlite3
+import zlib
+from hashlib import blake2b
+
+# 比對變動的欄位
+TRACKED_FIELDS = [
+    'salaryLow',
+    'salaryHigh',
+    'salaryType',
+    'description',
+    'remoteWorkType',
+    'applyCnt',
+]
+
+# 下架事件需要的額外欄位 (跟著指紋一起存)
+INFO_FIELDS = ['jobName', 'custName', 'jobLink']
+
+
+# 指紋計算方式的版本 (PRAGMA user_version),改變時開啟指紋庫會以存下的欄位重新計算
+FINGERPRINT_VERSION = 1
+
+
+def _text(value):
+    """比對用的文字: 數字不論是 '0040000' 還是 40000 (精簡 item) 都視為相同"""
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        return str(int(value))
+    return str(value)
+
+
+def fingerprint(item):
+    """TRACKED_FIELDS 的 64 位元指紋 (有號整數,可直接存進 SQLite)"""
+    text = '\x1f'.join(_text(item.get(field, '')) for field in TRACKED_FIELDS)
+    return int.from_bytes(blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def diff_fields(old, new):
+    """回傳 {欄位: [舊值, 新值]},只列出有變動的欄位"""
+    return {
+        field: [old.get(field), new.get(field)]
+        for field in TRACKED_FIELDS
+        if _text(old.get(field, '')) != _text(new.get(field, ''))
+    }
+
+
+class FingerprintStore:
+    """職缺指紋庫 (SQLite)
+
+    指紋在開啟時全部載入 dict,查詢是 O(1) 不需要讀資料庫;只有新增或變動的職缺才寫入,
+    未變動的職缺不產生任何寫入。整次執行是一個 transaction,完整跑完才 commit,
+    中途中斷時會回復,接續執行不會把沒輸出的職缺當成未變動。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " job_id INTEGER PRIMARY KEY, keyword TEXT, fingerprint INTEGER,"
+            " fields BLOB, missed INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_keyword ON fingerprints (keyword)")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < FINGERPRINT_VERSION:
+            self._migrate()
+        self.db.commit()
+        self.fingerprints = dict(self.db.execute("SELECT job_id, fingerprint FROM fingerprints"))
+
+    def _migrate(self):
+        """以存下的欄位重新計算舊版的指紋,避免所有職缺都被當成變動"""
+        self.db.executemany(
+            "UPDATE fingerprints SET fingerprint = ? WHERE job_id = ?",
+            [(fingerprint(json.loads(zlib.decompress(fields))), job_id)
+             for job_id, fields in self.db.execute("SELECT job_id, fields FROM fingerprints")],
+        )
+        self.db.execute(f"PRAGMA user_version = {FINGERPRINT_VERSION}")
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def get(self, job_id):
+        return self.fingerprints.get(job_id)
+
+    def fields(self, job_id):
+        row = self.db.execute("SELECT fields FROM fingerprints WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else {}
+
+    def put(self, job_id, keyword, value, item):
+        fields = {field: item.get(field) for field in TRACKED_FIELDS + INFO_FIELDS}
+        self.db.execute(
+            "INSERT INTO fingerprints (job_id, keyword, fingerprint, fields, missed) VALUES (?, ?, ?, ?, 0)"
+            " ON CONFLICT(job_id) DO UPDATE SET fingerprint = excluded.fingerprint,"
+            " fields = excluded.fields, missed = 0",
+            (job_id, keyword, value, zlib.compress(json.dumps(fields, ensure_ascii=False).encode('utf-8'))),
+        )
+        self.fingerprints[job_id] = value
+
+    def sweep(self, keywords, seen_ids, disappear_after):
+        """這次有搜尋的關鍵字中沒再出現的職缺累計次數,連續 disappear_after 次就視為下架並移除
+
+        回傳下架職缺的欄位列表。
+        """
+        db = self.db
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS seen_ids (job_id INTEGER PRIMARY KEY)")
+        db.execute("DELETE FROM seen_ids")
+        db.executemany("INSERT OR IGNORE INTO seen_ids VALUES (?)", ((i,) for i in seen_ids))
+        db.execute("UPDATE fingerprints SET missed = 0 WHERE missed > 0 AND job_id IN (SELECT job_id FROM seen_ids)")
+
+        marks = ",".join("?" * len(keywords))
+        db.execute(
+            f"UPDATE fingerprints SET missed = missed + 1 WHERE keyword IN ({marks})"
+            " AND job_id NOT IN (SELECT job_id FROM seen_ids)",
+            list(keywords),
+        )
+        rows = db.execute(
+            "SELECT job_id, fields FROM fingerprints WHERE missed >= ?", (disappear_after,)
+        ).fetchall()
+        db.execute("DELETE FROM fingerprints WHERE missed >= ?", (disappear_after,))
+        for job_id, _ in rows:
+            self.fingerprints.pop(job_id, None)
+        return [json.loads(zlib.decompress(fields)) for _, fields in rows]
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self, commit=True):
+        if commit:
+            self.db.commit()
+        else:
+            self.db.rollback()
+        self.db.close()
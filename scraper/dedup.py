@@ -0,0 +1,186 @@
+# 職缺去重用的集合: add() 在職缺第一次出現時回傳 True
+
+import math
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from heapq import merge
+
+from scraper.detail import get_job_id
+
+_MASK64 = (1 << 64) - 1
+
+
+class SeenJobs:
+    """單一行程內的去重集合"""
+
+    def __init__(self, keys=()):
+        self._seen = set(keys)
+
+    def add(self, key):
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
+
+    def __contains__(self, key):
+        return key in self._seen
+
+    def __len__(self):
+        return len(self._seen)
+
+    def __iter__(self):
+        return iter(self._seen)
+
+
+class RedisSeenJobs:
+    """多個 worker 共用的去重集合 (Redis SET),SADD 本身是原子操作"""
+
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+
+    def add(self, key):
+        return self.client.sadd(self.key, key or '') == 1
+
+    def __contains__(self, key):
+        return bool(self.client.sismember(self.key, key or ''))
+
+    def __len__(self):
+        return self.client.scard(self.key)
+
+
+class PersistentSeenJobs:
+    """跨次執行的去重索引,以職缺代碼轉成的數字為 key (7xk2a -> int('7xk2a', 36))
+
+    檔案內容為排序好的職缺代碼陣列、各代碼最後出現的週數與 Bloom filter,
+    載入時直接讀進 array / bytearray,不需要逐筆解析。查詢時先看 Bloom filter,
+    可能存在才用二分搜尋確認。每百萬筆約 4MB (代碼) + 2MB (週數) + 1.8MB (Bloom filter)。
+    超過 expire_weeks 週沒再出現的職缺會在儲存時移除。
+    """
+
+    magic = b'JSDX'
+    header = struct.Struct('<4sBcxxQQB')
+
+    def __init__(self, path, expire_weeks=8, false_positive_rate=0.01):
+        self.path = path
+        self.expire_weeks = expire_weeks
+        self.false_positive_rate = false_positive_rate
+        self.current_week = int(time.time() // 86400 // 7)
+        self.ids = array('I')
+        self.weeks = array('H')
+        self._added = set()
+        self._others = SeenJobs()
+        self._init_bloom(0)
+
+    @classmethod
+    def load(cls, path, expire_weeks=8):
+        index = cls(path, expire_weeks)
+        if not os.path.exists(path):
+            return index
+        with open(path, 'rb') as f:
+            magic, _, typecode, count, bloom_bits, hash_count = cls.header.unpack(f.read(cls.header.size))
+            if magic != cls.magic:
+                raise ValueError(f"不是去重索引檔: {path}")
+            index.ids = array(typecode.decode())
+            index.ids.fromfile(f, count)
+            index.weeks.fromfile(f, count)
+            index.bloom_bits, index.hash_count = bloom_bits, hash_count
+            index.bloom = bytearray(f.read())
+        return index
+
+    @staticmethod
+    def job_number(job_link):
+        """jobLink 轉為數字職缺代碼,無法轉換時回傳 None"""
+        try:
+            return int(get_job_id(job_link), 36)
+        except (TypeError, ValueError):
+            return None
+
+    def add(self, key):
+        number = self.job_number(key)
+        if number is None:
+            return self._others.add(key)
+        if number in self._added:
+            return False
+        positions = self._positions(number)
+        bloom = self.bloom
+        if all(bloom[p >> 3] & (1 << (p & 7)) for p in positions):
+            i = bisect_left(self.ids, number)
+            if i < len(self.ids) and self.ids[i] == number:
+                self.weeks[i] = self.current_week
+                return False
+        for p in positions:
+            bloom[p >> 3] |= 1 << (p & 7)
+        self._added.add(number)
+        return True
+
+    def __contains__(self, key):
+        number = self.job_number(key)
+        if number is None:
+            return key in self._others
+        if number in self._added:
+            return True
+        i = bisect_left(self.ids, number)
+        return i < len(self.ids) and self.ids[i] == number
+
+    def __len__(self):
+        return len(self.ids) + len(self._added) + len(self._others)
+
+    # ============================================
+    # Bloom filter
+    # ============================================
+
+    def _init_bloom(self, capacity):
+        capacity = max(capacity, 100_000)
+        self.bloom_bits = int(-capacity * math.log(self.false_positive_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.bloom_bits / capacity * math.log(2)))
+        self.bloom = bytearray((self.bloom_bits + 7) // 8)
+
+    def _positions(self, number):
+        h1 = (number * 0x9E3779B97F4A7C15) & _MASK64
+        h2 = (((number ^ (number >> 29)) * 0xBF58476D1CE4E5B9) & _MASK64) | 1
+        bits = self.bloom_bits
+        return [(h1 + i * h2) % bits for i in range(self.hash_count)]
+
+    def _bloom_add(self, number):
+        bloom = self.bloom
+        for p in self._positions(number):
+            bloom[p >> 3] |= 1 << (p & 7)
+
+    # ============================================
+    # 儲存
+    # ============================================
+
+    def save(self):
+        """合併本次新增的職缺、移除過期的職缺後寫回檔案"""
+        oldest_week = self.current_week - self.expire_weeks
+        added = sorted(self._added)
+        new_week = self.current_week
+        pairs = merge(zip(self.ids, self.weeks), ((n, new_week) for n in added))
+
+        typecode = 'Q' if added and added[-1] >= 1 << 32 or self.ids.typecode == 'Q' else 'I'
+        ids, weeks = array(typecode), array('H')
+        for number, week in pairs:
+            if week >= oldest_week:
+                ids.append(number)
+                weeks.append(week)
+
+        # 筆數超過 Bloom filter 的容量或有大量過期時重建,否則沿用並加上新的職缺
+        capacity = self.bloom_bits * math.log(2) ** 2 / -math.log(self.false_positive_rate)
+        if len(ids) > capacity or len(ids) < capacity / 8 < len(self.ids):
+            self._init_bloom(int(len(ids) * 1.5))
+            for number in ids:
+                self._bloom_add(number)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.header.pack(self.magic, 1, typecode.encode(), len(ids), self.bloom_bits, self.hash_count))
+            f.write(ids.tobytes())
+            f.write(weeks.tobytes())
+            f.write(self.bloom)
+        os.replace(tmp_path, self.path)
+
+        self.ids, self.weeks, self._added = ids, weeks, set()
@@ -0,0 +1,75 @@
+# 職缺詳細頁 (job/ajax/content) 的欄位擷取與跨次執行快取
+
+import json
+import sqlite3
+import zlib
+
+# 詳細頁額外輸出的欄位
+DETAIL_FIELDS = [
+    'jobDescription',
+    'workExp',
+    'requiredSkills',
+    'otherRequirements',
+    'welfare',
+]
+
+
+def get_job_id(job_link):
+    """從 https://www.104.com.tw/job/7xk2a 取出職缺代碼 7xk2a"""
+    return job_link.rstrip('/').rsplit('/', 1)[-1] if job_link else ''
+
+
+def parse_job_detail(body):
+    """將詳細頁回應轉為要合併進職缺的欄位"""
+    data = json.loads(body)["data"]
+    job_detail = data.get('jobDetail') or {}
+    condition = data.get('condition') or {}
+    welfare = data.get('welfare') or {}
+
+    skills = [s.get('description', '') for s in (condition.get('specialty') or []) + (condition.get('skill') or [])]
+    return {
+        'jobDescription': job_detail.get('jobDescription', ''),
+        'workExp': condition.get('workExp', ''),
+        'requiredSkills': ','.join(s for s in skills if s),
+        'otherRequirements': condition.get('other', ''),
+        'welfare': welfare.get('welfare', ''),
+    }
+
+
+class DetailCache:
+    """以 (職缺代碼, 最後更新日期) 為 key 的詳細頁快取,職缺沒更新就不會重新抓取"""
+
+    # 每寫入幾筆 commit 一次
+    commit_every = 100
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS job_details ("
+            " job_id TEXT PRIMARY KEY, appear_date TEXT, fields BLOB)"
+        )
+        self._pending = 0
+
+    def get(self, job_id, appear_date):
+        row = self.db.execute(
+            "SELECT fields FROM job_details WHERE job_id = ? AND appear_date = ?",
+            (job_id, appear_date),
+        ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, job_id, appear_date, fields):
+        payload = zlib.compress(json.dumps(fields, ensure_ascii=False).encode('utf-8'))
+        self.db.execute(
+            "INSERT OR REPLACE INTO job_details VALUES (?, ?, ?)",
+            (job_id, appear_date, payload),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.db.commit()
+            self._pending = 0
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,267 @@
+# 分散式爬取: 多個 worker 行程 (或多台主機) 共用 Redis 上的請求佇列、去重集合與輸出
+#
+# 第一個啟動的 worker 把起始請求 (關鍵字 x 頁數) 放進共用佇列,所有 worker 從佇列取工作;
+# 去重集合由所有 worker 共用,通過去重的 item 存到共用列表,最後一個結束的 worker 合併輸出成一個檔案。
+# 合併後留下「已完成」標記,之後才啟動的 worker 不會重新放入起始工作;要再爬一次同一個名稱需先 reset。
+# 合併前先以 SET NX 取得「合併中」標記,同時結束的 worker 只有一個會合併輸出。
+#
+# worker 數是在 worker 結束時減一,被強制終止 (kill -9、主機當機) 的 worker 不會減一,
+# 其他 worker 都結束後也不會有人合併輸出;確認所有 worker 都已結束後,以 export 指令手動合併。
+#
+# 使用方式 (每個 worker 執行相同的指令):
+#     scrapy crawl 104_ai_jobs -a distributed=1 -a crawl_name=weekly
+#
+# 查看狀態 / 清除殘留的佇列:
+#     python -m scraper.distributed status --name weekly
+#     python -m scraper.distributed reset --name weekly
+#
+# 有 worker 異常結束時手動合併輸出:
+#     python -m scraper.distributed export --name weekly
+
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+from scrapy.utils.misc import load_object
+
+from scraper.dedup import RedisSeenJobs
+
+_memory_lock = threading.Lock()
+_memory_instances = {}
+
+
+class InMemoryRedis:
+    """同一個行程內使用的 Redis 替代品,只實作這裡用到的指令 (測試或單機試跑用)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode('utf-8')
+
+    def get(self, name):
+        with self._lock:
+            return self._data.get(name)
+
+    def set(self, name, value, nx=False):
+        with self._lock:
+            if nx and name in self._data:
+                return None
+            self._data[name] = self._encode(value)
+            return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = int(self._data.get(name, b'0')) + amount
+            self._data[name] = self._encode(value)
+            return value
+
+    def decr(self, name, amount=1):
+        return self.incr(name, -amount)
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def rpush(self, name, *values):
+        with self._lock:
+            items = self._data.setdefault(name, [])
+            items.extend(self._encode(v) for v in values)
+            return len(items)
+
+    def lpop(self, name, count=None):
+        with self._lock:
+            items = self._data.get(name)
+            if not items:
+                return None
+            if count is None:
+                return items.pop(0)
+            popped, self._data[name] = items[:count], items[count:]
+            return popped
+
+    def llen(self, name):
+        with self._lock:
+            return len(self._data.get(name, []))
+
+    def sadd(self, name, *values):
+        with self._lock:
+            members = self._data.setdefault(name, set())
+            before = len(members)
+            members.update(self._encode(v) for v in values)
+            return len(members) - before
+
+    def sismember(self, name, value):
+        with self._lock:
+            return self._encode(value) in self._data.get(name, set())
+
+    def scard(self, name):
+        with self._lock:
+            return len(self._data.get(name, set()))
+
+
+def get_redis(url):
+    """依網址取得 Redis 連線;memory://<名稱> 使用同一行程內共用的 InMemoryRedis"""
+    if url.startswith('memory://'):
+        with _memory_lock:
+            return _memory_instances.setdefault(url, InMemoryRedis())
+    import redis
+    return redis.from_url(url)
+
+
+class DistributedCrawl:
+    """一次分散式爬取在 Redis 上的狀態: 工作佇列、去重集合、item 列表與 worker 數"""
+
+    def __init__(self, client, name, prefix="jobscout"):
+        self.client = client
+        self.name = name
+        base = f"{prefix}:{name}"
+        self.queue_key = f"{base}:queue"
+        self.seen_key = f"{base}:seen"
+        self.items_key = f"{base}:items"
+        self.seeded_key = f"{base}:seeded"
+        self.workers_key = f"{base}:workers"
+        self.completed_key = f"{base}:completed"
+        self.seen_jobs = RedisSeenJobs(client, self.seen_key)
+
+    def seed(self, works):
+        """只有第一個 worker 會放入起始工作,回傳是否由這個 worker 放入"""
+        if not self.client.set(self.seeded_key, datetime.now().isoformat(), nx=True):
+            return False
+        payloads = [json.dumps(work, ensure_ascii=False) for work in works]
+        if payloads:
+            self.client.rpush(self.queue_key, *payloads)
+        return True
+
+    def pop_works(self, count):
+        """從佇列取出最多 count 個工作"""
+        payloads = self.client.lpop(self.queue_key, count) or []
+        return [json.loads(payload) for payload in payloads]
+
+    def pending(self):
+        return self.client.llen(self.queue_key)
+
+    def start_worker(self):
+        return self.client.incr(self.workers_key)
+
+    def finish_worker(self):
+        """回傳仍在執行的 worker 數"""
+        return self.client.decr(self.workers_key)
+
+    def push_items(self, items):
+        self.client.rpush(self.items_key, *(json.dumps(item, ensure_ascii=False) for item in items))
+
+    def export(self, path, settings, batch_size=1000):
+        """把所有 worker 的 item 合併寫成一個檔案 (格式與欄位沿用 FEEDS 設定),回傳筆數"""
+        if not self.client.llen(self.items_key):
+            return 0
+        options = next(iter(settings.getdict("FEEDS").values()), {})
+        file_format = options.get('format', os.path.splitext(path)[1].lstrip('.') or 'csv')
+        exporter_cls = load_object(settings.getwithbase("FEED_EXPORTERS")[file_format])
+
+        count = 0
+        with open(path, 'wb') as f:
+            exporter = exporter_cls(f, fields_to_export=options.get('fields'),
+                                    encoding=options.get('encoding', 'utf-8'),
+                                    **options.get('item_export_kwargs', {}))
+            exporter.start_exporting()
+            while True:
+                payloads = self.client.lpop(self.items_key, batch_size)
+                if not payloads:
+                    break
+                for payload in payloads:
+                    exporter.export_item(json.loads(payload))
+                    count += 1
+            exporter.finish_exporting()
+        return count
+
+    def completed(self):
+        """已完成 (或合併中) 時回傳完成紀錄 (完成時間、輸出檔、筆數),否則回傳 None"""
+        value = self.client.get(self.completed_key)
+        return json.loads(value) if value else None
+
+    def claim_export(self):
+        """以 SET NX 留下「合併中」標記,只有取得標記的 worker 會合併輸出,回傳是否取得"""
+        record = {'exporting_at': datetime.now().isoformat(), 'output': None, 'items': 0}
+        return bool(self.client.set(self.completed_key, json.dumps(record), nx=True))
+
+    def mark_completed(self, path, count):
+        """留下已完成標記並清除佇列與去重集合 (保留 seeded,之後啟動的 worker 不會重新放入起始工作)
+
+        已經有合併出職缺的完成紀錄時不覆寫,避免之後的呼叫把紀錄改成 0 筆。
+        """
+        existing = self.completed()
+        if not existing or not existing.get('items'):
+            record = {'finished_at': datetime.now().isoformat(), 'output': path if count else None, 'items': count}
+            self.client.set(self.completed_key, json.dumps(record, ensure_ascii=False))
+        self.client.delete(self.queue_key, self.seen_key, self.items_key, self.workers_key)
+
+    def finish(self, path, settings):
+        """取得合併中標記後合併輸出並留下完成紀錄,回傳筆數;其他 worker 已經在合併時回傳 None"""
+        if not self.claim_export():
+            return None
+        count = self.export(path, settings)
+        self.mark_completed(path, count)
+        return count
+
+    def reset(self):
+        """清除這次爬取的所有狀態 (包含已完成標記),下次執行會重新放入起始工作"""
+        self.client.delete(self.queue_key, self.seen_key, self.items_key, self.seeded_key, self.workers_key,
+                           self.completed_key)
+
+    def status(self):
+        workers = self.client.get(self.workers_key)
+        return {
+            'name': self.name,
+            'seeded': self.client.get(self.seeded_key) is not None,
+            'completed': self.completed(),
+            'pending': self.pending(),
+            'workers': int(workers) if workers else 0,
+            'seen_jobs': len(self.seen_jobs),
+            'items': self.client.llen(self.items_key),
+        }
+
+
+def merged_output_path(settings, crawl_name, spider_name):
+    """合併輸出的檔名: FEEDS 的檔名加上 _<crawl_name>_merged"""
+    feeds = settings.getdict("FEEDS")
+    template = next(iter(feeds), f"{spider_name}_%(time)s.csv")
+    filename = template % {'time': datetime.now().strftime("%Y%m%d_%H%M%S"), 'name': spider_name}
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_{crawl_name}_merged{ext}"
+
+
+def main():
+    from scrapy.utils.project import get_project_settings
+
+    os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "scraper.settings")
+    settings = get_project_settings()
+    parser = argparse.ArgumentParser(description="分散式爬取的狀態查詢、清除與手動合併輸出")
+    parser.add_argument('command', choices=['status', 'reset', 'export'])
+    parser.add_argument('--name', default=settings.get("DISTRIBUTED_CRAWL_NAME"), help='爬取名稱 (crawl_name)')
+    parser.add_argument('--redis-url', default=settings.get("DISTRIBUTED_REDIS_URL"))
+    args = parser.parse_args()
+
+    crawl = DistributedCrawl(get_redis(args.redis_url), args.name)
+    if args.command == 'reset':
+        crawl.reset()
+        print(f"已清除分散式爬取 {args.name} 的狀態")
+    elif args.command == 'export':
+        # 有 worker 異常結束 (worker 數不會歸零) 時使用,請先確認所有 worker 都已結束
+        path = merged_output_path(settings, args.name, '104_ai_jobs')
+        count = crawl.finish(path, settings)
+        if count is None:
+            print(f"分散式爬取 {args.name} 已經合併過輸出: {crawl.completed()}")
+        else:
+            print(f"已合併 {count} 筆職缺到 {path}" if count else "沒有可合併的職缺")
+    else:
+        print(json.dumps(crawl.status(), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# 輸出檔的下載版本: 同一份職缺的 CSV / NDJSON / Parquet 檔,以及預先壓縮的 gzip / zstd 版本
+#
+# 每個輸出檔只轉換、壓縮一次,存在 STATE_DIR/downloads/<輸出目錄代號>/<sha256>/ (預設在爬取結束時產生;
+# DOWNLOAD_VARIANTS_ENABLED=false 時在第一次下載某個版本時才產生該版本)。
+# API 直接以檔案回應並支援 Range 續傳,不必把檔案讀進記憶體或每次下載都重新壓縮;
+# 轉換與壓縮都是逐筆、逐塊進行,記憶體用量和檔案大小無關。
+
+import csv
+import gzip
+import json
+import os
+import shutil
+import threading
+from collections import defaultdict
+
+# zstandard 是選用套件,沒有安裝時只提供 gzip 版本
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from scraper.exporters import LIST_FIELDS, ParquetItemExporter, pa
+from scraper.jobindex import read_rows
+from scraper.manifest import file_checksum, load_manifest, output_key
+
+# 下載格式 -> (Content-Type, 副檔名)
+FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'ndjson': ('application/x-ndjson', '.ndjson'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+}
+
+# 輸出格式 -> 可直接當成該下載格式的原始檔
+# (jsonlines 輸出在 utf-8-sig 編碼時每一行開頭都有 BOM,不能直接當成 NDJSON,一樣重新轉換)
+SOURCE_FORMATS = {'csv': 'csv', 'parquet': 'parquet'}
+
+# 預先壓縮的版本 (parquet 檔本身已經壓縮),依偏好順序
+ENCODINGS = {'zstd': '.zst', 'gzip': '.gz'}
+COMPRESSED_FORMATS = ('csv', 'ndjson')
+
+# 副檔名 -> 輸出格式 (沒有輸出檔索引紀錄的檔案用)
+EXTENSION_FORMATS = {'.csv': 'csv', '.jsonlines': 'jsonlines', '.jl': 'jsonlines', '.jsonl': 'jsonlines',
+                     '.json': 'json', '.parquet': 'parquet'}
+
+# 每個輸出檔 (sha256) 一個鎖: 同一個檔案的版本只產生一次,不同檔案的下載互不等待
+_build_locks = defaultdict(threading.Lock)
+_build_locks_lock = threading.Lock()
+
+
+def default_format(entry):
+    """沒有指定下載格式時使用和輸出檔相同的格式 (json 輸出以 ndjson 下載)"""
+    return SOURCE_FORMATS.get(entry['format'], 'ndjson')
+
+
+def file_entry(path):
+    """沒有輸出檔索引紀錄的輸出檔 (MANIFEST_ENABLED=false 或索引建立前的爬取) 臨時建立一筆紀錄"""
+    return {
+        'file': os.path.basename(path),
+        'path': os.path.abspath(path),
+        'format': EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower(), 'csv'),
+        'checksum': file_checksum(path),
+        'fields': [],
+    }
+
+
+def available_encodings():
+    return [encoding for encoding in ENCODINGS if encoding != 'zstd' or zstandard is not None]
+
+
+def variant_dir(entry, state_dir):
+    # 依輸出目錄分開存放,清除舊版本時只和同一個目錄的輸出檔索引比對,不會刪掉其他輸出目錄的版本
+    return os.path.join(state_dir, "downloads", output_key(os.path.dirname(entry['path'])),
+                        entry['checksum'].split(':', 1)[-1][:32])
+
+
+def _variant_path(entry, state_dir, fmt, encoding=None):
+    if SOURCE_FORMATS.get(entry['format']) == fmt:
+        path = entry['path']
+    else:
+        path = os.path.join(variant_dir(entry, state_dir), "jobs" + FORMATS[fmt][1])
+    if encoding is None:
+        return path
+    return os.path.join(variant_dir(entry, state_dir), os.path.basename(path) + ENCODINGS[encoding])
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _write_variant(entry, fmt, path):
+    """把輸出檔逐筆轉成 fmt 格式 (先寫到暫存檔,完成後才取代)"""
+    fields = list(entry.get('fields') or [])
+    tmp_path = _tmp_path(path)
+    try:
+        _write_rows(read_rows(entry['path'], entry['format']), fields, fmt, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def _write_rows(rows, fields, fmt, tmp_path):
+    if fmt == 'csv':
+        with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = None
+            for row in rows:
+                if writer is None:
+                    writer = csv.DictWriter(f, fields or list(row), extrasaction='ignore')
+                    writer.writeheader()
+                writer.writerow({k: ','.join(v) if isinstance(v, list) else v for k, v in row.items()})
+            if writer is None and fields:
+                csv.writer(f).writerow(fields)
+    elif fmt == 'ndjson':
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+    elif fmt == 'parquet':
+        with open(tmp_path, 'wb') as f:
+            exporter = ParquetItemExporter(f, compression=os.getenv("PARQUET_COMPRESSION", "zstd"),
+                                           fields_to_export=fields or None)
+            for row in rows:
+                # CSV 中的列表欄位以逗號連接
+                exporter.export_item({k: v.split(',') if k in LIST_FIELDS and isinstance(v, str) and v else v
+                                      for k, v in row.items()})
+            exporter.finish_exporting()
+
+
+def _compress(source, path, encoding):
+    """逐塊壓縮 source (先寫到暫存檔,完成後才取代)"""
+    tmp_path = _tmp_path(path)
+    with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+        if encoding == 'gzip':
+            # mtime=0: 同一個檔案每次壓縮的結果相同
+            with gzip.GzipFile(filename='', mode='wb', fileobj=dst, compresslevel=9, mtime=0) as out:
+                shutil.copyfileobj(src, out, 1 << 20)
+        else:
+            zstandard.ZstdCompressor(level=10).copy_stream(src, dst, size=os.path.getsize(source))
+    os.replace(tmp_path, path)
+
+
+def _build_lock(entry):
+    with _build_locks_lock:
+        return _build_locks[entry['checksum']]
+
+
+def _ensure_variant(entry, state_dir, fmt, encoding=None):
+    """產生一個還不存在的下載版本 (壓縮版本需要的未壓縮版本也一併產生),呼叫端需持有該檔案的鎖"""
+    path = _variant_path(entry, state_dir, fmt, encoding)
+    if os.path.exists(path):
+        return path
+    os.makedirs(variant_dir(entry, state_dir), exist_ok=True)
+    if encoding is None:
+        _write_variant(entry, fmt, path)
+    else:
+        _compress(_ensure_variant(entry, state_dir, fmt), path, encoding)
+    return path
+
+
+def build_variants(entry, state_dir):
+    """產生輸出檔所有還不存在的下載版本 (爬取結束時呼叫),回傳 entry
+
+    沒有安裝 pyarrow 時不產生 parquet,沒有安裝 zstandard 時不產生 zstd 版本。
+    """
+    directory = variant_dir(entry, state_dir)
+    with _build_lock(entry):
+        created = not os.path.isdir(directory)
+        for fmt in FORMATS:
+            if fmt == 'parquet' and pa is None:
+                continue
+            _ensure_variant(entry, state_dir, fmt)
+            if fmt in COMPRESSED_FORMATS:
+                for encoding in available_encodings():
+                    _ensure_variant(entry, state_dir, fmt, encoding)
+        if created:
+            _prune(os.path.dirname(directory), os.path.dirname(entry['path']))
+    return entry
+
+
+def _prune(downloads_dir, output_dir):
+    """移除同一個輸出目錄中已不在輸出檔索引中的下載版本"""
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return
+    keep = {run['checksum'].split(':', 1)[-1][:32] for run in manifest['runs']}
+    for name in os.listdir(downloads_dir):
+        if name not in keep:
+            shutil.rmtree(os.path.join(downloads_dir, name), ignore_errors=True)
+
+
+def open_variant(entry, state_dir, fmt, accept_encodings):
+    """選擇要回應的下載版本,回傳 {'path', 'encoding', 'mimetype', 'etag'}
+
+    accept_encodings 為 werkzeug 的 request.accept_encodings (編碼 -> 品質);
+    可以壓縮時優先使用 zstd,其次 gzip;版本不存在時 (爬取結束時沒有產生) 只產生這一個版本。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format 必須是 {', '.join(FORMATS)} 其中之一")
+    if fmt == 'parquet' and pa is None:
+        raise ValueError("下載 parquet 需要安裝 pyarrow: pip install pyarrow")
+    encoding = None
+    if fmt in COMPRESSED_FORMATS:
+        encoding = next((e for e in available_encodings() if accept_encodings[e]), None)
+    path = _variant_path(entry, state_dir, fmt, encoding)
+    if not os.path.exists(path):
+        with _build_lock(entry):
+            _ensure_variant(entry, state_dir, fmt, encoding)
+    checksum = entry['checksum'].split(':', 1)[-1][:32]
+    return {
+        'path': path,
+        'encoding': encoding,
+        'mimetype': FORMATS[fmt][0],
+        # 不同格式、不同壓縮方式的內容不同,強 ETag 要跟著不同 (Range 續傳時以 If-Range 確認檔案沒有變動)
+        'etag': f"{checksum}-{fmt}-{encoding}" if encoding else f"{checksum}-{fmt}",
+    }
@@ -0,0 +1,105 @@
+# 自訂輸出格式 (FEED_EXPORTERS)
+
+from scrapy.exporters import BaseItemExporter
+
+# pyarrow 是選用套件,只有 OUTPUT_FORMAT=parquet 時才需要
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# 重複值很多的欄位以 dictionary 編碼,讀回 pandas 時為 category
+DICTIONARY_FIELDS = {
+    'search_keyword', 'custName', 'coIndustryDesc', 'jobAddrNoDesc', 'optionEdu', 'jobRole',
+    'salaryType', 'remoteWorkType', 'periodDesc', 'changeType',
+}
+INT_FIELDS = {'salaryLow', 'salaryHigh', 'applyCnt'}
+DATE_FIELDS = {'appearDate'}
+LIST_FIELDS = {'search_keywords', 'search_positions'}
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_str(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+class ParquetItemExporter(BaseItemExporter):
+    """Parquet 輸出: item 先累積在記憶體,每 row_group_size 筆轉成一個 Arrow record batch 寫入
+
+    薪資、應徵人數為整數欄位,刊登日期為日期欄位,其他欄位為字串 (重複值多的欄位以 dictionary 編碼),
+    整個檔案以 compression 壓縮。檔案在結束時才寫入 footer,寫到一半的檔案無法讀取。
+    """
+
+    def __init__(self, file, row_group_size=10000, compression='zstd', **kwargs):
+        if pa is None:
+            raise ImportError("輸出 parquet 需要安裝 pyarrow: pip install pyarrow")
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+        self.row_group_size = int(row_group_size)
+        self.compression = compression
+        self.fields = list(self.fields_to_export) if self.fields_to_export else None
+        self.columns = None
+        self.writer = None
+
+    def export_item(self, item):
+        if self.fields is None:
+            self.fields = list(item.keys())
+        if self.columns is None:
+            self.columns = {field: [] for field in self.fields}
+        get = item.get
+        for field, values in self.columns.items():
+            values.append(get(field))
+        if len(self.columns[self.fields[0]]) >= self.row_group_size:
+            self._write_batch()
+
+    def finish_exporting(self):
+        if self.columns and self.columns[self.fields[0]]:
+            self._write_batch()
+        if self.writer is None:
+            # 沒有任何職缺時仍輸出只有欄位定義的檔案
+            self.writer = pq.ParquetWriter(self.file, self._schema(), compression=self.compression)
+        self.writer.close()
+
+    def _schema(self):
+        return pa.schema([(field, self._field_type(field)) for field in self.fields or []])
+
+    @staticmethod
+    def _field_type(field):
+        if field in DICTIONARY_FIELDS:
+            return pa.dictionary(pa.int32(), pa.string())
+        if field in INT_FIELDS:
+            return pa.int64()
+        if field in DATE_FIELDS:
+            return pa.date32()
+        if field in LIST_FIELDS:
+            return pa.list_(pa.string())
+        return pa.string()
+
+    def _column(self, field, values):
+        if field in DICTIONARY_FIELDS:
+            return pa.array([_to_str(v) for v in values], type=pa.string()).dictionary_encode()
+        if field in INT_FIELDS:
+            return pa.array([_to_int(v) for v in values], type=pa.int64())
+        if field in DATE_FIELDS:
+            text = pa.array([v or None for v in values], type=pa.string())
+            return pc.cast(pc.strptime(text, format='%Y-%m-%d', unit='s', error_is_null=True), pa.date32())
+        if field in LIST_FIELDS:
+            return pa.array([[_to_str(x) for x in v] if isinstance(v, (list, tuple)) else None for v in values],
+                            type=pa.list_(pa.string()))
+        return pa.array([_to_str(v) for v in values], type=pa.string())
+
+    def _write_batch(self):
+        schema = self._schema()
+        batch = pa.record_batch([self._column(f, self.columns[f]) for f in self.fields], schema=schema)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.file, schema, compression=self.compression)
+        self.writer.write_batch(batch, row_group_size=self.row_group_size)
+        self.columns = {field: [] for field in self.fields}
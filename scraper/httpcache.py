@@ -0,0 +1,117 @@
+# 104 搜尋API的本機回應快取 (HTTPCACHE_STORAGE)
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+from scraper.state import get_state_dir
+
+
+def normalize_request_key(request):
+    """以正規化後的查詢參數作為快取 key: 參數排序、逗號分隔的值也排序"""
+    parts = urlsplit(request.url)
+    params = sorted(
+        (name, ",".join(sorted(value.split(","))))
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+    )
+    key = f"{request.method} {parts.netloc}{parts.path}?{urlencode(params)}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class CompressedCacheStorage:
+    """SQLite 單檔快取,body 以 zlib 壓縮,超過容量上限時依最近使用時間(LRU)淘汰
+
+    HTTPCACHE_REPLAY 開啟時視為永不過期,搭配 HTTPCACHE_IGNORE_MISSING 即可完全離線重播。
+    """
+
+    # 每寫入幾筆檢查一次容量
+    evict_every = 50
+
+    def __init__(self, settings):
+        self.path = os.path.join(get_state_dir(settings), settings.get("HTTPCACHE_DB", "httpcache.sqlite"))
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.max_bytes = int(settings.getfloat("HTTPCACHE_MAX_MB", 200) * 1024 * 1024)
+        self.replay = settings.getbool("HTTPCACHE_REPLAY")
+        self.db = None
+        self._stores = 0
+
+    def open_spider(self, spider):
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT,"
+            " body BLOB, compressed INTEGER, size INTEGER,"
+            " stored_at REAL, accessed_at REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        spider.logger.info(f"HTTP快取: {self.path}" + (" (離線重播模式)" if self.replay else ""))
+
+    def close_spider(self, spider):
+        self._evict()
+        self.db.commit()
+        self.db.close()
+
+    def retrieve_response(self, spider, request):
+        key = normalize_request_key(request)
+        row = self.db.execute(
+            "SELECT url, status, headers, body, compressed, stored_at FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        url, status, headers, body, compressed, stored_at = row
+        if not self.replay and 0 < self.expiration_secs < time.time() - stored_at:
+            return None
+
+        self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        headers = Headers({
+            name: [value.encode('latin1') for value in values]
+            for name, values in json.loads(headers).items()
+        })
+        body = zlib.decompress(body) if compressed else body
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        headers = json.dumps({
+            name.decode('latin1'): [value.decode('latin1') for value in values]
+            for name, values in response.headers.items()
+        })
+        # 已經是 gzip/br 的內容再壓縮沒有效果,直接存原始資料
+        compressed = b'Content-Encoding' not in response.headers
+        body = zlib.compress(response.body, 6) if compressed else response.body
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (normalize_request_key(request), response.url, response.status, headers,
+             body, int(compressed), len(body) + len(headers), now, now),
+        )
+
+        self._stores += 1
+        if self._stores % self.evict_every == 0:
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        """刪除最久沒用到的回應,直到總大小低於 HTTPCACHE_MAX_MB"""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale_keys = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.db.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
@@ -0,0 +1,150 @@
+# 省記憶體的職缺 item: 欄位存在 __slots__,重複的字串與數字經由有上限的共用表只保留一份
+#
+# 大量爬取時暫存在記憶體的 item (合併、去重、匯出前的緩衝) 以字串佔大部分記憶體,
+# 公司名稱、產業、地區、學歷等欄位每頁都是一樣的值,共用同一個物件即可
+
+from collections.abc import MutableMapping
+
+from itemadapter import ItemAdapter
+from itemadapter.adapter import DictAdapter
+
+from scraper.detail import DETAIL_FIELDS
+
+# 搜尋列表的欄位 (順序即輸出順序,與 parse_jobs 相同)
+JOB_FIELDS = (
+    'search_keyword', 'jobName', 'jobRole', 'jobAddrNoDesc', 'jobAddress', 'description',
+    'optionEdu', 'periodDesc', 'applyCnt', 'custName', 'coIndustryDesc', 'salaryLow',
+    'salaryHigh', 'appearDate', 'jobLink', 'remoteWorkType', 'major', 'salaryType',
+)
+
+# 其他 pipeline 與詳細頁會加上的欄位,同樣存在 slot 中;不在這裡的欄位存在 _extra dict
+OPTIONAL_FIELDS = (
+    'search_page', 'search_rank', 'search_keywords', 'search_positions',
+    'dup_group', 'changeType', 'changedFields', *DETAIL_FIELDS,
+)
+
+ITEM_FIELDS = JOB_FIELDS + OPTIONAL_FIELDS
+_SLOTS = frozenset(ITEM_FIELDS)
+
+
+class InternTable:
+    """有上限的共用表: 相同的值回傳同一個物件
+
+    表滿了之後不再加入新的值 (已在表中的值仍會共用),記憶體用量有固定上限。
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.values = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __call__(self, value):
+        values = self.values
+        shared = values.get(value)
+        if shared is not None:
+            return shared
+        if len(values) < self.maxsize:
+            values[value] = value
+        return value
+
+
+# 整次執行共用: 公司、產業、地區等文字,以及薪資、應徵人數等數字 (小整數以外的 int 不會自動共用)
+intern_text = InternTable(100000)
+intern_number = InternTable(20000)
+
+
+def to_number(value):
+    """數字字串轉為共用的 int,無法轉換的值原樣回傳"""
+    if isinstance(value, str):
+        if not value.isdigit():
+            return value
+        value = int(value)
+    return intern_number(value) if isinstance(value, int) else value
+
+
+class JobItem(MutableMapping):
+    """以 __slots__ 存放欄位的職缺 item,用法與 dict 相同
+
+    沒有設定的 slot 視為沒有該欄位 (KeyError),依 ITEM_FIELDS 的順序列舉,其他欄位接在後面。
+    可以 pickle (請求 meta 會被寫入磁碟佇列),經由 JobItemAdapter 支援 ItemAdapter 與 feed exporter。
+    """
+
+    __slots__ = ITEM_FIELDS + ('_extra',)
+
+    def __init__(self, *args, **fields):
+        self._extra = None
+        if args:
+            self.update(*args)
+        for key, value in fields.items():
+            if key in _SLOTS:
+                object.__setattr__(self, key, value)
+            else:
+                self[key] = value
+
+    def __getitem__(self, key):
+        if key in _SLOTS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _SLOTS:
+            object.__setattr__(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _SLOTS:
+            try:
+                object.__delattr__(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        if key in _SLOTS:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in ITEM_FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def copy(self):
+        return type(self)(self)
+
+
+class JobItemAdapter(DictAdapter):
+    """讓 ItemAdapter (CsvPipeline、feed exporter 等) 把 JobItem 當成 dict 處理"""
+
+    @classmethod
+    def is_item(cls, item):
+        return isinstance(item, JobItem)
+
+    @classmethod
+    def is_item_class(cls, item_class):
+        return issubclass(item_class, JobItem)
+
+
+if JobItemAdapter not in ItemAdapter.ADAPTER_CLASSES:
+    ItemAdapter.ADAPTER_CLASSES.appendleft(JobItemAdapter)
@@ -0,0 +1,232 @@
+# 輸出檔的查詢索引: 第一次查詢某個輸出檔時把它轉成 SQLite (STATE_DIR/job_index/<輸出目錄代號>/<sha256>.sqlite),
+# 之後的篩選、排序與分頁都走索引,不再掃描檔案 (供 api.py 的 /jobs 使用)
+#
+# 輸出檔寫完就不會再變動 (輸出檔索引記錄了 sha256),查詢索引以 sha256 命名,同一個檔案只建立一次。
+
+import base64
+import csv
+import json
+import os
+import sqlite3
+import threading
+
+from scraper.manifest import load_manifest, output_key
+from scraper.parsing import format_appear_date
+
+# 可排序的欄位 -> 索引表欄位
+SORT_FIELDS = {
+    'appearDate': 'appear_date',
+    'salaryLow': 'salary_low',
+    'salaryHigh': 'salary_high',
+    'applyCnt': 'apply_cnt',
+}
+
+# remote 參數 -> remoteWorkType 的文字
+REMOTE_TYPES = {'none': '不可遠端', 'full': '完全遠端', 'partial': '部分遠端'}
+
+SCHEMA = """
+CREATE TABLE jobs (
+    id INTEGER PRIMARY KEY,
+    company TEXT,
+    area TEXT,
+    salary_low INTEGER NOT NULL,
+    salary_high INTEGER NOT NULL,
+    remote TEXT,
+    appear_date TEXT NOT NULL,
+    apply_cnt INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE job_keywords (
+    keyword TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (keyword, id)
+) WITHOUT ROWID;
+CREATE INDEX idx_jobs_appear_date ON jobs (appear_date, id);
+CREATE INDEX idx_jobs_salary_low ON jobs (salary_low, id);
+CREATE INDEX idx_jobs_salary_high ON jobs (salary_high, id);
+CREATE INDEX idx_jobs_apply_cnt ON jobs (apply_cnt, id);
+CREATE INDEX idx_jobs_company ON jobs (company, appear_date);
+CREATE INDEX idx_jobs_area ON jobs (area);
+"""
+
+_build_lock = threading.Lock()
+
+
+def _to_int(value):
+    """排序欄位不存 NULL (排序與分頁才能直接使用索引),沒有值時為 0"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _date(value):
+    """since / until 可以是 2025-01-01 或 20250101 (輸出檔的 appearDate 為前者)"""
+    try:
+        return format_appear_date(value.replace('-', ''))
+    except ValueError:
+        raise ValueError(f"日期格式錯誤: {value}") from None
+
+
+def read_rows(path, fmt):
+    """逐筆讀取輸出檔 (csv / jsonlines / json / parquet)"""
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+    elif fmt in ('jsonlines', 'jl'):
+        # 輸出編碼為 utf-8-sig 時每一行 (每次寫入) 開頭都有 BOM
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.lstrip('\ufeff')
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == 'json':
+        with open(path, encoding='utf-8') as f:
+            yield from json.loads(f.read().replace('\ufeff', ''))
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            for row in batch.to_pylist():
+                yield {k: v.isoformat() if hasattr(v, 'isoformat') else v for k, v in row.items()}
+    else:
+        raise ValueError(f"不支援查詢的輸出格式: {fmt}")
+
+
+def _keywords(row):
+    keywords = row.get('search_keywords')
+    if isinstance(keywords, str):
+        keywords = keywords.split(',') if keywords else []
+    return set(keywords or []) | ({row['search_keyword']} if row.get('search_keyword') else set())
+
+
+def build_index(entry, path):
+    """把輸出檔轉成查詢索引 (先寫到暫存檔,完成後才取代)"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    db = sqlite3.connect(tmp_path)
+    db.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;")
+    db.executescript(SCHEMA)
+    jobs, keywords = [], []
+    for i, row in enumerate(read_rows(entry['path'], entry['format']), 1):
+        jobs.append((i, row.get('custName'), row.get('jobAddrNoDesc'), _to_int(row.get('salaryLow')),
+                     _to_int(row.get('salaryHigh')), row.get('remoteWorkType'), row.get('appearDate') or '',
+                     _to_int(row.get('applyCnt')), json.dumps(row, ensure_ascii=False, default=str)))
+        keywords += [(keyword, i) for keyword in _keywords(row)]
+    with db:
+        db.executemany("INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", jobs)
+        db.executemany("INSERT OR IGNORE INTO job_keywords VALUES (?, ?)", keywords)
+    db.execute("ANALYZE")
+    db.close()
+    os.replace(tmp_path, path)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """回傳 (排序值, id)"""
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return value, int(last_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"cursor 格式錯誤: {cursor}") from None
+
+
+class JobIndex:
+    """一個輸出檔的查詢索引 (唯讀)"""
+
+    def __init__(self, entry, path):
+        self.entry = entry
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    @classmethod
+    def open(cls, entry, state_dir):
+        """開啟輸出檔的查詢索引,不存在時建立;同時移除已不在輸出檔索引中的舊查詢索引
+
+        查詢索引依輸出目錄分開存放 (STATE_DIR/job_index/<輸出目錄代號>/),只和同一個目錄的輸出檔索引比對,
+        不會刪掉其他輸出目錄的查詢索引。
+        """
+        index_dir = os.path.join(state_dir, "job_index", output_key(os.path.dirname(entry['path'])))
+        os.makedirs(index_dir, exist_ok=True)
+        name = entry['checksum'].split(':', 1)[-1][:32]
+        path = os.path.join(index_dir, f"{name}.sqlite")
+        if not os.path.exists(path):
+            with _build_lock:
+                if not os.path.exists(path):
+                    build_index(entry, path)
+                    cls._prune(index_dir, os.path.dirname(entry['path']))
+        return cls(entry, path)
+
+    @staticmethod
+    def _prune(index_dir, output_dir):
+        manifest = load_manifest(output_dir)
+        if manifest is None:
+            return
+        keep = {f"{run['checksum'].split(':', 1)[-1][:32]}.sqlite" for run in manifest['runs']}
+        for filename in os.listdir(index_dir):
+            if filename.endswith('.sqlite') and filename not in keep:
+                try:
+                    os.remove(os.path.join(index_dir, filename))
+                except OSError:
+                    pass
+
+    def close(self):
+        self.db.close()
+
+    def query(self, keyword=None, company=None, area=None, salary_min=None, salary_max=None, remote=None,
+              since=None, until=None, sort='-appearDate', limit=50, cursor=None):
+        """依條件查詢,回傳 (職缺列表, 符合的總筆數, 下一頁的 cursor 或 None)
+
+        area 為地區前綴 (例如「台北市」);salary_min / salary_max 為薪資範圍,和職缺的薪資範圍有重疊即符合
+        (沒有上限的職缺視為上限無限大,面議的職缺不符合);since / until 為 appearDate 範圍;sort 為欄位名稱,前面加 - 表示由大到小;
+        分頁以上一頁最後一筆的排序值與位置 (cursor) 接續,翻頁時不會因為 OFFSET 而越來越慢。
+        """
+        descending = sort.startswith('-')
+        column = SORT_FIELDS.get(sort.lstrip('-'))
+        if column is None:
+            raise ValueError(f"sort 必須是 {', '.join(SORT_FIELDS)} 其中之一 (可加 - 表示由大到小)")
+        if remote is not None and remote not in REMOTE_TYPES:
+            raise ValueError(f"remote 必須是 {', '.join(REMOTE_TYPES)} 其中之一")
+
+        where, params = [], []
+        if keyword:
+            where.append("id IN (SELECT id FROM job_keywords WHERE keyword = ?)")
+            params.append(keyword)
+        if company:
+            where.append("company = ?")
+            params.append(company)
+        if area:
+            where.append("area >= ? AND area < ?")
+            params += [area, area + '\U0010ffff']
+        if salary_min is not None:
+            where.append("salary_high >= ? AND salary_high > 0")
+            params.append(int(salary_min))
+        if salary_max is not None:
+            where.append("salary_low <= ? AND salary_low > 0")
+            params.append(int(salary_max))
+        if remote is not None:
+            where.append("remote = ?")
+            params.append(REMOTE_TYPES[remote])
+        if since:
+            where.append("appear_date >= ?")
+            params.append(_date(since))
+        if until:
+            where.append("appear_date <= ?")
+            params.append(_date(until))
+
+        filters = " AND ".join(where) or "1"
+        total = self.db.execute(f"SELECT COUNT(*) FROM jobs WHERE {filters}", params).fetchone()[0]
+
+        order = 'DESC' if descending else 'ASC'
+        page_where, page_params = [filters], list(params)
+        if cursor:
+            value, last_id = decode_cursor(cursor)
+            page_where.append(f"({column}, id) {'<' if descending else '>'} (?, ?)")
+            page_params += [value, last_id]
+        rows = self.db.execute(
+            f"SELECT {column}, id, data FROM jobs WHERE {' AND '.join(page_where)}"
+            f" ORDER BY {column} {order}, id {order} LIMIT ?",
+            page_params + [limit + 1],
+        ).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][:2]) if len(rows) > limit else None
+        return [json.loads(row[2]) for row in rows[:limit]], total, next_cursor
@@ -0,0 +1,14 @@
+# 自訂 Scrapy 日誌格式
+
+from scrapy import logformatter
+
+from scraper.merge import ItemHeld
+
+
+class LogFormatter(logformatter.LogFormatter):
+    """暫存待合併的 item (ItemHeld) 不是真的丟棄,不記錄 Dropped 訊息"""
+
+    def dropped(self, item, exception, response, spider):
+        if isinstance(exception, ItemHeld):
+            return None
+        return super().dropped(item, exception, response, spider)
@@ -0,0 +1,225 @@
+# 輸出檔索引 (manifest): 爬取結束時把輸出檔的資訊寫進輸出目錄的 ai_jobs.manifest.json
+#
+# API / MCP 直接讀取索引回答「最新的輸出檔」「有幾筆職缺」「前幾筆資料」,
+# 不需要 glob 所有輸出檔、逐一 stat 再重新讀取整個 CSV。索引以暫存檔取代的方式整份寫入,
+# 讀取時不會看到寫到一半的內容;每次爬取的紀錄包含自己的 crawl_id,同時有多個爬取也能找到自己的輸出檔。
+#
+#     python -m scraper.manifest                 # 顯示索引
+#     python -m scraper.manifest --rebuild       # 為既有的輸出檔建立索引 (升級前產生的檔案)
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.url import file_uri_to_path
+from twisted.internet.threads import deferToThread
+
+from scraper.state import get_state_dir, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# 索引保留最近幾次的輸出檔
+MANIFEST_RUNS = 100
+
+# 每個輸出檔保留的預覽筆數
+PREVIEW_ROWS = 5
+
+# 同一個行程內的多個爬取依序更新索引
+_write_lock = threading.Lock()
+
+
+def manifest_path(directory='.'):
+    return os.path.join(directory, os.getenv("OUTPUT_FILENAME", "ai_jobs") + ".manifest.json")
+
+
+def output_key(directory):
+    """輸出目錄的代號: STATE_DIR 由多個輸出目錄共用時 (Celery、api.py、CLI),各目錄的快取分開存放"""
+    return hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()[:12]
+
+
+def load_manifest(directory='.'):
+    """讀取索引,回傳 {'latest': 最新的紀錄, 'runs': [紀錄, ...] (新的在前)};沒有索引時回傳 None"""
+    try:
+        with open(manifest_path(directory), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def latest_output(directory='.', formats=None):
+    """最近一次爬取的輸出檔紀錄 (只看檔案仍存在的,formats 可限制輸出格式);沒有時回傳 None"""
+    manifest = load_manifest(directory)
+    for entry in manifest['runs'] if manifest else []:
+        if (formats is None or entry['format'] in formats) and os.path.exists(entry['path']):
+            return entry
+    return None
+
+
+def find_output(directory='.', crawl_id=None, path=None):
+    """依 crawl_id 或輸出檔路徑找出該次爬取的紀錄"""
+    manifest = load_manifest(directory)
+    for entry in manifest['runs'] if manifest else []:
+        if (crawl_id and entry.get('crawl_id') == crawl_id) or (path and entry['path'] == os.path.abspath(path)):
+            return entry
+    return None
+
+
+def file_checksum(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return f"sha256:{sha256.hexdigest()}"
+
+
+def add_entry(entry):
+    """把一次爬取的紀錄加入輸出檔所在目錄的索引 (同一個檔案的舊紀錄會被取代)"""
+    entry = {**entry, 'byte_size': os.path.getsize(entry['path']), 'checksum': file_checksum(entry['path'])}
+    directory = os.path.dirname(entry['path'])
+    with _write_lock:
+        manifest = load_manifest(directory) or {'runs': []}
+        runs = [entry] + [run for run in manifest['runs'] if run['path'] != entry['path']]
+        runs.sort(key=lambda run: run.get('finished_at') or '', reverse=True)
+        runs = runs[:MANIFEST_RUNS]
+        write_json_atomic(manifest_path(directory), {'latest': runs[0], 'runs': runs})
+    return entry
+
+
+def _json_value(value):
+    return value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+
+
+class ManifestExtension:
+    """輸出檔寫完 (feed_slot_closed) 時把該檔案的資訊加入索引
+
+    記錄: crawl_id、爬取參數、檔案路徑與格式、筆數、位元組數、欄位、sha256 與前幾筆資料。
+    只處理本機的輸出檔;從檢查點接續時筆數包含之前已寫入的職缺。
+    DOWNLOAD_VARIANTS_ENABLED=true (預設) 時接著產生下載用的 CSV / NDJSON / Parquet 與壓縮版本 (scraper.downloads)。
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.preview = []
+        self.resumed_rows = 0
+        self.variants_dir = None
+        if crawler.settings.getbool("DOWNLOAD_VARIANTS_ENABLED"):
+            self.variants_dir = get_state_dir(crawler.settings)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("MANIFEST_ENABLED"):
+            raise NotConfigured
+        extension = cls(crawler)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(extension.feed_slot_closed, signal=signals.feed_slot_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is not None and checkpoint.resumed:
+            self.resumed_rows = len(checkpoint.seen_jobs)
+
+    def item_scraped(self, item, spider):
+        if len(self.preview) < PREVIEW_ROWS:
+            self.preview.append(ItemAdapter(item).asdict())
+
+    def feed_slot_closed(self, slot):
+        path = self._local_path(slot.uri)
+        if path is None or not os.path.exists(path):
+            return None
+        spider = self.crawler.spider
+        stats = self.crawler.stats
+        fields = list(slot.feed_options.get('fields') or (self.preview[0] if self.preview else []))
+        start_time = stats.get_value('start_time')
+        entry = {
+            'crawl_id': self.crawler.settings.get("CRAWL_ID"),
+            'file': os.path.basename(path),
+            'path': os.path.abspath(path),
+            'format': slot.format,
+            'started_at': start_time.astimezone().isoformat(timespec='seconds') if start_time else None,
+            'finished_at': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'finish_reason': stats.get_value('finish_reason'),
+            'params': {
+                'keywords': getattr(spider, 'keywords', None),
+                'pages': getattr(spider, 'pages_per_keyword', None),
+                'area_codes': getattr(spider, 'area_codes', None) or None,
+                'remote_mode': getattr(spider, 'remote_mode', None),
+                'task_id': getattr(spider, 'task_id', None),
+            },
+            'row_count': self.resumed_rows + slot.itemcount,
+            'fields': fields,
+            'preview': [{field: _json_value(row.get(field)) for field in fields} for row in self.preview],
+        }
+        # 計算 sha256 需要讀取整個檔案,在背景執行緒進行
+        d = deferToThread(add_entry, entry)
+        d.addErrback(lambda failure: logger.error(f"更新輸出檔索引失敗: {failure.value}"))
+        if self.variants_dir is not None:
+            d.addCallback(self._build_variants)
+        return d
+
+    def _build_variants(self, entry):
+        if entry is None:
+            return None
+        # scraper.downloads 會讀取索引,在這裡才匯入以避免循環匯入
+        from scraper.downloads import build_variants
+        d = deferToThread(build_variants, entry, self.variants_dir)
+        d.addErrback(lambda failure: logger.error(f"產生下載版本失敗: {failure.value}"))
+        return d
+
+    @staticmethod
+    def _local_path(uri):
+        if uri.startswith('file://'):
+            return file_uri_to_path(uri)
+        if '://' in uri:
+            return None
+        return uri
+
+
+def rebuild(directory='.'):
+    """為目錄中既有的 CSV 輸出檔建立索引 (筆數需要讀取整個檔案),回傳檔案數"""
+    pattern = os.getenv("OUTPUT_FILENAME", "ai_jobs") + "_*.csv"
+    files = sorted(glob.glob(os.path.join(directory, pattern)), key=os.path.getmtime)
+    for path in files:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            preview, rows = [], 0
+            for row in reader:
+                if rows < PREVIEW_ROWS:
+                    preview.append(row)
+                rows += 1
+        finished_at = datetime.fromtimestamp(os.path.getmtime(path)).astimezone().isoformat(timespec='seconds')
+        add_entry({
+            'crawl_id': None, 'file': os.path.basename(path), 'path': os.path.abspath(path), 'format': 'csv',
+            'started_at': None, 'finished_at': finished_at, 'finish_reason': None, 'params': {},
+            'row_count': rows, 'fields': reader.fieldnames or [], 'preview': preview,
+        })
+    return len(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="輸出檔索引")
+    parser.add_argument('--dir', default='.', help="輸出檔目錄")
+    parser.add_argument('--rebuild', action='store_true', help="為既有的 CSV 輸出檔建立索引")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"已加入索引: {rebuild(args.dir)} 個檔案")
+    manifest = load_manifest(args.dir)
+    if manifest is None:
+        parser.error(f"找不到索引: {manifest_path(args.dir)}")
+    for entry in manifest['runs']:
+        print(f"{entry['finished_at']}  {entry['file']}  {entry['row_count']} 筆  {entry['byte_size']} bytes")
+
+
+if __name__ == '__main__':
+    main()
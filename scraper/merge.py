@@ -0,0 +1,99 @@
+# 合併同一職缺在多個關鍵字的搜尋結果: 爬取期間把 item 暫存到磁碟,結束前每個職缺輸出一筆
+
+import json
+import os
+import sqlite3
+import zlib
+
+from scrapy.exceptions import DropItem
+
+from scraper.detail import get_job_id
+
+
+class ItemHeld(DropItem):
+    """item 已暫存,稍後合併輸出 (不是真的丟棄,不記錄 Dropped 訊息)"""
+
+
+class KeywordMergeStore:
+    """以職缺代碼為 key 的暫存區 (SQLite)
+
+    每個職缺只存第一次出現的 item,之後只記錄 (關鍵字, 位置),重複寫入同一筆不會有影響,
+    檢查點接續時重新處理的頁面不會產生重複的關鍵字。輸出時依第一次出現的順序逐筆讀取,
+    記憶體用量與職缺數無關。
+
+    autocommit=True 時每筆 item 各自 commit (檢查點使用),否則整次執行是一個 transaction。
+    """
+
+    def __init__(self, path, autocommit=False):
+        self.path = path
+        self.autocommit = autocommit
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (seq INTEGER PRIMARY KEY, job_id TEXT UNIQUE, item BLOB)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS matches (seq INTEGER, keyword TEXT, position TEXT, UNIQUE (seq, keyword))"
+        )
+        if not autocommit:
+            self.db.execute("BEGIN")
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def add(self, item):
+        """暫存 item,回傳是否為第一次出現的職缺"""
+        job_id = get_job_id(item.get('jobLink')) or json.dumps(dict(item), sort_keys=True, default=str)
+        keyword = item.pop('search_keyword', '')
+        page, rank = item.pop('search_page', None), item.pop('search_rank', None)
+        position = f"{page}-{rank}" if page is not None else ''
+
+        db = self.db
+        if self.autocommit:
+            db.execute("BEGIN")
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO jobs (job_id, item) VALUES (?, ?)",
+            (job_id, zlib.compress(json.dumps(dict(item), ensure_ascii=False).encode('utf-8'))),
+        )
+        first = cursor.rowcount == 1
+        seq = cursor.lastrowid if first else db.execute(
+            "SELECT seq FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        db.execute("INSERT OR IGNORE INTO matches VALUES (?, ?, ?)", (seq, keyword, position))
+        if self.autocommit:
+            db.execute("COMMIT")
+        return first
+
+    def merged_items(self):
+        """依職缺第一次出現的順序產生合併後的 item"""
+        jobs = self.db.execute("SELECT seq, item FROM jobs ORDER BY seq")
+        # 另開 cursor 依同樣順序讀取關鍵字,兩邊一起往前走,不需要把整張表讀進記憶體
+        matches = self.db.execute("SELECT seq, keyword, position FROM matches ORDER BY seq, rowid")
+        pending = next(matches, None)
+        for seq, blob in jobs:
+            keywords, positions = [], []
+            while pending is not None and pending[0] == seq:
+                keywords.append(pending[1])
+                if pending[2]:
+                    positions.append(f"{pending[1]}:{pending[2]}")
+                pending = next(matches, None)
+            item = json.loads(zlib.decompress(blob))
+            item['search_keyword'] = keywords[0] if keywords else ''
+            item['search_keywords'] = keywords
+            item['search_positions'] = positions
+            yield item
+
+    def commit(self):
+        if not self.autocommit:
+            self.db.execute("COMMIT")
+            self.db.execute("BEGIN")
+
+    def close(self, remove=False):
+        if not self.autocommit:
+            self.db.execute("COMMIT")
+        self.db.close()
+        if remove:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
@@ -0,0 +1,192 @@
+# 下載中介軟體
+
+import json
+import math
+import os
+import time
+from collections import deque
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from scraper.state import get_state_dir, write_json_atomic
+
+
+class AimdController:
+    """單一下載 slot 的 AIMD 控制器: 正常時緩慢加速,被限流時大幅減速
+
+    - 429/503: 併發數乘以 decrease_factor,已是最低併發時改為延遲加倍;
+      同一波限流只減速一次,並在 Retry-After 期間把延遲拉長到 Retry-After 秒
+    - 每 window 筆正常回應檢查一次 p90 延遲: 低於目標就先縮短延遲、再把併發 +1,高於目標就併發 -1
+    """
+
+    def __init__(self, concurrency, delay, min_concurrency=1, max_concurrency=16,
+                 min_delay=0.0, max_delay=60.0, target_latency=2.0, window=20,
+                 decrease_factor=0.5):
+        self.concurrency = float(concurrency)
+        self.delay = float(delay)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.latencies = deque(maxlen=window)
+        self.window = window
+        self.retry_after_until = 0.0
+        self.decreased_until = 0.0
+        self.last_p90 = None
+
+    def current_delay(self, now=None):
+        """實際要套用的延遲 (Retry-After 期間至少等到指定秒數)"""
+        now = now if now is not None else time.time()
+        if now < self.retry_after_until:
+            return max(self.delay, self.retry_after_until - now)
+        return self.delay
+
+    def on_throttled(self, retry_after=None, now=None):
+        """收到 429/503 時呼叫,回傳是否有減速"""
+        now = now if now is not None else time.time()
+        self.latencies.clear()
+        if retry_after:
+            self.retry_after_until = max(self.retry_after_until, now + min(retry_after, self.max_delay))
+        # 已送出的請求會陸續收到 429,減速後的冷卻期間內不重複減速
+        if now < self.decreased_until:
+            return False
+        if self.concurrency > self.min_concurrency:
+            self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+        else:
+            self.delay = min(self.max_delay, max(self.delay * 2, self.min_delay, 0.25))
+        self.decreased_until = now + max(retry_after or 0, self.delay, 1.0)
+        return True
+
+    def on_success(self, latency, now=None):
+        """收到正常回應時呼叫,回傳 'increase' / 'decrease' / 'resume' / None"""
+        now = now if now is not None else time.time()
+        if self.retry_after_until and now >= self.retry_after_until:
+            # Retry-After 結束,恢復原本的延遲
+            self.retry_after_until = 0.0
+            return 'resume'
+        self.latencies.append(latency)
+        if len(self.latencies) < self.window or now < self.decreased_until:
+            return None
+
+        ordered = sorted(self.latencies)
+        # nearest-rank p90: 至少 90% 的延遲小於等於這個值
+        self.last_p90 = ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.9) - 1)]
+        self.latencies.clear()
+        if self.last_p90 > self.target_latency:
+            self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+            return 'decrease'
+        if self.delay > self.min_delay:
+            self.delay = max(self.min_delay, self.delay * 0.5 if self.delay > 0.05 else self.min_delay)
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        return 'increase'
+
+    def to_dict(self):
+        return {'concurrency': self.concurrency, 'delay': self.delay}
+
+
+class AdaptiveRateMiddleware:
+    """依回應自動調整各下載 slot 的併發數與延遲,取代手動調整 DOWNLOAD_DELAY / AutoThrottle
+
+    學到的安全速率會存在 STATE_DIR/rate_state.json,下次執行直接從該速率開始。
+    """
+
+    throttle_codes = (429, 503)
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        settings = crawler.settings
+        self.state_path = os.path.join(get_state_dir(settings), "rate_state.json")
+        self.options = {
+            'min_concurrency': settings.getint("RATE_CONTROL_MIN_CONCURRENCY", 1),
+            'max_concurrency': settings.getint("RATE_CONTROL_MAX_CONCURRENCY", settings.getint("CONCURRENT_REQUESTS")),
+            'min_delay': settings.getfloat("RATE_CONTROL_MIN_DELAY", 0.0),
+            'max_delay': settings.getfloat("RATE_CONTROL_MAX_DELAY", 60.0),
+            'target_latency': settings.getfloat("RATE_CONTROL_TARGET_LATENCY", 2.0),
+            'window': settings.getint("RATE_CONTROL_WINDOW", 20),
+        }
+        self.start_concurrency = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+        self.start_delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.learned = {}
+        self.controllers = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("RATE_CONTROL_ENABLED"):
+            raise NotConfigured
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.learned = json.load(f)
+            spider.logger.info(f"速率控制: 載入上次學到的速率 {self.learned}")
+
+    def spider_closed(self, spider):
+        self.learned.update({key: c.to_dict() for key, c in self.controllers.items()})
+        write_json_atomic(self.state_path, self.learned)
+
+    def process_response(self, request, response, spider):
+        key = request.meta.get('download_slot')
+        latency = request.meta.get('download_latency')
+        # 快取回應沒有實際連線,不列入計算
+        if key is None or latency is None or 'cached' in response.flags:
+            return response
+
+        controller = self._get_controller(key, spider)
+        if response.status in self.throttle_codes:
+            retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+            self.stats.inc_value('ratectl/throttled')
+            if retry_after:
+                self.stats.inc_value('ratectl/retry_after')
+            if controller.on_throttled(retry_after) or retry_after:
+                self._apply(key, controller, spider, f"{response.status} 限流")
+        else:
+            decision = controller.on_success(latency)
+            if decision:
+                self.stats.inc_value(f'ratectl/{decision}')
+                if controller.last_p90 is not None:
+                    self.stats.set_value('ratectl/p90_latency_ms', int(controller.last_p90 * 1000))
+                self._apply(key, controller, spider, decision)
+        return response
+
+    def _get_controller(self, key, spider):
+        if key not in self.controllers:
+            learned = self.learned.get(key)
+            controller = AimdController(
+                concurrency=(learned or {}).get('concurrency', self.start_concurrency),
+                delay=(learned or {}).get('delay', self.start_delay),
+                **self.options,
+            )
+            self.controllers[key] = controller
+            if learned:
+                self._apply(key, controller, spider, "沿用上次學到的速率")
+        return self.controllers[key]
+
+    def _apply(self, key, controller, spider, reason):
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+        slot.concurrency = max(1, int(controller.concurrency))
+        slot.delay = controller.current_delay()
+        self.stats.set_value('ratectl/concurrency', slot.concurrency)
+        self.stats.set_value('ratectl/delay', round(slot.delay, 3))
+        self.stats.max_value('ratectl/max_concurrency', slot.concurrency)
+        spider.logger.debug(f"速率控制 [{key}] {reason}: 併發 {slot.concurrency}, 延遲 {slot.delay:.2f}s")
+
+    @staticmethod
+    def _parse_retry_after(value):
+        """Retry-After 只處理秒數格式"""
+        if not value:
+            return None
+        try:
+            return float(value.decode('latin1'))
+        except ValueError:
+            return None
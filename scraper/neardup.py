@@ -0,0 +1,118 @@
+# 近似重複職缺偵測: 以 MinHash 簽章 + LSH 分桶找出內容幾乎相同、但 jobLink 不同的職缺 (重新刊登、人力仲介代徵等)
+
+import re
+
+import numpy as np
+
+# 每個 shingle 的字元數,中文以字為單位,3 個字可避免「工作」「經驗」這類常見詞造成誤判
+SHINGLE_SIZE = 3
+
+# 去掉空白與標點後再切 shingle,只差在排版或符號的職缺視為相同
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def shingles(text):
+    """回傳文字所有 SHINGLE_SIZE 個連續字元組成的 shingle (每個字元的 Unicode 碼位編碼成一個 uint64)
+
+    可能有重複的值,MinHash 只取最小值,不需要先去除重複。
+    """
+    text = _NON_WORD.sub('', text.lower())
+    if not text:
+        return np.empty(0, dtype=np.uint64)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < SHINGLE_SIZE:
+        codes = np.concatenate([codes, np.zeros(SHINGLE_SIZE - len(codes), dtype=np.uint64)])
+    # 碼位最多 21 位元,3 個字元剛好放進 64 位元,不會有碰撞
+    values = codes[:len(codes) - SHINGLE_SIZE + 1].copy()
+    for i in range(1, SHINGLE_SIZE):
+        values = (values << np.uint64(21)) | codes[i:len(codes) - SHINGLE_SIZE + 1 + i]
+    return values
+
+
+class MinHasher:
+    """One Permutation Hashing 版 MinHash: 每個 shingle 只雜湊一次,依雜湊值分到 num_perm 個區間,
+    各區間取最小值作為簽章;空的區間以右邊最近的非空區間補上 (rotation densification)。
+    計算量與 shingle 數成正比,不會隨 num_perm 倍增。兩份簽章相同的比例即 Jaccard 相似度的估計值
+    """
+
+    def __init__(self, num_perm=128, seed=104):
+        if num_perm & (num_perm - 1):
+            raise ValueError("num_perm 必須是 2 的次方")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bin_bits = np.uint64(num_perm.bit_length() - 1)
+        self.a = rng.integers(1, 2**63, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, dtype=np.uint64)
+
+    def signature(self, values):
+        """回傳 uint32 簽章,沒有 shingle 時回傳 None"""
+        if not len(values):
+            return None
+        # (a * x + b) mod 2^64,numpy 的 uint64 溢位即為 mod 2^64;高位元決定區間,接下來 32 位元為雜湊值
+        hashed = values * self.a + self.b
+        hashed ^= hashed >> np.uint64(31)
+        bins = hashed >> (np.uint64(64) - self.bin_bits)
+        keys = np.sort((bins << np.uint64(32)) | (hashed & np.uint64(0xFFFFFFFF)))
+        bins = keys >> np.uint64(32)
+        first = np.flatnonzero(np.diff(bins, prepend=np.uint64(self.num_perm)))
+
+        signature = np.empty(self.num_perm, dtype=np.uint32)
+        filled = bins[first].astype(np.intp)
+        signature[filled] = keys[first].astype(np.uint32)
+        if len(filled) < self.num_perm:
+            # 空區間取右邊 (循環) 最近的非空區間,加上距離避免與該區間的值完全相同
+            present = np.zeros(self.num_perm, dtype=bool)
+            present[filled] = True
+            empty = np.flatnonzero(~present)
+            nearest = np.searchsorted(filled, empty) % len(filled)
+            distance = (filled[nearest] - empty) % self.num_perm
+            signature[empty] = signature[filled[nearest]] + (distance * 0x9E3779B1).astype(np.uint32)
+        return signature
+
+
+class NearDuplicateIndex:
+    """增量的 LSH 索引,每筆職缺只和同一個桶內的職缺比對,不需要兩兩比對
+
+    簽章切成 bands 段、每段 rows 個值,任一段完全相同的職缺才會成為候選,
+    再以整份簽章估計相似度,達到 threshold 才歸為同一組。
+    預設 16 段 x 8 個值,相似度約 0.7 以上的職缺有很高機率成為候選。
+    """
+
+    def __init__(self, threshold=0.8, bands=16, rows=8, seed=104):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.hasher = MinHasher(bands * rows, seed)
+        # 每段簽章壓成一個 uint64 作為桶的 key,桶內只記第一個進來的職缺
+        self._band_mix = np.random.default_rng(seed + 1).integers(1, 2**63, size=rows, dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = np.empty((1024, bands * rows), dtype=np.uint32)
+        self._groups = []
+
+    def __len__(self):
+        return len(self._groups)
+
+    def add(self, text, group):
+        """加入一筆職缺,回傳 (所屬群組, 相似度);沒有近似重複的職缺時回傳 (group, None)"""
+        signature = self.hasher.signature(shingles(text))
+        if signature is None:
+            return group, None
+        keys = (signature.reshape(self.bands, self.rows).astype(np.uint64) * self._band_mix).sum(axis=1).tolist()
+
+        candidates = {bucket[key] for bucket, key in zip(self._buckets, keys) if key in bucket}
+        similarity = None
+        if candidates:
+            candidates = list(candidates)
+            scores = (self._signatures[candidates] == signature).mean(axis=1)
+            best = int(scores.argmax())
+            if scores[best] >= self.threshold:
+                group, similarity = self._groups[candidates[best]], float(scores[best])
+
+        index = len(self._groups)
+        if index == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[index] = signature
+        self._groups.append(group)
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, index)
+        return group, similarity
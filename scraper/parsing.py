@@ -0,0 +1,79 @@
+# 搜尋結果的批次解析: 整頁一次轉換,代碼對照表在模組層級預先建好
+
+import json
+from datetime import datetime
+from functools import lru_cache
+
+from scraper.items import JobItem, intern_text, to_number
+
+# 有安裝 orjson 時使用較快的 JSON 解碼器
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_DECODER = 'orjson'
+except ImportError:
+    _loads = json.loads
+    JSON_DECODER = 'json'
+
+# 工作型態代碼
+JOB_ROLE_TEXT = {1: '正職', 2: '兼職', 3: '高階'}
+
+# 遠端工作代碼
+REMOTE_WORK_TEXT = {0: '不可遠端', 1: '完全遠端', 2: '部分遠端'}
+
+# 薪資型態代碼
+SALARY_TYPE_TEXT = {'H': '時薪', 'D': '日薪', 'M': '月薪', 'Y': '年薪', '': '面議'}
+
+
+def decode_page(body):
+    """解碼 /jobs/search/list 的回應,回傳 data 區塊"""
+    return _loads(body)["data"]
+
+
+@lru_cache(maxsize=4096)
+def format_appear_date(appear_date):
+    """將 20250101 格式的日期轉為 2025-01-01 (同一頁的日期大多相同,結果會被快取)"""
+    return datetime.strptime(appear_date, "%Y%m%d").strftime("%Y-%m-%d") if appear_date else ''
+
+
+def _same(value):
+    return value
+
+
+def parse_jobs(jobs, keyword, compact=False):
+    """將一整頁的職缺轉為輸出用的 item
+
+    compact=True 時輸出 JobItem: 重複的文字欄位共用同一個字串,薪資與應徵人數轉為 int
+    """
+    role_text = JOB_ROLE_TEXT.get
+    remote_text = REMOTE_WORK_TEXT.get
+    salary_text = SALARY_TYPE_TEXT.get
+    make_item, text, number = (JobItem, intern_text, to_number) if compact else (dict, _same, _same)
+    items = []
+    for job in jobs:
+        get = job.get
+        link = get('link')
+        job_link = link.get('job') if link else None
+        major = get('major')
+        salary_type = get('salaryType', '')
+        items.append(make_item(
+            search_keyword=keyword,  # 記錄是用哪個關鍵字找到的
+            jobName=get('jobName', ''),
+            jobRole=role_text(get('jobRole', ''), '未知'),
+            jobAddrNoDesc=text(get('jobAddrNoDesc', '')),
+            jobAddress=get('jobAddress', ''),
+            description=get('description', ''),
+            optionEdu=text(get('optionEdu', '')),
+            periodDesc=text(get('periodDesc', '')),
+            applyCnt=number(get('applyCnt', 0)),
+            custName=text(get('custName', '')),
+            coIndustryDesc=text(get('coIndustryDesc', '')),
+            salaryLow=number(get('salaryLow', 0)),
+            salaryHigh=number(get('salaryHigh', 0)),
+            appearDate=format_appear_date(get('appearDate') or ''),
+            jobLink="https:" + job_link.split("?", 1)[0] if job_link else '',
+            remoteWorkType=remote_text(get('remoteWorkType', 0), '未知'),
+            major=text(','.join(major)) if major else '',
+            salaryType=salary_text(salary_type, salary_type),
+        ))
+    return items
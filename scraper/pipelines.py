@@ -1,23 +1,398 @@
 # 簡化版 Pipeline - 不需要 Elasticsearch
 
+import json
+import os
+from datetime import datetime
+
 from itemadapter import ItemAdapter
-from scrapy.exceptions import DropItem
+from scrapy import Request, signals
+from scrapy.exceptions import DontCloseSpider, DropItem, NotConfigured
+
+from scraper.changes import FingerprintStore, diff_fields, fingerprint
+from scraper.dedup import PersistentSeenJobs, SeenJobs
+from scraper.detail import get_job_id
+from scraper.merge import ItemHeld, KeywordMergeStore
+from scraper.neardup import NearDuplicateIndex
+from scraper.salary import SALARY_FIELDS, salary_stats
+from scraper.sinks import ThreadedSinkPipeline
+from scraper.state import get_state_dir
+from scraper.storage import JobDatabase
+
+
+class KeywordMergePipeline:
+    """同一職缺出現在多個關鍵字時合併為一筆,保留所有關鍵字 (search_keywords) 與各自的頁數-名次 (search_positions)
+
+    爬取期間 item 先暫存到磁碟 (STATE_DIR/keyword_merge),所有頁面爬完、爬蟲閒置時才逐筆輸出合併結果,
+    輸出的 item 會再經過後面的 pipeline。有檢查點 (task_id) 時暫存區跟著檢查點保存,接續時沿用。
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.store = None
+        self.emitted = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("KEYWORD_MERGE_ENABLED"):
+            raise NotConfigured
+        pipeline = cls(crawler)
+        crawler.signals.connect(pipeline.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        state_dir = get_state_dir(spider.settings)
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is not None:
+            # 頁面完成後就不會重新抓取,暫存的 item 要立即寫入,檢查點才不會記錄到還沒存下的職缺
+            path = f"{os.path.splitext(checkpoint.path)[0]}.merge.sqlite"
+            self.store = KeywordMergeStore(path, autocommit=True)
+        else:
+            store_dir = os.path.join(state_dir, "keyword_merge")
+            os.makedirs(store_dir, exist_ok=True)
+            path = os.path.join(store_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{id(self)}.sqlite")
+            self.store = KeywordMergeStore(path)
+        spider.logger.info(f"關鍵字合併: 暫存區 {path}")
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        # 合併後輸出的 item 直接往下傳
+        if 'search_keywords' in adapter:
+            return item
+        if not self.store.add(adapter.asdict()):
+            self.stats.inc_value('keyword_merge/merged')
+        raise ItemHeld(f"暫存待合併: {adapter.get('jobName')}")
+
+    def spider_idle(self, spider):
+        """其他頁面都處理完才輸出合併結果 (分散式爬取時佇列還有工作會先繼續爬)"""
+        if self.emitted or not self.crawler.engine.spider_is_idle():
+            return
+        self.emitted = True
+        self.store.commit()
+        request = Request(
+            "data:,", callback=self.emit_merged, dont_filter=True, priority=-100, meta={'dont_cache': True},
+        )
+        self.crawler.engine.crawl(request)
+        raise DontCloseSpider
+
+    def emit_merged(self, response):
+        count = 0
+        for item in self.store.merged_items():
+            count += 1
+            yield item
+        self.stats.set_value('keyword_merge/items', count)
+        self.crawler.spider.logger.info(f"關鍵字合併: 輸出 {count} 筆職缺")
+
+    def spider_closed(self, spider, reason):
+        if self.store is None:
+            return
+        resumable = getattr(spider, 'checkpoint', None) is not None
+        if reason != 'finished' and resumable:
+            self.store.close()
+            return
+        if reason != 'finished' and not self.emitted:
+            spider.logger.warning(f"爬蟲中斷 ({reason}),暫存的 {len(self.store)} 筆職缺未輸出 (使用 task_id 才能接續)")
+        self.store.close(remove=True)
+
+
+class ChangeDetectionPipeline:
+    """比對上次執行的職缺指紋,標記新增 / 變動的職缺,未變動的職缺不輸出
+
+    每個事件 (new / changed / disappeared) 寫到 STATE_DIR/changes/<時間>.jsonl,
+    changed 事件附上變動欄位的新舊值。
+    """
+
+    def __init__(self, store, events_dir, disappear_after, stats):
+        self.store = store
+        self.events_dir = events_dir
+        self.disappear_after = disappear_after
+        self.stats = stats
+        self.events_file = None
+        self.seen_ids = set()
+        # 未變動而不輸出的職缺;在其他關鍵字重複出現時也不輸出 (CsvPipeline 沒看過這些職缺,不會替它們去重)
+        self.unchanged_ids = set()
+        self.keywords = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("CHANGE_DETECTION_ENABLED"):
+            raise NotConfigured
+        state_dir = get_state_dir(settings)
+        pipeline = cls(
+            FingerprintStore(os.path.join(state_dir, "fingerprints.sqlite")),
+            os.path.join(state_dir, "changes"),
+            settings.getint("CHANGE_DISAPPEAR_AFTER_RUNS", 2),
+            crawler.stats,
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        spider.logger.info(f"變動偵測: 已載入 {len(self.store)} 筆職缺指紋")
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        job_id = PersistentSeenJobs.job_number(adapter.get('jobLink'))
+        if job_id in self.unchanged_ids:
+            raise DropItem(f"職缺沒有變動: {adapter.get('jobName')}")
+        # 同一次執行重複出現的職缺交給 CsvPipeline 去重
+        if job_id is None or job_id in self.seen_ids:
+            return item
+        self.seen_ids.add(job_id)
+        keyword = adapter.get('search_keyword', '')
+        self.keywords.add(keyword)
+
+        value = fingerprint(adapter)
+        previous = self.store.get(job_id)
+        if previous == value:
+            self.stats.inc_value('changes/unchanged')
+            self.unchanged_ids.add(job_id)
+            raise DropItem(f"職缺沒有變動: {adapter.get('jobName')}")
+
+        event = {'type': 'new' if previous is None else 'changed'}
+        if previous is not None:
+            diff = diff_fields(self.store.fields(job_id), adapter)
+            event['diff'] = diff
+            adapter['changedFields'] = ','.join(diff)
+        self.store.put(job_id, keyword, value, adapter)
+        adapter['changeType'] = event['type']
+        self._emit(event, adapter)
+        return item
+
+    def spider_closed(self, spider, reason):
+        finished = reason == 'finished'
+        # 只有完整跑完才判斷下架,中途中斷時還沒搜尋到的職缺不能算下架
+        if finished and self.keywords:
+            for fields in self.store.sweep(self.keywords, self.seen_ids, self.disappear_after):
+                self._emit({'type': 'disappeared'}, fields)
+        self.store.close(commit=finished)
+        if self.events_file is not None:
+            self.events_file.close()
+            spider.logger.info(f"變動偵測: 事件已寫入 {self.events_file.name}")
+
+    def _emit(self, event, item):
+        if self.events_file is None:
+            os.makedirs(self.events_dir, exist_ok=True)
+            filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+            self.events_file = open(os.path.join(self.events_dir, filename), 'a', encoding='utf-8')
+        event.update({
+            'jobLink': item.get('jobLink'),
+            'jobName': item.get('jobName'),
+            'custName': item.get('custName'),
+            'at': datetime.now().isoformat(timespec='seconds'),
+        })
+        self.events_file.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.stats.inc_value(f"changes/{event['type']}")
 
 
 class CsvPipeline:
-    """簡單的去重處理,重複的職缺會被跳過"""
-    
-    def __init__(self):
-        self.seen_jobs = set()
-    
+    """簡單的去重處理,重複的職缺會被跳過
+
+    DEDUP_INDEX_ENABLED=true 時改用跨次執行的去重索引,之前執行輸出過的職缺也會被跳過。
+    """
+
+    def __init__(self, seen_jobs=None):
+        self.seen_jobs = seen_jobs if seen_jobs is not None else SeenJobs()
+        self.dedup_index = seen_jobs if isinstance(seen_jobs, PersistentSeenJobs) else None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("DEDUP_INDEX_ENABLED"):
+            return cls()
+        pipeline = cls(PersistentSeenJobs.load(
+            os.path.join(get_state_dir(settings), "dedup_index.bin"),
+            expire_weeks=settings.getint("DEDUP_INDEX_EXPIRE_WEEKS", 8),
+        ))
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        # 分散式爬取時與其他 worker 共用去重集合
+        distributed_crawl = getattr(spider, 'distributed_crawl', None)
+        if distributed_crawl is not None:
+            self.seen_jobs = distributed_crawl.seen_jobs
+
+        # 從檢查點接續時,已輸出過的職缺不再重複輸出
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is not None and checkpoint.resumed:
+            for job_link in checkpoint.seen_jobs:
+                self.seen_jobs.add(job_link)
+
+        if self.dedup_index is not None and self.seen_jobs is self.dedup_index:
+            spider.logger.info(f"去重索引: 已載入 {len(self.dedup_index)} 筆職缺")
+
+    def spider_closed(self, spider, reason):
+        # 中途中斷時不更新索引,接續或重跑時才不會把還沒輸出的職缺當成重複
+        if reason == 'finished' and self.seen_jobs is self.dedup_index:
+            self.dedup_index.save()
+
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
-        
+
         # 使用 jobLink 作為唯一識別
         job_link = adapter.get('jobLink')
-        
-        if job_link in self.seen_jobs:
+
+        if not self.seen_jobs.add(job_link):
             raise DropItem(f"重複職缺: {adapter.get('jobName')}")
-        else:
-            self.seen_jobs.add(job_link)
+        return item
+
+
+class NearDuplicatePipeline:
+    """以 jobName + description 的 MinHash/LSH 找出近似重複的職缺,標上相同的 dup_group
+
+    dup_group 為該組第一筆職缺的職缺代碼,沒有近似重複的職缺即為自己的代碼;職缺不會被丟棄,
+    統計不重複的職缺數時以 dup_group 計算即可。
+    """
+
+    def __init__(self, index, stats):
+        self.index = index
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("NEAR_DUP_ENABLED"):
+            raise NotConfigured
+        return cls(NearDuplicateIndex(threshold=settings.getfloat("NEAR_DUP_THRESHOLD", 0.8)), crawler.stats)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        text = f"{adapter.get('jobName') or ''} {adapter.get('description') or ''}"
+        group, similarity = self.index.add(text, get_job_id(adapter.get('jobLink')))
+        adapter['dup_group'] = group
+        if similarity is not None:
+            self.stats.inc_value('neardup/duplicates')
+            spider.logger.debug(f"近似重複職缺 ({similarity:.2f}): {adapter.get('jobName')} -> {group}")
+        return item
+
+    def close_spider(self, spider):
+        duplicates = self.stats.get_value('neardup/duplicates', 0)
+        spider.logger.info(f"近似重複偵測: {len(self.index)} 筆職缺中有 {duplicates} 筆為近似重複")
+
+
+class SalaryStatsPipeline:
+    """收集薪資相關欄位,結束時換算成月薪並分組統計,寫到 STATE_DIR/salary/<時間>.json"""
+
+    def __init__(self, report_dir, group_by, stats):
+        self.report_dir = report_dir
+        self.group_by = group_by
+        self.stats = stats
+        self.columns = {field: [] for field in SALARY_FIELDS}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("SALARY_STATS_ENABLED"):
+            raise NotConfigured
+        pipeline = cls(
+            os.path.join(get_state_dir(settings), "salary"),
+            settings.getlist("SALARY_STATS_GROUP_BY", ['keyword', 'industry', 'city']),
+            crawler.stats,
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        for field, values in self.columns.items():
+            values.append(adapter.get(field))
+        return item
+
+    def spider_closed(self, spider, reason):
+        if not self.columns['salaryLow']:
+            return
+        overall = salary_stats(self.columns)
+        report = {'generated_at': datetime.now().isoformat(timespec='seconds'), 'reason': reason,
+                  'overall': overall['groups'][0], 'bin_edges': overall['bin_edges']}
+        for group_by in self.group_by:
+            report[group_by] = salary_stats(self.columns, group_by)['groups']
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        summary = report['overall']
+        self.stats.set_value('salary/paid', summary['paid'])
+        self.stats.set_value('salary/negotiable', summary['negotiable'])
+        if summary['percentiles'].get('p50') is not None:
+            self.stats.set_value('salary/median_monthly', summary['percentiles']['p50'])
+        spider.logger.info(f"薪資統計: {summary['paid']} 筆有薪資,月薪中位數 {summary['percentiles'].get('p50')},"
+                           f"報告已寫入 {path}")
+
+
+class SqlitePipeline(ThreadedSinkPipeline):
+    """把職缺寫入 SQLite 資料庫 (SQLITE_DB_PATH),供 API / MCP 直接查詢
+
+    在背景執行緒每累積 SQLITE_BATCH_SIZE 筆或每隔 SQLITE_BATCH_MS 毫秒以一個 transaction 寫入,
+    每次執行記錄在 runs 表 (開始/結束時間、關鍵字、筆數、結束原因)。
+    SEARCH_INDEX_ENABLED=true 時同時更新全文檢索索引。
+    """
+
+    stats_prefix = 'sqlite'
+
+    def __init__(self, path, stats, queue_size=1000, batch_size=500, batch_ms=500, search_index=False):
+        super().__init__(stats, queue_size, batch_size, batch_ms)
+        self.path = path
+        self.search_index = search_index
+        self.item_count = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("SQLITE_ENABLED"):
+            raise NotConfigured
+        pipeline = cls(
+            settings.get("SQLITE_DB_PATH"),
+            crawler.stats,
+            settings.getint("SINK_QUEUE_SIZE", 1000),
+            settings.getint("SQLITE_BATCH_SIZE", 500),
+            settings.getint("SQLITE_BATCH_MS", 500),
+            settings.getbool("SEARCH_INDEX_ENABLED"),
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_sink(self, spider):
+        self.db = JobDatabase(self.path, search_index=self.search_index)
+        self.run_id = self.db.start_run(getattr(spider, 'keywords', []))
+        spider.logger.info(f"資料庫: {self.path} (執行編號 {self.run_id})")
+
+    def write_batch(self, batch):
+        self.item_count += self.db.upsert_jobs(batch, self.run_id)
+
+    def spider_closed(self, spider, reason):
+        # close_spider 已等寫入執行緒結束,這裡只記錄結束原因
+        self.db.finish_run(self.run_id, reason, self.item_count)
+        self.db.close()
+        spider.logger.info(f"資料庫: 已寫入 {self.item_count} 筆職缺")
+
+
+class DistributedOutputPipeline(ThreadedSinkPipeline):
+    """分散式爬取時把 item 存到共用列表,由最後結束的 worker 合併輸出 (在背景執行緒批次寫入 Redis)"""
+
+    stats_prefix = 'distributed'
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats, crawler.settings.getint("SINK_QUEUE_SIZE", 1000), batch_size=500, batch_ms=200)
+
+    def open_spider(self, spider):
+        self.distributed_crawl = getattr(spider, 'distributed_crawl', None)
+        if self.distributed_crawl is not None:
+            super().open_spider(spider)
+
+    def process_item(self, item, spider):
+        if self.distributed_crawl is None:
             return item
+        return super().process_item(item, spider)
+
+    def write_batch(self, batch):
+        self.distributed_crawl.push_items(batch)
+
+    def close_spider(self, spider):
+        if self.distributed_crawl is not None:
+            return super().close_spider(spider)
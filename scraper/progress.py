@@ -0,0 +1,157 @@
+# 爬取進度的廣播 (供 api.py 的 Server-Sent Events 使用)
+#
+# 每個爬取只有一個取樣器在 reactor 執行緒定時讀取即時統計,內容有變化時編碼成一則 SSE 事件;
+# 所有觀看者共用同一則已編碼的事件,觀看者再多也不會多讀統計或多做 JSON 編碼。
+# 觀看者跟不上時只會收到最新的進度 (中間的進度被略過),不會累積待送的事件。
+
+import json
+import os
+import threading
+import time
+
+from twisted.internet.task import LoopingCall
+
+from scraper.manifest import find_output
+from scraper.runner import _get_reactor
+
+# 進度事件的欄位 -> 爬蟲統計
+PROGRESS_STATS = {
+    'keyword': 'progress/keyword',
+    'pages': 'progress/pages',
+    'requests': 'downloader/response_count',
+    'items': 'item_scraped_count',
+    'dropped': 'item_dropped_count',
+    'errors': 'log_count/ERROR',
+}
+
+
+def _encode(seq, event, data):
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+class CrawlProgress:
+    """一個爬取的進度: 每 interval 秒取樣一次,結束時送出 done 事件
+
+    timeout 秒後仍未結束會停止爬蟲 (狀態為 timeout)。
+    """
+
+    def __init__(self, handle, keywords=None, interval=1.0, timeout=None):
+        self.handle = handle
+        self.crawl_id = handle.crawl_id
+        self.keywords = list(keywords or [])
+        self.started_at = time.time()
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.done = False
+        self.timed_out = False
+        self.loop = None
+        self.deadline = None
+        self._publish('progress', self._progress({}))
+
+        reactor = _get_reactor()
+        reactor.callFromThread(self._start, reactor, interval, timeout)
+        # 結束時由 reactor 執行緒呼叫 (已經結束時立即呼叫)
+        handle.future.add_done_callback(lambda _: reactor.callFromThread(self._finished))
+
+    # ============================================
+    # 觀看者 (Flask 執行緒)
+    # ============================================
+
+    @property
+    def snapshot(self):
+        """目前的進度 (或結束時的結果)"""
+        with self.condition:
+            return self.data
+
+    def subscribe(self, last_id=0, keepalive=15):
+        """產生 SSE 訊息 (bytes): 先送出目前的進度,之後有新進度才送出,結束後送出 done 事件並停止
+
+        last_id 為客戶端重新連線時的 Last-Event-ID;沒有新進度時每 keepalive 秒送出註解行保持連線。
+        """
+        while True:
+            with self.condition:
+                if self.seq <= last_id and not self.done:
+                    self.condition.wait(keepalive)
+                seq, message, done = self.seq, self.message, self.done
+            if seq > last_id:
+                last_id = seq
+                yield message
+            elif not done:
+                yield b": keepalive\n\n"
+            if done:
+                return
+
+    # ============================================
+    # 取樣 (reactor 執行緒)
+    # ============================================
+
+    def _start(self, reactor, interval, timeout):
+        if self.done:
+            return
+        self.loop = LoopingCall(self._sample)
+        self.loop.start(interval, now=False)
+        if timeout:
+            self.deadline = reactor.callLater(timeout, self._timeout)
+
+    def _progress(self, stats):
+        progress = {'crawl_id': self.crawl_id, 'status': 'running', 'keywords': self.keywords}
+        for field, key in PROGRESS_STATS.items():
+            progress[field] = stats.get(key, None if field == 'keyword' else 0)
+        progress['elapsed'] = round(time.time() - self.started_at, 1)
+        return progress
+
+    def _sample(self):
+        crawler = self.handle.crawler
+        if crawler is None or crawler.stats is None:
+            return
+        self._spider_keywords(crawler)
+        progress = self._progress(crawler.stats.get_stats())
+        # 除了經過時間之外都沒變時不送出,觀看者不會被無意義地喚醒
+        if {**progress, 'elapsed': None} != {**self.data, 'elapsed': None}:
+            self._publish('progress', progress)
+
+    def _spider_keywords(self, crawler):
+        # 沒有指定關鍵字時爬蟲使用 .env 的設定
+        if not self.keywords and getattr(crawler, 'spider', None) is not None:
+            self.keywords = list(getattr(crawler.spider, 'keywords', None) or [])
+
+    def _timeout(self):
+        self.deadline = None
+        self.timed_out = True
+        self.handle.cancel()
+
+    def _finished(self):
+        if self.done:
+            return
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        if self.deadline is not None and self.deadline.active():
+            self.deadline.cancel()
+
+        if self.handle.crawler is not None:
+            self._spider_keywords(self.handle.crawler)
+        result = {'crawl_id': self.crawl_id, 'keywords': self.keywords,
+                  'elapsed': round(time.time() - self.started_at, 1)}
+        error = self.handle.future.exception()
+        if error is not None:
+            result.update(status='failed', error=str(error))
+        else:
+            crawl = self.handle.future.result()
+            manifest = find_output(os.path.dirname(crawl.output), path=crawl.output) if crawl.output else None
+            result.update(
+                status='timeout' if self.timed_out else 'finished',
+                finish_reason=crawl.stats.get('finish_reason'),
+                output=os.path.basename(crawl.output) if crawl.output else None,
+                job_count=crawl.item_count,
+                checksum=manifest['checksum'] if manifest else None,
+                **{field: crawl.stats.get(key, 0) for field, key in PROGRESS_STATS.items() if field != 'keyword'},
+            )
+        self._publish('done', result, done=True)
+
+    def _publish(self, event, data, done=False):
+        with self.condition:
+            self.seq += 1
+            self.data = data
+            self.message = _encode(self.seq, event, data)
+            self.done = done
+            self.condition.notify_all()
@@ -0,0 +1,277 @@
+# 薪資換算與統計: 時薪 / 日薪 / 年薪一律換算成月薪,整欄一次以 NumPy 計算,再依關鍵字、產業、地區分組統計
+#
+#     python -m scraper.salary ai_jobs_20250101_120000.csv --group-by industry
+#
+# 104 的薪資欄位:
+#     面議               salaryLow = salaryHigh = 0 (依規定月薪 4 萬以上才能標面議)
+#     40,000 元以上      salaryHigh = 9999999
+#     時薪 / 日薪 / 年薪  salaryType 標示單位
+
+import argparse
+import csv
+import json
+import os
+import re
+
+import numpy as np
+
+from scraper.manifest import latest_output
+from scraper.storage import JobDatabase
+
+# salaryHigh 以此值表示「以上」(沒有上限)
+OPEN_ENDED_SALARY = 9999999
+
+# 換算成月薪的倍數: 每月以 22 個工作天、每天 8 小時計算,年薪以 12 個月計算 (不含年終)
+HOURS_PER_MONTH = 176
+DAYS_PER_MONTH = 22
+MONTHLY_FACTORS = {
+    '月薪': 1.0, 'M': 1.0,
+    '年薪': 1 / 12, 'Y': 1 / 12,
+    '日薪': DAYS_PER_MONTH, 'D': DAYS_PER_MONTH,
+    '時薪': HOURS_PER_MONTH, 'H': HOURS_PER_MONTH,
+}
+NEGOTIABLE_TYPES = {'面議', ''}
+
+# 換算後的合理月薪範圍,超出範圍多半是單位標錯
+PLAUSIBLE_MONTHLY = (5000, 1000000)
+
+# 分組欄位
+GROUP_FIELDS = {
+    'keyword': 'search_keyword',
+    'industry': 'coIndustryDesc',
+    'area': 'jobAddrNoDesc',
+    'city': 'jobAddrNoDesc',
+}
+
+# 統計用到的欄位
+SALARY_FIELDS = ('salaryLow', 'salaryHigh', 'salaryType', 'search_keyword', 'search_keywords',
+                 'coIndustryDesc', 'jobAddrNoDesc')
+
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+FLAGS = ('negotiable', 'open_ended', 'unknown_unit', 'implausible')
+
+_CITY = re.compile(r'^.*?[市縣]|^.*')
+
+
+def _to_numbers(values):
+    """轉成 float 陣列 ('0040000' 這類字串也可以),無法轉換的值為 NaN"""
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf':
+        return values.astype(np.float64)
+    try:
+        return np.fromiter(map(float, values), np.float64, count=len(values))
+    except (TypeError, ValueError):
+        pass
+    result = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        try:
+            result[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+def _categorize(values):
+    """回傳 (排序後的不重複值, 每筆資料對應的索引),None 視為空字串
+
+    不重複的值通常很少 (薪資型態、產業、地區),以 dict 對照比 np.unique 排序整欄字串快。
+    """
+    if isinstance(values, np.ndarray):
+        names, codes = np.unique(values.astype(str), return_inverse=True)
+        return names.tolist(), codes
+    unique = set(values)
+    if None in unique:
+        values = ['' if v is None else v for v in values]
+        unique = set(values)
+    names = sorted(unique)
+    index = {name: i for i, name in enumerate(names)}
+    return names, np.fromiter(map(index.__getitem__, values), np.intp, count=len(values))
+
+
+def normalize_salaries(low, high, salary_type):
+    """把整欄薪資換算成月薪,回傳 dict (每個值都是和輸入等長的陣列)
+
+    monthly_low / monthly_high  月薪下限 / 上限,沒有數字 (面議、沒有上限、單位不明) 時為 NaN
+    monthly_estimate            有上限時取上下限的中間值,否則取下限
+    negotiable                  面議
+    open_ended                  只有下限 (XX 元以上)
+    unknown_unit                無法換算的薪資型態 (例如論件計酬)
+    implausible                 換算後的月薪不在 PLAUSIBLE_MONTHLY 範圍內 (月薪值都設為 NaN)
+    """
+    low, high = _to_numbers(low), _to_numbers(high)
+    types, codes = _categorize(salary_type)
+    factors = np.array([MONTHLY_FACTORS.get(t, np.nan) for t in types] or [np.nan])[codes]
+    negotiable_type = np.array([t in NEGOTIABLE_TYPES for t in types] or [False])[codes]
+
+    negotiable = negotiable_type | ((np.nan_to_num(low) <= 0) & (np.nan_to_num(high) <= 0))
+    open_ended = ~negotiable & (high >= OPEN_ENDED_SALARY)
+    unknown_unit = ~negotiable & np.isnan(factors)
+
+    with np.errstate(invalid='ignore'):
+        monthly_low = np.where(~negotiable & (low > 0), low * factors, np.nan)
+        monthly_high = np.where(~negotiable & ~open_ended & (high > 0), high * factors, np.nan)
+    monthly_estimate = np.where(np.isnan(monthly_high), monthly_low, (monthly_low + monthly_high) / 2)
+    monthly_estimate = np.where(np.isnan(monthly_low), monthly_high, monthly_estimate)
+
+    # 單位標錯 (例如月薪標成時薪) 的資料換算後不合理,不列入統計
+    with np.errstate(invalid='ignore'):
+        implausible = (monthly_estimate < PLAUSIBLE_MONTHLY[0]) | (monthly_estimate > PLAUSIBLE_MONTHLY[1])
+    for column in (monthly_low, monthly_high, monthly_estimate):
+        column[implausible] = np.nan
+    return {
+        'monthly_low': monthly_low,
+        'monthly_high': monthly_high,
+        'monthly_estimate': monthly_estimate,
+        'negotiable': negotiable,
+        'open_ended': open_ended,
+        'unknown_unit': unknown_unit,
+        'implausible': implausible,
+    }
+
+
+def _group_keys(columns, group_by, count):
+    """回傳 (每筆資料的列索引, 分組索引, 分組名稱);一個職缺對應多個關鍵字時在每個關鍵字各算一次"""
+    if group_by is None:
+        return np.arange(count), np.zeros(count, dtype=np.intp), [None]
+    if group_by not in GROUP_FIELDS:
+        raise ValueError(f"不支援的分組: {group_by} (可用: {', '.join(GROUP_FIELDS)})")
+    if group_by == 'keyword' and columns.get('search_keywords') is not None:
+        values = [v if isinstance(v, (list, tuple)) else (v.split(',') if v else []) for v in columns['search_keywords']]
+        fallback = columns.get('search_keyword') or [''] * count
+        values = [v or [k] for v, k in zip(values, fallback)]
+        rows = np.repeat(np.arange(count), [len(v) for v in values])
+        return (rows, *_categorize([k for v in values for k in v])[::-1])
+    names, codes = _categorize(columns.get(GROUP_FIELDS[group_by]) or [''] * count)
+    if group_by == 'city':
+        # 台北市中山區 -> 台北市、新竹縣竹北市 -> 新竹縣
+        cities, city_codes = _categorize([_CITY.match(name).group() for name in names])
+        names, codes = cities, city_codes[codes]
+    return np.arange(count), codes, names
+
+
+def salary_stats(columns, group_by=None, percentiles=DEFAULT_PERCENTILES, bin_width=10000, max_salary=200000):
+    """依 group_by (keyword / industry / area / city,None 表示不分組) 統計換算後的月薪
+
+    columns 為欄位名稱 -> 值列表 (至少要有 salaryLow、salaryHigh、salaryType 與分組欄位)。
+    百分位數與直方圖以 monthly_estimate 計算,直方圖每 bin_width 元一格,max_salary 以上併入最後一格。
+    """
+    count = len(columns['salaryLow'])
+    normalized = normalize_salaries(columns['salaryLow'], columns['salaryHigh'], columns['salaryType'])
+    rows, groups, names = _group_keys(columns, group_by, count)
+    n_groups = len(names)
+
+    def per_group(flag):
+        return np.bincount(groups, weights=flag[rows], minlength=n_groups).astype(int)
+
+    totals = np.bincount(groups, minlength=n_groups)
+    flags = {name: per_group(normalized[name]) for name in FLAGS}
+
+    # 只取有數字的資料,依 (分組, 月薪) 排序後每組是連續的一段,所有分組的百分位數一次算完
+    values = normalized['monthly_estimate'][rows]
+    valid = ~np.isnan(values)
+    values, value_groups = values[valid], groups[valid]
+    order = np.lexsort((values, value_groups))
+    values, value_groups = values[order], value_groups[order]
+    paid = np.bincount(value_groups, minlength=n_groups)
+    starts = np.cumsum(paid) - paid
+    sums = np.bincount(value_groups, weights=values, minlength=n_groups)
+
+    quantiles = {}
+    for p in percentiles:
+        position = starts + (np.maximum(paid, 1) - 1) * (p / 100)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, starts + paid - 1)
+        if len(values):
+            lower_values = values[np.minimum(lower, len(values) - 1)]
+            upper_values = values[np.clip(upper, 0, len(values) - 1)]
+            quantiles[p] = np.where(paid > 0, lower_values + (upper_values - lower_values) * (position - lower), np.nan)
+        else:
+            quantiles[p] = np.full(n_groups, np.nan)
+
+    n_bins = int(max_salary // bin_width) + 1
+    bins = np.minimum((values // bin_width).astype(int), n_bins - 1)
+    histogram = np.bincount(value_groups * n_bins + bins, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+    result = []
+    for i in np.argsort(-totals, kind='stable'):
+        result.append({
+            'group': names[i],
+            'count': int(totals[i]),
+            'paid': int(paid[i]),
+            **{name: int(flags[name][i]) for name in FLAGS},
+            'mean': round(sums[i] / paid[i]) if paid[i] else None,
+            'percentiles': {f"p{p}": None if np.isnan(q[i]) else round(float(q[i])) for p, q in quantiles.items()},
+            'histogram': histogram[i].tolist(),
+        })
+    return {
+        'group_by': group_by,
+        'bin_edges': [i * bin_width for i in range(n_bins)],
+        'groups': result,
+    }
+
+
+def load_columns(path, fields=SALARY_FIELDS):
+    """讀取輸出檔 (csv / parquet) 的指定欄位,回傳欄位名稱 -> 值列表 (檔案沒有的欄位為 None)"""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=[f for f in fields if f in pq.read_schema(path).names])
+        columns = {name: table.column(name).to_pylist() for name in table.column_names}
+        if columns.get('salaryType') is not None:
+            columns['salaryType'] = [t or '' for t in columns['salaryType']]
+        return {field: columns.get(field) for field in fields}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        index = {field: header.index(field) for field in fields if field in header}
+        columns = {field: [] for field in index}
+        for row in reader:
+            for field, i in index.items():
+                columns[field].append(row[i])
+    return {field: columns.get(field) for field in fields}
+
+
+def file_salary_stats(path, group_by=None, **kwargs):
+    """輸出檔的薪資統計"""
+    return salary_stats(load_columns(path), group_by, **kwargs)
+
+
+def latest_columns(directory='.'):
+    """最近一次爬取的薪資欄位,回傳 (資料來源, 欄位);找不到資料時回傳 (None, None)
+
+    有資料庫 (SQLITE_ENABLED=true) 時取最後一次完成的執行,否則讀取輸出檔索引中最新的 csv / parquet 檔。
+    """
+    db = JobDatabase.open_existing()
+    if db is not None:
+        try:
+            run = db.latest_run()
+            if run is not None:
+                return f"{db.path} (執行編號 {run['id']})", db.salary_columns(run['id'])
+        finally:
+            db.close()
+    latest = latest_output(directory, formats=('csv', 'parquet'))
+    if latest is None:
+        return None, None
+    return latest['file'], load_columns(latest['path'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="輸出檔的薪資統計 (換算成月薪)")
+    parser.add_argument('path', help="爬蟲輸出檔 (csv / parquet)")
+    parser.add_argument('--group-by', choices=list(GROUP_FIELDS), help="分組欄位")
+    parser.add_argument('--output', help="把結果寫成 JSON 檔")
+    args = parser.parse_args()
+
+    stats = file_salary_stats(args.path, args.group_by)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        print(f"已寫入 {os.path.abspath(args.output)}")
+        return
+    print(f"{'分組':<20} {'筆數':>6} {'有薪資':>6} {'面議':>6} {'P25':>8} {'P50':>8} {'P75':>8}")
+    for group in stats['groups']:
+        q = group['percentiles']
+        print(f"{group['group'] or '全部':<20} {group['count']:>6} {group['paid']:>6} {group['negotiable']:>6} "
+              f"{q.get('p25') or '-':>8} {q.get('p50') or '-':>8} {q.get('p75') or '-':>8}")
+
+
+if __name__ == '__main__':
+    main()
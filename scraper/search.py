@@ -0,0 +1,90 @@
+# 職缺全文檢索: jobName / description / custName / major 的 CJK bigram 索引 (SQLite FTS5,存在職缺資料庫內)
+#
+# 查詢語法: 空白或 AND 表示兩者都要有、OR 表示其中之一、"..." 為完整片語、英文字尾加 * 為前綴、可用括號分組
+#     python -m scraper.search 'LLM OR 流程機器人'
+#     python -m scraper.search '"machine learning" 台北' --limit 20
+#     python -m scraper.search --reindex          # 為既有的資料庫建立索引
+
+import argparse
+import re
+
+# 中日韓文字 (含日文假名、韓文) 以連續兩個字為一個 token,其他文字以單字 (英數字) 為 token
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_PART = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+
+# 查詢字串: 片語、括號、其他以空白分隔的詞
+_QUERY_TOKEN = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+
+# 索引欄位與 BM25 權重: 職稱最重要,其次是公司名稱
+# 索引只存 token 位置不存原文 (content=''),原文在 jobs 表
+SEARCH_COLUMNS = {'job_name': 4.0, 'description': 1.0, 'company': 2.0, 'major': 1.0}
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS job_search USING fts5 ({', '.join(SEARCH_COLUMNS)}, content='', tokenize='ascii');
+INSERT INTO job_search (job_search, rank) VALUES ('rank', 'bm25({', '.join(map(str, SEARCH_COLUMNS.values()))})');
+"""
+
+
+def tokenize(text):
+    """切成 token 列表: 英數字轉小寫成一個 token,中文等連續文字切成重疊的兩字 token (只有一個字時保留該字)"""
+    if not text:
+        return []
+    tokens = []
+    for cjk, word in _PART.findall(str(text).lower()):
+        if len(cjk) > 1:
+            tokens += map(''.join, zip(cjk, cjk[1:]))
+        else:
+            tokens.append(cjk or word)
+    return tokens
+
+
+def index_text(text):
+    """存進索引的文字: token 以空白分隔,相鄰的 token 位置也相鄰,片語查詢等同子字串比對"""
+    return ' '.join(tokenize(text))
+
+
+def to_match_query(query):
+    """把查詢字串轉成 FTS5 MATCH 語法,沒有可查詢的詞時拋出 ValueError"""
+    terms, has_term = [], False
+    for phrase, left, right, word in _QUERY_TOKEN.findall(query):
+        if left or right:
+            terms.append(left or right)
+        elif not phrase and word in ('AND', 'OR', 'NOT'):
+            terms.append(word)
+        else:
+            text = phrase if phrase else word
+            prefix = not phrase and text.endswith('*')
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            terms.append('"' + ' '.join(tokens) + '"' + (' *' if prefix else ''))
+            has_term = True
+    if not has_term:
+        raise ValueError(f"沒有可查詢的詞: {query!r}")
+    return ' '.join(terms)
+
+
+def main():
+    from scraper.storage import JobDatabase, default_db_path
+
+    parser = argparse.ArgumentParser(description="搜尋職缺資料庫")
+    parser.add_argument('query', nargs='?', help="查詢字串")
+    parser.add_argument('--db', default=default_db_path(), help="資料庫位置")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--reindex', action='store_true', help="重新建立全文檢索索引")
+    args = parser.parse_args()
+
+    if args.reindex:
+        db = JobDatabase(args.db)
+        print(f"已建立索引: {db.rebuild_search_index()} 筆職缺")
+        db.close()
+    if args.query:
+        db = JobDatabase.open_existing(args.db)
+        if db is None:
+            parser.error(f"找不到資料庫: {args.db}")
+        for job in db.query_jobs(text=args.query, limit=args.limit):
+            print(f"{job['score']:8.3g}  {job['jobName']}  ({job['custName']})  {job['jobLink']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -33,7 +33,13 @@ COOKIES_ENABLED = False
 
 # Configure item pipelines
 ITEM_PIPELINES = {
+    "scraper.pipelines.KeywordMergePipeline": 200,
+    "scraper.pipelines.ChangeDetectionPipeline": 250,
     "scraper.pipelines.CsvPipeline": 300,
+    "scraper.pipelines.NearDuplicatePipeline": 350,
+    "scraper.pipelines.SalaryStatsPipeline": 400,
+    "scraper.pipelines.SqlitePipeline": 700,
+    "scraper.pipelines.DistributedOutputPipeline": 800,
 }
 
 # Feed exports - 從.env讀取輸出設定
@@ -69,8 +75,118 @@ FEEDS = {
     }
 }
 
+# Parquet 輸出 (OUTPUT_FORMAT=parquet,需要 pyarrow) - 每幾筆寫成一個 row group 與壓縮方式
+FEED_EXPORTERS = {
+    "parquet": "scraper.exporters.ParquetItemExporter",
+}
+if output_format == "parquet":
+    for _feed in FEEDS.values():
+        _feed['item_export_kwargs'] = {
+            'row_group_size': int(os.getenv("PARQUET_ROW_GROUP_SIZE", "10000")),
+            'compression': os.getenv("PARQUET_COMPRESSION", "zstd"),
+        }
+
+# 關鍵字合併 - 同一職缺出現在多個關鍵字時合併為一筆,列出所有關鍵字與各自的頁數-名次
+KEYWORD_MERGE_ENABLED = os.getenv("KEYWORD_MERGE_ENABLED", "false").lower() == "true"
+if KEYWORD_MERGE_ENABLED:
+    for _feed in FEEDS.values():
+        _index = _feed['fields'].index('search_keyword') + 1
+        _feed['fields'][_index:_index] = ['search_keywords', 'search_positions']
+
+# 輸出檔索引 - 爬取結束時把輸出檔的筆數、欄位、sha256 與預覽寫進 ai_jobs.manifest.json,API / MCP 直接讀取
+MANIFEST_ENABLED = os.getenv("MANIFEST_ENABLED", "true").lower() == "true"
+EXTENSIONS = {
+    "scraper.manifest.ManifestExtension": 500,
+}
+# 下載版本 - 輸出檔寫完時就產生 CSV / NDJSON / Parquet 與 gzip / zstd 壓縮版本 (STATE_DIR/downloads/),
+# 不啟用時在 API 第一次下載某個版本時才產生該版本
+DOWNLOAD_VARIANTS_ENABLED = os.getenv("DOWNLOAD_VARIANTS_ENABLED", "true").lower() == "true"
+
+# 暫存待合併的 item 不記錄 Dropped 訊息
+LOG_FORMATTER = "scraper.logformatter.LogFormatter"
+
+# 職缺變動偵測 - 比對上次執行的欄位指紋,只輸出新增或變動的職缺,並記錄變動事件
+CHANGE_DETECTION_ENABLED = os.getenv("CHANGE_DETECTION_ENABLED", "false").lower() == "true"
+CHANGE_DISAPPEAR_AFTER_RUNS = int(os.getenv("CHANGE_DISAPPEAR_AFTER_RUNS", "2"))
+if CHANGE_DETECTION_ENABLED:
+    for _feed in FEEDS.values():
+        _feed['fields'] += ['changeType', 'changedFields']
+
+# 近似重複職缺偵測 - jobName + description 相似度達門檻的職缺標上相同的 dup_group (不會丟棄)
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "false").lower() == "true"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+if NEAR_DUP_ENABLED:
+    for _feed in FEEDS.values():
+        _feed['fields'] += ['dup_group']
+
+# 薪資統計 - 結束時把薪資換算成月薪,依關鍵字 / 產業 / 縣市統計百分位數與分布 (寫到 STATE_DIR/salary/)
+SALARY_STATS_ENABLED = os.getenv("SALARY_STATS_ENABLED", "false").lower() == "true"
+SALARY_STATS_GROUP_BY = os.getenv("SALARY_STATS_GROUP_BY", "keyword,industry,city").split(",")
+
+# 精簡 item - 職缺以 JobItem (slots) 表示,公司、產業、地區等重複文字共用同一個字串,薪資與應徵人數為整數
+COMPACT_ITEMS_ENABLED = os.getenv("COMPACT_ITEMS_ENABLED", "false").lower() == "true"
+
+# SQLite 資料庫 - 職缺另外寫入資料庫,API / MCP 直接查詢 (每 N 筆或每 T 毫秒寫入一次)
+SQLITE_ENABLED = os.getenv("SQLITE_ENABLED", "false").lower() == "true"
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "ai_jobs.sqlite")
+SQLITE_BATCH_SIZE = int(os.getenv("SQLITE_BATCH_SIZE", "500"))
+SQLITE_BATCH_MS = int(os.getenv("SQLITE_BATCH_MS", "500"))
+# 全文檢索索引 - 職稱、描述、公司名稱、科系 (中文以兩字為單位),MCP search_jobs 的 text 參數使用
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "false").lower() == "true"
+
+# 背景寫入 (SQLite、分散式輸出) 的佇列上限,佇列滿時暫停解析新頁面,等寫入跟上
+SINK_QUEUE_SIZE = int(os.getenv("SINK_QUEUE_SIZE", "1000"))
+
+# 跨次執行的狀態檔目錄 (增量爬取等功能使用)
+STATE_DIR = os.getenv("STATE_DIR", ".jobscout")
+
+# 增量爬取 - 搜尋結果排序方式(依日期新到舊)與狀態保留天數
+INCREMENTAL_ORDER = os.getenv("INCREMENTAL_ORDER", "15")
+INCREMENTAL_RETENTION_DAYS = int(os.getenv("INCREMENTAL_RETENTION_DAYS", "90"))
+
+# HTTP回應快取 - 相同查詢在 TTL(秒) 內直接使用本機快取,不重複連線
+HTTPCACHE_REPLAY = os.getenv("HTTP_CACHE_REPLAY", "false").lower() == "true"
+HTTPCACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "false").lower() == "true" or HTTPCACHE_REPLAY
+HTTPCACHE_STORAGE = "scraper.httpcache.CompressedCacheStorage"
+HTTPCACHE_EXPIRATION_SECS = int(os.getenv("HTTP_CACHE_TTL", "600"))
+HTTPCACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "200"))
+HTTPCACHE_IGNORE_HTTP_CODES = [403, 404, 408, 429, 500, 502, 503, 504]
+# 離線重播: 快取中沒有的請求直接略過,完全不連網
+HTTPCACHE_IGNORE_MISSING = HTTPCACHE_REPLAY
+
+# 職缺詳細頁 - 獨立的併發數與延遲 (FETCH_JOB_DETAIL=true 或 -a detail=1 時啟用)
+DETAIL_CONCURRENT_REQUESTS = int(os.getenv("DETAIL_CONCURRENT_REQUESTS", "4"))
+DETAIL_DOWNLOAD_DELAY = float(os.getenv("DETAIL_DOWNLOAD_DELAY", os.getenv("DOWNLOAD_DELAY", "0.5")))
+
+# 地區分片 - 104 搜尋結果最多可翻的頁數,超過時依地區拆分查詢 (AREA_SHARDING=true 或 -a shard=1 時啟用)
+SEARCH_MAX_PAGES = int(os.getenv("SEARCH_MAX_PAGES", "100"))
+
+# 跨次執行的去重索引 - 之前執行輸出過的職缺不再輸出,超過幾週沒出現的職缺會從索引移除
+DEDUP_INDEX_ENABLED = os.getenv("DEDUP_INDEX_ENABLED", "false").lower() == "true"
+DEDUP_INDEX_EXPIRE_WEEKS = int(os.getenv("DEDUP_INDEX_EXPIRE_WEEKS", "8"))
+
+# 檢查點 (-a task_id=...) - 每隔幾秒儲存一次進度,中斷後用同一個 task_id 接續
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "30"))
+
+# 分散式爬取 (-a distributed=1 或 DISTRIBUTED_CRAWL=true) - 共用 Redis 上的請求佇列與去重集合
+# memory://名稱 表示使用同一行程內的記憶體替代品 (測試用)
+DISTRIBUTED_REDIS_URL = os.getenv("DISTRIBUTED_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+DISTRIBUTED_CRAWL_NAME = os.getenv("DISTRIBUTED_CRAWL_NAME", "104_ai_jobs")
+DISTRIBUTED_BATCH_SIZE = int(os.getenv("DISTRIBUTED_BATCH_SIZE", os.getenv("CONCURRENT_REQUESTS", "16")))
+
+# 自動速率控制 (AIMD) - 依 429/503、Retry-After 與延遲自動調整併發數與延遲,啟用時取代 AutoThrottle
+RATE_CONTROL_ENABLED = os.getenv("RATE_CONTROL_ENABLED", "false").lower() == "true"
+RATE_CONTROL_TARGET_LATENCY = float(os.getenv("RATE_CONTROL_TARGET_LATENCY", "2.0"))
+RATE_CONTROL_MAX_CONCURRENCY = int(os.getenv("RATE_CONTROL_MAX_CONCURRENCY", os.getenv("CONCURRENT_REQUESTS", "16")))
+RATE_CONTROL_MAX_DELAY = float(os.getenv("RATE_CONTROL_MAX_DELAY", "60"))
+
+# 需在 RetryMiddleware(550) 之前看到 429/503 回應 (560 已被內建的 AjaxCrawlMiddleware 使用)
+DOWNLOADER_MIDDLEWARES = {
+    "scraper.middlewares.AdaptiveRateMiddleware": 555,
+}
+
 # AutoThrottle
-AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_ENABLED = not RATE_CONTROL_ENABLED
 AUTOTHROTTLE_START_DELAY = 1
 AUTOTHROTTLE_MAX_DELAY = 10
 AUTOTHROTTLE_TARGET_CONCURRENCY = 8
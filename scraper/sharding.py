@@ -0,0 +1,65 @@
+# 依地區拆分查詢 (分片),讓超過搜尋頁數上限的查詢也能完整涵蓋
+
+# 縣市代碼 -> (名稱, 鄉鎮市區數量),與「地區代碼對照表.md」相同。
+# 鄉鎮市區代碼為縣市代碼前7碼加上 001 起的流水號,例如台北市中正區 = 6001001001
+#
+# 假設: 104 的鄉鎮市區代碼是從 001 開始的連續流水號,數量與下表相同 (沒有從 104 的地區資料讀取)。
+# 104 的代碼有缺號或增減時,產生的代碼可能不存在 (該分片沒有結果),或漏掉部分鄉鎮市區;
+# 爬蟲會在產生的鄉鎮市區分片沒有結果、或各分片總筆數加總少於拆分前的總筆數時記錄警告。
+#
+# 全台拆成各縣市時也只涵蓋這 22 個縣市,104 搜尋沒有「以上皆非」的地區條件,
+# 海外或其他地區的職缺無法另外成為一個分片,只能從總筆數的差額得知。
+COUNTIES = {
+    '6001001000': ('台北市', 12),
+    '6001002000': ('新北市', 29),
+    '6001003000': ('基隆市', 7),
+    '6001004000': ('桃園市', 13),
+    '6001005000': ('新竹市', 3),
+    '6001006000': ('新竹縣', 13),
+    '6001007000': ('苗栗縣', 18),
+    '6001008000': ('台中市', 29),
+    '6001009000': ('彰化縣', 26),
+    '6001010000': ('南投縣', 13),
+    '6001011000': ('雲林縣', 20),
+    '6001012000': ('嘉義市', 2),
+    '6001013000': ('台南市', 37),
+    '6001014000': ('屏東縣', 33),
+    '6001015000': ('宜蘭縣', 12),
+    '6001016000': ('高雄市', 38),
+    '6001017000': ('花蓮縣', 13),
+    '6001018000': ('台東縣', 16),
+    '6001019000': ('澎湖縣', 6),
+    '6001020000': ('嘉義縣', 18),
+    '6001021000': ('金門縣', 6),
+    '6001022000': ('連江縣', 4),
+}
+
+
+def get_district_codes(county_code):
+    """縣市底下所有鄉鎮市區的代碼"""
+    _, district_count = COUNTIES[county_code]
+    return [f"{county_code[:7]}{i:03d}" for i in range(1, district_count + 1)]
+
+
+def is_district_code(area_code):
+    """是否為依流水號產生的鄉鎮市區代碼 (不是縣市代碼)"""
+    return area_code[:7] + '000' in COUNTIES and area_code not in COUNTIES
+
+
+def split_shard(area_codes):
+    """把一個查詢範圍拆成更小的範圍,已經是單一鄉鎮市區時回傳空列表
+
+    不限地區 -> 各縣市;多個地區 -> 逐一拆開;單一縣市 -> 各鄉鎮市區
+    """
+    if not area_codes:
+        return [[code] for code in COUNTIES]
+    if len(area_codes) > 1:
+        return [[code] for code in area_codes]
+    if area_codes[0] in COUNTIES:
+        return [[code] for code in get_district_codes(area_codes[0])]
+    return []
+
+
+def needs_split(total_count, max_pages, page_size):
+    """查詢結果超過可翻頁的上限時需要再拆分"""
+    return total_count > max_pages * page_size
@@ -0,0 +1,166 @@
+# 在背景執行緒寫入 item 的 pipeline 基底類別: 資料庫、檔案、遠端儲存等會卡住的寫入不在 reactor 執行緒進行
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from itemadapter import ItemAdapter
+from twisted.internet import defer, reactor
+
+logger = logging.getLogger(__name__)
+
+# 通知寫入執行緒結束的標記
+_CLOSE = object()
+
+
+class ThreadedSinkPipeline:
+    """item 放進有上限的佇列,由專用的寫入執行緒每 batch_size 筆或每隔 batch_ms 毫秒呼叫一次 write_batch
+
+    佇列滿了時 process_item 回傳 Deferred,等寫入執行緒取走 item 後才完成,
+    Scrapy 處理中的 item 過多時會暫停解析新的回應 (SCRAPER_SLOT_MAX_ACTIVE_SIZE),爬取速度自動配合寫入速度。
+    close_spider 等佇列寫完、執行緒結束後才完成。
+
+    子類別實作:
+        open_sink(spider)     reactor 執行緒,open_spider 時呼叫
+        prepare(item)         reactor 執行緒,回傳放進佇列的資料 (預設為 item 的 dict 複本)
+        write_batch(batch)    寫入執行緒,寫入一批資料
+        close_sink(spider)    reactor 執行緒,寫入執行緒結束後呼叫
+
+    crawl stats (stats_prefix 為前綴): items、batches、queue_depth、queue_depth_max、
+    write_latency_ms_avg、write_latency_ms_max、backpressure (佇列滿而等待的 item 數)、errors
+    """
+
+    stats_prefix = 'sink'
+
+    def __init__(self, stats, queue_size=1000, batch_size=100, batch_ms=500):
+        self.stats = stats
+        self.queue = queue.Queue(maxsize=max(int(queue_size), 1))
+        self.batch_size = max(int(batch_size), 1)
+        self.batch_ms = int(batch_ms)
+        # 佇列滿時等待放入的 (資料, Deferred, item),只在 reactor 執行緒存取
+        self.waiting = deque()
+        self.thread = None
+        self.closed = None
+        self.written = 0
+        self.batches = 0
+        self.latency_total = 0.0
+
+    # ============================================
+    # 子類別實作
+    # ============================================
+
+    def open_sink(self, spider):
+        pass
+
+    def prepare(self, item):
+        return ItemAdapter(item).asdict()
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+    def close_sink(self, spider):
+        pass
+
+    # ============================================
+    # reactor 執行緒
+    # ============================================
+
+    def open_spider(self, spider):
+        self.open_sink(spider)
+        self.closed = defer.Deferred()
+        self.thread = threading.Thread(target=self._run, name=f"{self.stats_prefix}-writer", daemon=True)
+        self.thread.start()
+
+    def process_item(self, item, spider):
+        payload = self.prepare(item)
+        if not self.waiting:
+            try:
+                self.queue.put_nowait(payload)
+                self._record_depth()
+                return item
+            except queue.Full:
+                pass
+        d = defer.Deferred()
+        self.waiting.append((payload, d, item))
+        self.stats.inc_value(f'{self.stats_prefix}/backpressure')
+        return d
+
+    def close_spider(self, spider):
+        self.waiting.append((_CLOSE, defer.Deferred(), None))
+        self._put_waiting()
+        self.closed.addCallback(lambda _: self._record_depth())
+        self.closed.addCallback(lambda _: self.close_sink(spider))
+        return self.closed
+
+    def _put_waiting(self):
+        """把等待中的資料依序放進佇列,放進去的 item 才繼續往下一個 pipeline"""
+        while self.waiting:
+            payload, d, item = self.waiting[0]
+            try:
+                self.queue.put_nowait(payload)
+            except queue.Full:
+                break
+            self.waiting.popleft()
+            d.callback(item)
+        self._record_depth()
+
+    def _record_depth(self):
+        depth = self.queue.qsize()
+        self.stats.set_value(f'{self.stats_prefix}/queue_depth', depth)
+        self.stats.max_value(f'{self.stats_prefix}/queue_depth_max', depth)
+
+    def _record_batch(self, count, latency_ms):
+        self.written += count
+        self.batches += 1
+        self.latency_total += latency_ms
+        prefix = self.stats_prefix
+        self.stats.set_value(f'{prefix}/items', self.written)
+        self.stats.set_value(f'{prefix}/batches', self.batches)
+        self.stats.set_value(f'{prefix}/write_latency_ms_avg', round(self.latency_total / self.batches, 2))
+        self.stats.max_value(f'{prefix}/write_latency_ms_max', round(latency_ms, 2))
+        self._record_depth()
+
+    # ============================================
+    # 寫入執行緒
+    # ============================================
+
+    def _run(self):
+        try:
+            closing = False
+            while not closing:
+                payload = self.queue.get()
+                if payload is _CLOSE:
+                    break
+                batch = [payload]
+                deadline = time.monotonic() + self.batch_ms / 1000
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        payload = self.queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if payload is _CLOSE:
+                        closing = True
+                        break
+                    batch.append(payload)
+                # 佇列有空位了,讓等待中的 item 放進來
+                if self.waiting:
+                    reactor.callFromThread(self._put_waiting)
+                self._write(batch)
+        finally:
+            reactor.callFromThread(self.closed.callback, None)
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            self.write_batch(batch)
+        except Exception:
+            # 寫入失敗只影響這一批,不中斷爬取
+            logger.exception(f"{self.stats_prefix}: 寫入 {len(batch)} 筆失敗")
+            reactor.callFromThread(self.stats.inc_value, f'{self.stats_prefix}/errors')
+            return
+        reactor.callFromThread(self._record_batch, len(batch), (time.perf_counter() - started) * 1000)
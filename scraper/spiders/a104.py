@@ -1,10 +1,22 @@
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.extensions.feedexport import FeedExporter
 from scrapy.http import FormRequest
-import json
-from datetime import datetime
+from scrapy.settings import SETTINGS_PRIORITIES
+import copy
 import os
+import time
 from dotenv import load_dotenv
 
+from scraper.detail import DETAIL_FIELDS, DetailCache, get_job_id, parse_job_detail
+from scraper.distributed import DistributedCrawl, get_redis, merged_output_path
+from scraper.parsing import (
+    JOB_ROLE_TEXT, REMOTE_WORK_TEXT, SALARY_TYPE_TEXT, decode_page, format_appear_date, parse_jobs,
+)
+from scraper.sharding import is_district_code, needs_split, split_shard
+from scraper.state import Checkpoint, IncrementalState, get_state_dir
+
 # 載入.env設定檔
 load_dotenv()
 
@@ -26,6 +38,13 @@ class A104Spider(scrapy.Spider):
     }
 
     start_url = "https://www.104.com.tw/jobs/search/list"
+    detail_url = "https://www.104.com.tw/job/ajax/content/{job_id}"
+
+    # 104 搜尋API每頁回傳的職缺數 (回應中沒有 pageSize 時使用)
+    page_size = 20
+
+    # 詳細頁請求使用獨立的下載 slot,有自己的併發數與延遲
+    detail_slot = "job_detail"
     
     def __init__(self, *args, **kwargs):
         super(A104Spider, self).__init__(*args, **kwargs)
@@ -73,82 +92,528 @@ class A104Spider(scrapy.Spider):
         self.remote_mode = getattr(self, 'remote_mode', None)
         if self.remote_mode:
             self.logger.info(f"遠端工作篩選: {self.remote_mode}")
-        
+
+        # 5. 自適應分頁: 依API回傳的總頁數決定實際要爬的頁數
+        self.adaptive = self._get_flag('adaptive', 'ADAPTIVE_PAGINATION')
+        if self.adaptive:
+            self.logger.info("自適應分頁: 啟用 (依實際總頁數排程)")
+
+        # 6. 增量爬取: 只輸出上次執行後新增或更新的職缺
+        self.incremental = self._get_flag('incremental', 'INCREMENTAL_CRAWL')
+        self.incremental_state = None
+        if self.incremental:
+            self.logger.info("增量爬取: 啟用 (遇到舊職缺就停止翻頁)")
+
+        # 7. 職缺詳細頁: 另外抓取完整描述、條件與福利 (關閉時只抓搜尋列表)
+        self.fetch_detail = self._get_flag('detail', 'FETCH_JOB_DETAIL')
+        self.detail_cache = None
+        if self.fetch_detail:
+            self.logger.info("職缺詳細頁: 啟用")
+
+        # 8. 地區分片: 結果超過翻頁上限時依縣市/鄉鎮市區拆分查詢,取得完整結果
+        self.shard = self._get_flag('shard', 'AREA_SHARDING')
+        if self.shard and self.incremental:
+            self.logger.warning("增量爬取不支援地區分片,已停用地區分片")
+            self.shard = False
+        elif self.shard:
+            self.logger.info("地區分片: 啟用 (頁數改以搜尋結果上限為準)")
+        # 拆分過的查詢 -> 拆分前的總筆數與各分片總筆數加總,用來檢查分片是否漏掉職缺
+        self.shard_splits = {}
+
+        # 9. 分散式爬取: 多個 worker 共用 Redis 上的請求佇列與去重集合
+        self.distributed = self._get_flag('distributed', 'DISTRIBUTED_CRAWL')
+        self.distributed_crawl = None
+        # 這個 worker 是否加入了分散式爬取 (爬取已完成時不加入)
+        self.distributed_joined = False
+        if self.distributed and self.incremental:
+            self.logger.warning("增量爬取的狀態存在本機,不支援分散式爬取,已停用分散式爬取")
+            self.distributed = False
+
+        # 10. 檢查點: -a task_id=<任務ID>,中斷後用同一個任務ID再執行即可接續
+        self.task_id = getattr(self, 'task_id', None)
+        self.checkpoint = None
+        if self.task_id and self.distributed:
+            self.logger.warning("分散式爬取的進度存在共用佇列,不另外建立檢查點")
+            self.task_id = None
+
+        # 11. 指向其他伺服器 (例如 benchmarks/fake_104.py): -a start_url=... -a allowed_domains=127.0.0.1
+        if isinstance(self.allowed_domains, str):
+            self.allowed_domains = [d.strip() for d in self.allowed_domains.split(",")]
+
         self.logger.info(f"搜尋關鍵字: {', '.join(self.keywords)}")
         self.logger.info(f"每個關鍵字爬取: {self.pages_per_keyword} 頁")
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if crawler.settings.getbool("HTTPCACHE_REPLAY"):
+            # 離線重播 (-s HTTPCACHE_REPLAY=1): 只使用快取,快取沒有的請求直接略過
+            spider._override_setting(crawler.settings, "HTTPCACHE_ENABLED", True)
+            spider._override_setting(crawler.settings, "HTTPCACHE_IGNORE_MISSING", True)
+        if spider.incremental:
+            spider.incremental_state = IncrementalState.load(
+                os.path.join(get_state_dir(crawler.settings), "incremental_state.json"),
+                retention_days=crawler.settings.getint("INCREMENTAL_RETENTION_DAYS", 90),
+            )
+        if spider.fetch_detail:
+            spider._enable_detail_stage(crawler.settings)
+        if spider.distributed:
+            name = getattr(spider, 'crawl_name', None) or crawler.settings.get("DISTRIBUTED_CRAWL_NAME")
+            spider.distributed_crawl = DistributedCrawl(get_redis(crawler.settings.get("DISTRIBUTED_REDIS_URL")), name)
+            crawler.signals.connect(spider._pull_works, signal=signals.spider_idle)
+            spider.logger.info(f"分散式爬取: 啟用 (名稱: {name})")
+        if spider.task_id:
+            spider._enable_checkpoint(crawler)
+        return spider
+
+    def _enable_detail_stage(self, settings):
+        concurrency = settings.getint("DETAIL_CONCURRENT_REQUESTS", 4)
+        slots = copy.deepcopy(settings.getdict("DOWNLOAD_SLOTS"))
+        slots[self.detail_slot] = {
+            'concurrency': concurrency,
+            'delay': settings.getfloat("DETAIL_DOWNLOAD_DELAY", settings.getfloat("DOWNLOAD_DELAY")),
+        }
+        self._override_setting(settings, "DOWNLOAD_SLOTS", slots)
+        # 詳細頁的併發額度另外加上去,不佔用搜尋列表的請求數
+        self._override_setting(settings, "CONCURRENT_REQUESTS", settings.getint("CONCURRENT_REQUESTS") + concurrency)
+
+        feeds = copy.deepcopy(settings.getdict("FEEDS"))
+        for feed in feeds.values():
+            if feed.get('fields'):
+                feed['fields'] = list(feed['fields']) + [f for f in DETAIL_FIELDS if f not in feed['fields']]
+        self._override_setting(settings, "FEEDS", feeds)
+
+        self.detail_cache = DetailCache(os.path.join(get_state_dir(settings), "detail_cache.sqlite"))
+
+    def _enable_checkpoint(self, crawler):
+        self.checkpoint = Checkpoint.load(get_state_dir(crawler.settings), self.task_id)
+        self._checkpoint_saved_at = 0.0
+        crawler.signals.connect(self._checkpoint_item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(self._checkpoint_item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(self._checkpoint_item_dropped, signal=signals.item_error)
+        if self.checkpoint.resumed and any(
+                feed.get('format') == 'parquet' for feed in crawler.settings.getdict("FEEDS").values()):
+            # parquet 檔在結束時才寫入 footer,中斷時的檔案無法接著寫,只能重新爬取
+            self.logger.warning("parquet 輸出無法從檢查點接續,重新開始爬取")
+            self.checkpoint = Checkpoint(self.checkpoint.path)
+        if not self.checkpoint.resumed:
+            self.logger.info(f"檢查點: {self.checkpoint.path}")
+            return
+
+        # 接續: 輸出到原本的檔案,並截斷到檢查點的位置 (之後寫入的職缺會重新抓取)
+        options = list(crawler.settings.getdict("FEEDS").values())
+        feeds = {}
+        for i, (path, offset) in enumerate(self.checkpoint.feeds.items()):
+            feed = copy.deepcopy(options[min(i, len(options) - 1)]) if options else {'format': 'csv'}
+            feed['overwrite'] = False
+            if os.path.exists(path) and os.path.getsize(path) > offset:
+                os.truncate(path, offset)
+            if offset and feed.get('format') == 'csv':
+                feed.setdefault('item_export_kwargs', {})['include_headers_line'] = False
+            feeds[path] = feed
+        if feeds:
+            self._override_setting(crawler.settings, "FEEDS", feeds)
+        self.logger.info(f"從檢查點接續: 已完成 {len(self.checkpoint.done)} 頁,"
+                         f"已輸出 {len(self.checkpoint.seen_jobs)} 筆職缺")
+
+    def _override_setting(self, settings, name, value):
+        """在 from_crawler 中調整設定,保留原本的優先權 (例如 CLI 的 -s / -o)"""
+        priority = max(settings.getpriority(name) or 0, SETTINGS_PRIORITIES["spider"])
+        settings.set(name, value, priority=priority)
+
+    def closed(self, reason):
+        if self.detail_cache is not None:
+            self.detail_cache.close()
+
+        if self.distributed_joined:
+            self._finish_distributed()
+
+        # 完整跑完就不再需要檢查點,其他原因 (逾時、中斷) 則儲存目前進度
+        if self.checkpoint is not None:
+            if reason == 'finished':
+                self.checkpoint.remove()
+            else:
+                self._save_checkpoint()
+                self.logger.info(f"爬蟲中斷 ({reason}),進度已存到檢查點,以 task_id={self.task_id} 再次執行即可接續")
+
+        # 只有完整跑完才更新水位,中途中斷時下次會重新涵蓋同一範圍
+        if self.incremental_state is not None and reason == 'finished':
+            self.incremental_state.save()
+            self.logger.info(f"增量狀態已儲存: {self.incremental_state.path}")
+
     def start_requests(self):
+        if self.checkpoint is not None and self.checkpoint.resumed:
+            works = self.checkpoint.pending_works()
+            self.logger.info(f"從檢查點接續: 剩餘 {len(works)} 頁")
+            for work in works:
+                yield self._make_request(**work)
+            return
+
+        if self.distributed_crawl is not None:
+            completed = self.distributed_crawl.completed()
+            if completed is not None:
+                # 其他 worker 已經完成並合併輸出,不再重新爬取
+                self.logger.warning(
+                    f"分散式爬取 {self.distributed_crawl.name} 已於 {completed['finished_at']} 完成,"
+                    f"要重新爬取請先執行 python -m scraper.distributed reset --name {self.distributed_crawl.name}")
+                return
+            # 分散式爬取: 起始工作放進共用佇列,再和其他 worker 一起從佇列取工作
+            if self.distributed_crawl.seed(self._start_works()):
+                self.logger.info(f"分散式爬取: 已放入 {self.distributed_crawl.pending()} 個起始工作")
+            self.distributed_crawl.start_worker()
+            self.distributed_joined = True
+            for work in self._pop_works():
+                yield self._make_request(**work)
+            return
+
+        works = list(self._start_works())
+        if self.checkpoint is not None:
+            # 起始請求是逐步取出的,先全部記錄下來,中斷時才不會漏掉還沒送出的頁面
+            for work in works:
+                self.checkpoint.schedule(work)
+        for work in works:
+            yield self._make_request(**work)
+
+    def _start_works(self):
+        """起始請求的參數 (keyword, page, area_codes),分散式爬取時會放進共用佇列"""
         for keyword in self.keywords:
             self.logger.info(f'開始搜尋關鍵字: {keyword}')
+            if self.incremental:
+                watermark = self.incremental_state.watermark(self._query_key(keyword))
+                self.logger.info(f'關鍵字 "{keyword}" 增量水位: {watermark or "無(首次執行)"}')
+                yield {'keyword': keyword, 'page': 1}
+                continue
+            if self.shard:
+                # 地區分片: 先抓第1頁,依總筆數決定是否拆分
+                yield {'keyword': keyword, 'page': 1, 'area_codes': self.area_codes}
+                continue
+            if self.adaptive:
+                # 自適應分頁: 先抓第1頁,依回傳的總頁數再排程其餘頁面
+                yield {'keyword': keyword, 'page': 1}
+                continue
+
             for i in range(self.pages_per_keyword):
-                # 建立URL參數
-                url_params = f"?page={i+1}&keyword={keyword}"
-                
-                # 如果有設定地區代碼,加入area參數
-                if self.area_codes:
-                    area_param = "&area=" + ",".join(self.area_codes)
-                    url_params += area_param
-
-                # 處理遠端工作參數
-                if self.remote_mode:
-                    if self.remote_mode == 'full':
-                        url_params += "&remoteWork=1"
-                    elif self.remote_mode == 'partial':
-                        url_params += "&remoteWork=2"
-                    elif self.remote_mode == 'both':
-                        url_params += "&remoteWork=1,2"
-                
-                yield FormRequest(
-                    url=self.start_url + url_params,
-                    method="GET",
-                    callback=self.parse,
-                    meta={'keyword': keyword, 'page': i+1}
-                )
+                yield {'keyword': keyword, 'page': i + 1}
+
+    def _pop_works(self):
+        works = self.distributed_crawl.pop_works(self.settings.getint("DISTRIBUTED_BATCH_SIZE", 16))
+        if works:
+            self.crawler.stats.inc_value('distributed/works', len(works))
+        return works
+
+    def _pull_works(self):
+        """爬蟲閒置時從共用佇列再取一批工作,佇列空了才結束"""
+        if not self.distributed_joined:
+            return
+        works = self._pop_works()
+        for work in works:
+            self.crawler.engine.crawl(self._make_request(**work))
+        if works:
+            raise DontCloseSpider
+
+    def _finish_distributed(self):
+        """最後一個結束的 worker 負責合併所有 worker 的輸出,並留下已完成標記"""
+        crawl = self.distributed_crawl
+        if crawl.finish_worker() > 0 or crawl.pending() > 0:
+            return
+        path = merged_output_path(self.settings, crawl.name, self.name)
+        # 同時結束的 worker 只有一個取得合併中標記
+        count = crawl.finish(path, self.settings)
+        if count:
+            self.logger.info(f"分散式爬取: 已合併 {count} 筆職缺到 {path}")
+
+    def _build_url(self, keyword, page, area_codes=None):
+        # 建立URL參數
+        url_params = f"?page={page}&keyword={keyword}"
+
+        # 如果有設定地區代碼,加入area參數 (地區分片時使用分片自己的地區)
+        if area_codes is None:
+            area_codes = self.area_codes
+        if area_codes:
+            area_param = "&area=" + ",".join(area_codes)
+            url_params += area_param
+
+        # 處理遠端工作參數
+        if self.remote_mode:
+            if self.remote_mode == 'full':
+                url_params += "&remoteWork=1"
+            elif self.remote_mode == 'partial':
+                url_params += "&remoteWork=2"
+            elif self.remote_mode == 'both':
+                url_params += "&remoteWork=1,2"
+
+        # 增量爬取需要由新到舊排序,才能在遇到舊職缺時停止
+        if self.incremental:
+            url_params += "&order=" + self.settings.get("INCREMENTAL_ORDER", "15") + "&asc=0"
+
+        return self.start_url + url_params
+
+    def _query_key(self, keyword):
+        return IncrementalState.make_key(keyword, self.area_codes, self.remote_mode)
+
+    def _make_request(self, keyword, page, area_codes=None, **meta):
+        if area_codes is not None:
+            meta['area_codes'] = area_codes
+        if self.checkpoint is not None:
+            self.checkpoint.schedule({'keyword': keyword, 'page': page, **meta})
+        return FormRequest(
+            url=self._build_url(keyword, page, area_codes),
+            method="GET",
+            callback=self.parse,
+            meta={'keyword': keyword, 'page': page, **meta}
+        )
+
+    def _get_flag(self, name, env_name, default="false"):
+        """讀取開關參數: 優先使用 CLI 參數,否則讀取.env"""
+        value = getattr(self, name, None)
+        if value is None:
+            value = os.getenv(env_name, default)
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
 
     def parse(self, response):
         try:
-            body = json.loads(response.body)
-            jobs = body["data"]["list"]
+            data = decode_page(response.body)
+            jobs = data["list"]
             keyword = response.meta.get('keyword', '')
             page = response.meta.get('page', 1)
             
             self.logger.info(f'關鍵字 "{keyword}" 第{page}頁: 找到 {len(jobs)} 筆職缺')
-            
-            for job in jobs:
-                yield {
-                    'search_keyword': keyword,  # 記錄是用哪個關鍵字找到的
-                    'jobName': job.get('jobName', ''),
-                    'jobRole': self._get_job_role_text(job.get('jobRole', '')),
-                    'jobAddrNoDesc': job.get('jobAddrNoDesc', ''),
-                    'jobAddress': job.get('jobAddress', ''),
-                    'description': job.get('description', ''),
-                    'optionEdu': job.get('optionEdu', ''),
-                    'periodDesc': job.get('periodDesc', ''),
-                    'applyCnt': job.get('applyCnt', 0),
-                    'custName': job.get('custName', ''),
-                    'coIndustryDesc': job.get('coIndustryDesc', ''),
-                    'salaryLow': job.get('salaryLow', 0),
-                    'salaryHigh': job.get('salaryHigh', 0),
-                    'appearDate': datetime.strptime(job['appearDate'], "%Y%m%d").strftime("%Y-%m-%d") if job.get('appearDate') else '',
-                    'jobLink': "https:" + job["link"]["job"].split("?")[0] if job.get('link') and job['link'].get('job') else '',
-                    'remoteWorkType': self._get_remote_work_text(job.get('remoteWorkType', 0)),
-                    'major': ','.join(job.get('major', [])) if job.get('major') else '',
-                    'salaryType': self._get_salary_type_text(job.get('salaryType', '')),
-                }
+            # 即時進度 (API 的 /crawls/<id>/events)
+            self.crawler.stats.inc_value('progress/pages')
+            self.crawler.stats.set_value('progress/keyword', keyword)
+
+            # 整頁一次轉換為 item
+            items = parse_jobs(jobs, keyword, compact=self.settings.getbool("COMPACT_ITEMS_ENABLED"))
+            if self.settings.getbool("KEYWORD_MERGE_ENABLED"):
+                # 關鍵字合併時記錄職缺在這個關鍵字的頁數與名次
+                for rank, item in enumerate(items, 1):
+                    item['search_page'] = page
+                    item['search_rank'] = rank
+
+            query_key = self._query_key(keyword)
+            page_key = Checkpoint.make_key(response.meta)
+            reached_watermark = False
+            if self.incremental:
+                watermark = self.incremental_state.watermark(query_key)
+                reached_watermark = watermark is not None and all(
+                    item['appearDate'] < watermark for item in items
+                )
+
+            for item in items:
+                if self.incremental:
+                    change = self.incremental_state.classify(query_key, item['jobLink'], item['appearDate'])
+                    self.crawler.stats.inc_value(f'incremental/{change or "skipped"}')
+                    if change is None:
+                        continue
+                    self.incremental_state.record(query_key, item['jobLink'], item['appearDate'])
+
+                if self.checkpoint is not None:
+                    self.checkpoint.track_item(item, page_key)
+                if self.fetch_detail and item['jobLink']:
+                    yield self._with_detail(item)
+                else:
+                    yield item
+
+            if self.incremental:
+                yield from self._follow_pages(response, data, jobs,
+                                              sequential=True, stop=reached_watermark)
+            elif self.shard:
+                yield from self._follow_shard(response, data, jobs)
+            elif self.adaptive:
+                yield from self._follow_pages(response, data, jobs)
         except Exception as e:
             self.logger.error(f'解析錯誤: {e}')
+
+        if self.checkpoint is not None:
+            self.checkpoint.page_parsed(Checkpoint.make_key(response.meta))
+            interval = self.settings.getfloat("CHECKPOINT_INTERVAL", 30)
+            if time.time() - self._checkpoint_saved_at >= interval:
+                self._save_checkpoint()
     
+    def _follow_pages(self, response, data, jobs, sequential=False, stop=False):
+        """自適應分頁: 只排程實際存在的頁面,遇到不足一頁的結果就停止
+
+        sequential=True 時一律逐頁往下抓 (增量爬取),stop=True 表示這頁已全是舊職缺。
+        """
+        if response.meta.get('planned'):
+            return
+
+        keyword = response.meta.get('keyword', '')
+        page = response.meta.get('page', 1)
+        page_size = int(data.get('pageSize') or self.page_size)
+        is_last_page = len(jobs) < page_size
+        total_page = self._get_total_page(data, page_size)
+
+        if page == 1 and not is_last_page and not sequential and total_page is not None:
+            last_page = max(1, min(total_page, self.pages_per_keyword))
+            self.logger.info(f'關鍵字 "{keyword}" 共 {total_page} 頁,排程 {last_page} 頁')
+            for next_page in range(2, last_page + 1):
+                yield self._make_request(keyword, next_page, planned=True)
+            self._record_saved_requests(self.pages_per_keyword - last_page)
+            return
+
+        # 逐頁往下抓,直到不足一頁、全是舊職缺或達到頁數上限
+        last_page = min(self.pages_per_keyword, total_page or self.pages_per_keyword)
+        if is_last_page or stop or page >= last_page:
+            if stop:
+                self.logger.info(f'關鍵字 "{keyword}" 第{page}頁已全是舊職缺,停止翻頁')
+            self._record_saved_requests(self.pages_per_keyword - page)
+            return
+        yield self._make_request(keyword, page + 1)
+
+    def _follow_shard(self, response, data, jobs):
+        """地區分片: 結果超過翻頁上限就依地區拆分,否則排程這個分片的所有頁面"""
+        if response.meta.get('planned'):
+            return
+
+        keyword = response.meta.get('keyword', '')
+        area_codes = response.meta.get('area_codes') or []
+        area_desc = ",".join(area_codes) or "全台"
+        page_size = int(data.get('pageSize') or self.page_size)
+        total_page = self._get_total_page(data, page_size) or 1
+        if data.get('totalCount') is not None:
+            total_count = int(data['totalCount'])
+        else:
+            total_count = total_page * page_size if jobs else 0
+        max_pages = self.settings.getint("SEARCH_MAX_PAGES", 100)
+        stats = self.crawler.stats
+
+        if not jobs and len(area_codes) == 1 and is_district_code(area_codes[0]):
+            # 鄉鎮市區代碼是依流水號產生的,沒有結果可能是代碼不存在
+            self.logger.warning(f'關鍵字 "{keyword}" 鄉鎮市區分片 {area_desc} 沒有結果 (也可能是 104 沒有這個代碼)')
+            stats.inc_value('sharding/empty_district')
+        self._count_shard(response.meta.get('shard_parent'), total_count)
+
+        if needs_split(total_count, max_pages, page_size):
+            shards = split_shard(area_codes)
+            if shards:
+                self.logger.info(f'關鍵字 "{keyword}" 地區 {area_desc} 共 {total_count} 筆,拆成 {len(shards)} 個分片')
+                stats.inc_value('sharding/split')
+                parent = f"{keyword}|{area_desc}"
+                self.shard_splits[parent] = {'total': total_count, 'remaining': len(shards), 'sum': 0}
+                for shard in shards:
+                    yield self._make_request(keyword, 1, area_codes=shard, shard_parent=parent)
+                return
+            self.logger.warning(f'關鍵字 "{keyword}" 地區 {area_desc} 共 {total_count} 筆,已無法再拆分,只能取得前 {max_pages} 頁')
+            stats.inc_value('sharding/truncated')
+
+        stats.inc_value('sharding/shards')
+        for next_page in range(2, min(total_page, max_pages) + 1):
+            yield self._make_request(keyword, next_page, area_codes=area_codes, planned=True)
+
+    def _count_shard(self, parent, total_count):
+        """累計分片的總筆數,同一次拆分的分片都回來後和拆分前的總筆數比較
+
+        全台拆成各縣市時不含海外與其他地區,縣市拆成鄉鎮市區時可能有代碼對不上,差額都會記錄下來。
+        (從檢查點接續時沒有拆分前的紀錄,不比較)
+        """
+        split = self.shard_splits.get(parent)
+        if split is None:
+            return
+        split['sum'] += total_count
+        split['remaining'] -= 1
+        if split['remaining'] > 0:
+            return
+        del self.shard_splits[parent]
+        gap = split['total'] - split['sum']
+        if gap > 0:
+            keyword, area_desc = parent.split('|', 1)
+            self.logger.warning(f'關鍵字 "{keyword}" 地區 {area_desc} 共 {split["total"]} 筆,'
+                                f'各分片合計 {split["sum"]} 筆,有 {gap} 筆不在任何分片 (海外、其他地區或代碼不符)')
+            self.crawler.stats.inc_value('sharding/gap', gap)
+
+    def _with_detail(self, item):
+        """快取中有相同更新日期的詳細資料就直接合併,否則排程詳細頁請求"""
+        job_id = get_job_id(item['jobLink'])
+        cached = self.detail_cache.get(job_id, item['appearDate'])
+        if cached is not None:
+            self.crawler.stats.inc_value('job_detail/cache_hit')
+            item.update(cached)
+            return item
+
+        return scrapy.Request(
+            url=self.detail_url.format(job_id=job_id),
+            callback=self.parse_detail,
+            errback=self._detail_failed,
+            headers={'referer': f"https://www.104.com.tw/job/{job_id}"},
+            # 同一職缺可能出現在多個關鍵字,每個都要帶回自己的 item
+            dont_filter=True,
+            priority=1,
+            meta={'item': item, 'job_id': job_id, 'download_slot': self.detail_slot},
+        )
+
+    def parse_detail(self, response):
+        item = response.meta['item']
+        try:
+            fields = parse_job_detail(response.body)
+        except Exception as e:
+            self.logger.error(f'詳細頁解析錯誤 ({response.url}): {e}')
+            yield item
+            return
+
+        self.crawler.stats.inc_value('job_detail/fetched')
+        self.detail_cache.put(response.meta['job_id'], item['appearDate'], fields)
+        item.update(fields)
+        yield item
+
+    def _detail_failed(self, failure):
+        # 詳細頁抓取失敗時仍輸出搜尋列表的資料
+        self.crawler.stats.inc_value('job_detail/failed')
+        self.logger.warning(f'詳細頁抓取失敗: {failure.request.url}')
+        yield failure.request.meta['item']
+
+    def _checkpoint_item_scraped(self, item):
+        self.checkpoint.item_finished(item, scraped=True)
+
+    def _checkpoint_item_dropped(self, item):
+        self.checkpoint.item_finished(item, scraped=False)
+
+    def _save_checkpoint(self):
+        self.checkpoint.save(self._feed_positions())
+        self._checkpoint_saved_at = time.time()
+        self.crawler.stats.inc_value('checkpoint/saved')
+
+    def _feed_positions(self):
+        """各輸出檔目前寫到的位置 (先 flush 再取大小),只支援本機檔案"""
+        positions = {}
+        for extension in self.crawler.extensions.middlewares:
+            if not isinstance(extension, FeedExporter):
+                continue
+            for slot in extension.slots:
+                path = getattr(slot.storage, 'path', None)
+                if path is None:
+                    continue
+                if slot.file is not None and not slot.file.closed:
+                    slot.file.flush()
+                positions[path] = os.path.getsize(path) if os.path.exists(path) else 0
+        return positions
+
+    def _get_total_page(self, data, page_size):
+        """從搜尋結果取得總頁數,沒有 totalPage 時用 totalCount 推算"""
+        if data.get('totalPage') is not None:
+            return int(data['totalPage'])
+        if data.get('totalCount') is not None:
+            return -(-int(data['totalCount']) // page_size)
+        return None
+
+    def _record_saved_requests(self, count):
+        if count > 0:
+            self.crawler.stats.inc_value('adaptive_pagination/requests_saved', count)
+
+    def _format_date(self, appear_date):
+        """將 20250101 格式的日期轉為 2025-01-01"""
+        return format_appear_date(appear_date or '')
+
     def _get_job_role_text(self, role):
         """將工作型態代碼轉為文字"""
-        role_map = {1: '正職', 2: '兼職', 3: '高階'}
-        return role_map.get(role, '未知')
+        return JOB_ROLE_TEXT.get(role, '未知')
     
     def _get_remote_work_text(self, remote_type):
         """將遠端工作代碼轉為文字"""
-        remote_map = {0: '不可遠端', 1: '完全遠端', 2: '部分遠端'}
-        return remote_map.get(remote_type, '未知')
+        return REMOTE_WORK_TEXT.get(remote_type, '未知')
     
     def _get_salary_type_text(self, salary_type):
         """將薪資型態代碼轉為文字"""
-        salary_map = {'H': '時薪', 'M': '月薪', 'Y': '年薪', '': '面議'}
-        return salary_map.get(salary_type, salary_type)
+        return SALARY_TYPE_TEXT.get(salary_type, salary_type)
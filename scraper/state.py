@@ -0,0 +1,175 @@
+# 跨次執行的爬蟲狀態 (增量爬取、檢查點用)
+
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from scraper.dedup import SeenJobs
+
+
+def get_state_dir(settings):
+    """取得狀態檔目錄,不存在時自動建立"""
+    state_dir = settings.get("STATE_DIR") or ".jobscout"
+    os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+
+def write_json_atomic(path, data):
+    """先寫入暫存檔再取代,避免中途中斷留下壞掉的狀態檔 (暫存檔名不重複,多個行程同時寫入也不會互相干擾)"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class IncrementalState:
+    """每個 (關鍵字, 地區, 遠端模式) 記錄看過的最新 appearDate 與職缺連結"""
+
+    def __init__(self, path, retention_days=90):
+        self.path = path
+        self.retention_days = retention_days
+        self.queries = {}
+        # 本次執行看到的最新日期,儲存時才更新水位,執行期間水位維持不變
+        self.new_watermarks = {}
+
+    @classmethod
+    def load(cls, path, retention_days=90):
+        state = cls(path, retention_days)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state.queries = json.load(f)
+        return state
+
+    @staticmethod
+    def make_key(keyword, area_codes, remote_mode):
+        return "|".join([keyword, ",".join(area_codes or []), remote_mode or ""])
+
+    def watermark(self, key):
+        """上次執行看到的最新 appearDate (YYYY-MM-DD),第一次執行時為 None"""
+        return self.queries.get(key, {}).get('watermark')
+
+    def classify(self, key, job_link, appear_date):
+        """回傳 'new' / 'changed',已看過且沒有更新時回傳 None"""
+        known = self.queries.get(key, {}).get('jobs', {})
+        if job_link not in known:
+            return 'new'
+        if appear_date and appear_date > known[job_link]:
+            return 'changed'
+        return None
+
+    def record(self, key, job_link, appear_date):
+        query = self.queries.setdefault(key, {'watermark': None, 'jobs': {}})
+        query['jobs'][job_link] = appear_date
+        if appear_date and appear_date > (self.new_watermarks.get(key) or ''):
+            self.new_watermarks[key] = appear_date
+
+    def save(self):
+        for key, watermark in self.new_watermarks.items():
+            query = self.queries[key]
+            if query['watermark'] is None or watermark > query['watermark']:
+                query['watermark'] = watermark
+        self.new_watermarks = {}
+
+        # 只保留最近 retention_days 天內的職缺,避免狀態檔無限成長
+        for query in self.queries.values():
+            if not query.get('watermark'):
+                continue
+            horizon = (datetime.strptime(query['watermark'], "%Y-%m-%d")
+                       - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+            query['jobs'] = {
+                link: date for link, date in query['jobs'].items()
+                if not date or date >= horizon
+            }
+        write_json_atomic(self.path, self.queries)
+
+
+class Checkpoint:
+    """長時間爬取的檢查點,中斷 (逾時、worker 重啟、OOM) 後用同一個 task id 接續
+
+    記錄已排程與已完成的頁面、去重集合與輸出檔寫到的位置。三者在同一時間點儲存,
+    接續時把輸出檔截斷到該位置,之後寫入的職缺會因頁面尚未完成而重新抓取,不會重複也不會遺漏。
+    頁面要等解析完、且產生的 item 都離開 pipeline (含詳細頁) 才算完成。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.works = {}          # 頁面 key -> 請求參數 (keyword, page, area_codes, meta)
+        self.done = set()
+        self.seen_jobs = SeenJobs()
+        self.feeds = {}          # 輸出檔 uri -> 已寫入的位元組數
+        self.resumed = False
+        self._parsed = set()
+        self._outstanding = defaultdict(int)
+        self._items = {}
+
+    @classmethod
+    def load(cls, state_dir, task_id):
+        if not re.fullmatch(r'[\w.-]+', task_id):
+            raise ValueError(f"task id 只能包含英數字、底線、點與連字號: {task_id}")
+        checkpoint_dir = os.path.join(state_dir, "checkpoints")
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpoint = cls(os.path.join(checkpoint_dir, f"{task_id}.json"))
+        if os.path.exists(checkpoint.path):
+            with open(checkpoint.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            checkpoint.works = data['works']
+            checkpoint.done = set(data['done'])
+            checkpoint.seen_jobs = SeenJobs(data['seen_jobs'])
+            checkpoint.feeds = data['feeds']
+            checkpoint.resumed = True
+        return checkpoint
+
+    @staticmethod
+    def make_key(work):
+        return "|".join([work['keyword'], str(work['page']), ",".join(work.get('area_codes') or [])])
+
+    def schedule(self, work):
+        self.works.setdefault(self.make_key(work), work)
+
+    def pending_works(self):
+        """已排程但尚未完成的頁面"""
+        return [work for key, work in self.works.items() if key not in self.done]
+
+    def track_item(self, item, key):
+        self._outstanding[key] += 1
+        self._items[id(item)] = key
+
+    def item_finished(self, item, scraped):
+        """item 已輸出 (scraped=True)、被丟棄或發生錯誤
+
+        seen_jobs 只記錄已寫入輸出檔的職缺,和檢查點的輸出檔位置一致。
+        """
+        if scraped:
+            self.seen_jobs.add(item.get('jobLink'))
+        key = self._items.pop(id(item), None)
+        if key is not None:
+            self._outstanding[key] -= 1
+            self._complete(key)
+
+    def page_parsed(self, key):
+        self._parsed.add(key)
+        self._complete(key)
+
+    def _complete(self, key):
+        if key in self._parsed and not self._outstanding[key]:
+            self._parsed.discard(key)
+            self._outstanding.pop(key, None)
+            self.done.add(key)
+
+    def save(self, feeds):
+        """feeds: 輸出檔 uri -> 目前大小 (呼叫前需先 flush)"""
+        self.feeds = feeds
+        write_json_atomic(self.path, {
+            'works': self.works,
+            'done': sorted(self.done),
+            'seen_jobs': list(self.seen_jobs),
+            'feeds': feeds,
+            'saved_at': datetime.now().isoformat(),
+        })
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
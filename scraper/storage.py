@@ -0,0 +1,370 @@
+# 職缺資料庫 (SQLite): 爬蟲寫入,API / MCP 直接查詢,不需要每次重新解析整個 CSV
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from scraper.dedup import PersistentSeenJobs
+from scraper.detail import get_job_id
+from scraper.search import SEARCH_SCHEMA, index_text, to_match_query
+
+# jobs 表的欄位對應 (item 欄位 -> 資料表欄位),其他欄位 (詳細頁、dup_group 等) 以 JSON 存在 extra
+JOB_COLUMNS = {
+    'jobName': 'job_name',
+    'jobRole': 'job_role',
+    'jobAddress': 'job_address',
+    'salaryLow': 'salary_low',
+    'salaryHigh': 'salary_high',
+    'salaryType': 'salary_type',
+    'remoteWorkType': 'remote_work_type',
+    'optionEdu': 'option_edu',
+    'periodDesc': 'period_desc',
+    'major': 'major',
+    'applyCnt': 'apply_cnt',
+    'appearDate': 'appear_date',
+    'description': 'description',
+    'jobLink': 'job_link',
+}
+
+# 存到其他表或不需要存的欄位
+_NORMALIZED_FIELDS = {'custName', 'coIndustryDesc', 'jobAddrNoDesc', 'search_keyword', 'search_keywords',
+                      'search_positions', 'search_page', 'search_rank'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS industries (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    industry_id INTEGER REFERENCES industries (id)
+);
+CREATE TABLE IF NOT EXISTS areas (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    keywords TEXT,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'running'
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    job_code TEXT NOT NULL,
+    job_name TEXT,
+    company_id INTEGER REFERENCES companies (id),
+    area_id INTEGER REFERENCES areas (id),
+    job_role TEXT,
+    job_address TEXT,
+    salary_low INTEGER,
+    salary_high INTEGER,
+    salary_type TEXT,
+    remote_work_type TEXT,
+    option_edu TEXT,
+    period_desc TEXT,
+    major TEXT,
+    apply_cnt INTEGER,
+    appear_date TEXT,
+    description TEXT,
+    job_link TEXT,
+    extra TEXT,
+    first_run_id INTEGER REFERENCES runs (id),
+    last_run_id INTEGER REFERENCES runs (id),
+    first_seen_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS job_keywords (
+    keyword TEXT NOT NULL,
+    job_id INTEGER NOT NULL REFERENCES jobs (job_id),
+    last_run_id INTEGER REFERENCES runs (id),
+    PRIMARY KEY (keyword, job_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_jobs_appear_date ON jobs (appear_date);
+CREATE INDEX IF NOT EXISTS idx_jobs_company ON jobs (company_id, appear_date);
+CREATE INDEX IF NOT EXISTS idx_jobs_salary ON jobs (salary_low, salary_high);
+CREATE INDEX IF NOT EXISTS idx_jobs_last_run ON jobs (last_run_id, appear_date);
+CREATE INDEX IF NOT EXISTS idx_job_keywords_job ON job_keywords (job_id);
+"""
+
+# 查詢結果還原成和 CSV 相同的欄位名稱
+_JOB_FIELDS_SQL = (
+    "j.*, c.name AS custName, i.name AS coIndustryDesc, a.name AS jobAddrNoDesc,"
+    " (SELECT group_concat(k.keyword) FROM job_keywords k WHERE k.job_id = j.job_id) AS search_keywords"
+)
+_JOB_JOINS_SQL = (
+    " LEFT JOIN companies c ON c.id = j.company_id"
+    " LEFT JOIN industries i ON i.id = c.industry_id"
+    " LEFT JOIN areas a ON a.id = j.area_id"
+)
+_SELECT_JOBS = f"SELECT {_JOB_FIELDS_SQL} FROM jobs j{_JOB_JOINS_SQL}"
+# 全文檢索: bm25 分數越小越相關,回傳時轉成越大越相關的 score
+_SEARCH_JOBS = (
+    f"SELECT {_JOB_FIELDS_SQL}, -job_search.rank AS score"
+    f" FROM job_search JOIN jobs j ON j.job_id = job_search.rowid{_JOB_JOINS_SQL}"
+)
+# 全文檢索索引的來源欄位 (順序同 job_search 的欄位)
+_SEARCH_FIELDS = ('jobName', 'description', 'custName', 'major')
+_SEARCH_SOURCE = (
+    "SELECT j.job_id, j.job_name, j.description, c.name, j.major"
+    " FROM jobs j LEFT JOIN companies c ON c.id = j.company_id"
+)
+_COLUMN_FIELDS = {column: field for field, column in JOB_COLUMNS.items()}
+
+
+def default_db_path():
+    return os.getenv("SQLITE_DB_PATH", "ai_jobs.sqlite")
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class JobDatabase:
+    """職缺資料庫
+
+    以職缺代碼轉成的數字 (int('7xk2a', 36)) 為主鍵 upsert,公司、產業、地區另外正規化成對照表,
+    關鍵字存在 job_keywords (一個職缺可對應多個關鍵字)。readonly=True 時供 API 查詢使用。
+    search_index=True 時建立全文檢索索引 (job_search),索引存在後每次寫入都會一併更新。
+    """
+
+    def __init__(self, path, readonly=False, search_index=False):
+        self.path = path
+        if readonly:
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            # 寫入在 SqlitePipeline 的背景執行緒進行,開啟與結束在 reactor 執行緒 (不會同時使用)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            # 職缺代碼的順序是亂的,插入時會動到整棵 B-tree,加大快取並減少 WAL checkpoint 次數 (約快 1.7 倍)
+            self.db.execute("PRAGMA cache_size=-65536")
+            self.db.execute("PRAGMA wal_autocheckpoint=16384")
+            self.db.executescript(SCHEMA)
+        self.db.row_factory = sqlite3.Row
+        self._ids = {'industries': {}, 'companies': {}, 'areas': {}}
+        self.has_search_index = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'job_search'"
+        ).fetchone() is not None
+        if search_index and not readonly and not self.has_search_index:
+            self.rebuild_search_index()
+
+    @classmethod
+    def open_existing(cls, path=None):
+        """API 查詢用: 資料庫不存在時回傳 None"""
+        path = path or default_db_path()
+        return cls(path, readonly=True) if os.path.exists(path) else None
+
+    def close(self):
+        self.db.close()
+
+    # ============================================
+    # 寫入
+    # ============================================
+
+    def start_run(self, keywords):
+        cursor = self.db.execute(
+            "INSERT INTO runs (started_at, keywords) VALUES (?, ?)",
+            (datetime.now().isoformat(timespec='seconds'), ','.join(keywords)),
+        )
+        self.db.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, status, item_count):
+        self.db.execute(
+            "UPDATE runs SET finished_at = ?, status = ?, item_count = ? WHERE id = ?",
+            (datetime.now().isoformat(timespec='seconds'), status, item_count, run_id),
+        )
+        self.db.commit()
+
+    def upsert_jobs(self, items, run_id):
+        """在一個 transaction 內寫入一批職缺,回傳寫入筆數"""
+        try:
+            return self._upsert_jobs(items, run_id)
+        except BaseException:
+            # 這批新增的對照表資料 (_lookup) 和職缺一起復原,快取中的 id 已不存在,需一併清除
+            self.db.rollback()
+            for cache in self._ids.values():
+                cache.clear()
+            raise
+
+    def _upsert_jobs(self, items, run_id):
+        now = datetime.now().isoformat(timespec='seconds')
+        rows, keywords, texts = [], [], {}
+        for item in items:
+            job_id = PersistentSeenJobs.job_number(item.get('jobLink'))
+            if job_id is None:
+                continue
+            company_id = self._lookup('companies', item.get('custName'),
+                                      industry_id=self._lookup('industries', item.get('coIndustryDesc')))
+            values = [item.get(field) for field in JOB_COLUMNS]
+            for i, field in enumerate(JOB_COLUMNS):
+                if field in ('salaryLow', 'salaryHigh', 'applyCnt'):
+                    values[i] = _to_int(values[i])
+            extra = {k: v for k, v in item.items() if k not in JOB_COLUMNS and k not in _NORMALIZED_FIELDS}
+            area_id = self._lookup('areas', item.get('jobAddrNoDesc'))
+            rows.append((job_id, get_job_id(item.get('jobLink')), company_id, area_id, *values,
+                         json.dumps(extra, ensure_ascii=False) if extra else None, run_id, run_id, now, now))
+            for keyword in item.get('search_keywords') or [item.get('search_keyword')]:
+                if keyword:
+                    keywords.append((keyword, job_id, run_id))
+            if self.has_search_index:
+                texts[job_id] = tuple(index_text(item.get(field)) for field in _SEARCH_FIELDS)
+
+        columns = ', '.join(JOB_COLUMNS.values())
+        updates = ', '.join(f"{c} = excluded.{c}" for c in
+                            ['company_id', 'area_id', *JOB_COLUMNS.values(), 'extra', 'last_run_id', 'updated_at'])
+        with self.db:
+            if texts:
+                self._update_search_index(texts)
+            self.db.executemany(
+                f"INSERT INTO jobs (job_id, job_code, company_id, area_id, {columns}, extra,"
+                f" first_run_id, last_run_id, first_seen_at, updated_at)"
+                f" VALUES ({', '.join('?' * (len(JOB_COLUMNS) + 9))})"
+                f" ON CONFLICT (job_id) DO UPDATE SET {updates}",
+                rows,
+            )
+            self.db.executemany(
+                "INSERT INTO job_keywords (keyword, job_id, last_run_id) VALUES (?, ?, ?)"
+                " ON CONFLICT (keyword, job_id) DO UPDATE SET last_run_id = excluded.last_run_id",
+                keywords,
+            )
+        return len(rows)
+
+    def _update_search_index(self, texts):
+        """更新全文檢索索引 (在寫入 jobs 之前呼叫): 內容沒變的職缺不重新索引
+
+        索引不儲存原文 (contentless),刪除舊的索引內容時要提供當初索引的文字,從 jobs 表目前的內容還原。
+        """
+        old = {row[0]: tuple(index_text(value) for value in row[1:]) for row in self.db.execute(
+            f"{_SEARCH_SOURCE} WHERE j.job_id IN (SELECT value FROM json_each(?))", (json.dumps(list(texts)),)
+        )}
+        deletes = [('delete', job_id, *old[job_id]) for job_id, text in texts.items()
+                   if job_id in old and old[job_id] != text]
+        inserts = [(job_id, *text) for job_id, text in texts.items() if old.get(job_id) != text]
+        self.db.executemany(
+            "INSERT INTO job_search (job_search, rowid, job_name, description, company, major)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            deletes,
+        )
+        self.db.executemany(
+            "INSERT INTO job_search (rowid, job_name, description, company, major) VALUES (?, ?, ?, ?, ?)",
+            inserts,
+        )
+
+    def rebuild_search_index(self, batch_size=5000):
+        """重新建立全文檢索索引 (索引不存在時一併建立),回傳索引的職缺數"""
+        self.db.execute("DROP TABLE IF EXISTS job_search")
+        self.db.executescript(SEARCH_SCHEMA)
+        with self.db:
+            cursor = self.db.execute(_SEARCH_SOURCE)
+            count = 0
+            while rows := cursor.fetchmany(batch_size):
+                self.db.executemany(
+                    "INSERT INTO job_search (rowid, job_name, description, company, major) VALUES (?, ?, ?, ?, ?)",
+                    [(row[0], *(index_text(value) for value in row[1:])) for row in rows],
+                )
+                count += len(rows)
+        self.has_search_index = True
+        return count
+
+    def _lookup(self, table, name, industry_id=None):
+        """對照表的 id,不存在時新增 (結果快取在記憶體,寫入失敗復原時由 upsert_jobs 清除)"""
+        if not name:
+            return None
+        cache = self._ids[table]
+        if name not in cache:
+            self.db.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            if industry_id is not None:
+                self.db.execute("UPDATE companies SET industry_id = ? WHERE name = ?", (industry_id, name))
+            cache[name] = self.db.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+        return cache[name]
+
+    # ============================================
+    # 查詢
+    # ============================================
+
+    def latest_run(self):
+        row = self.db.execute("SELECT * FROM runs WHERE status = 'finished' ORDER BY id DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+
+    def count_jobs(self, run_id=None):
+        if run_id is None:
+            return self.db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE last_run_id = ?", (run_id,)).fetchone()[0]
+
+    def salary_columns(self, run_id=None):
+        """薪資統計 (scraper.salary) 用的欄位,run_id 指定時只取該次執行出現的職缺"""
+        sql = (
+            "SELECT j.salary_low, j.salary_high, j.salary_type, i.name, a.name,"
+            " (SELECT group_concat(k.keyword) FROM job_keywords k WHERE k.job_id = j.job_id)"
+            f" FROM jobs j{_JOB_JOINS_SQL}"
+        )
+        rows = self.db.execute(sql + " WHERE j.last_run_id = ?", (run_id,)) if run_id is not None \
+            else self.db.execute(sql)
+        fields = ('salaryLow', 'salaryHigh', 'salaryType', 'coIndustryDesc', 'jobAddrNoDesc', 'search_keywords')
+        columns = dict(zip(fields, map(list, zip(*rows)))) or {field: [] for field in fields}
+        columns['salaryType'] = ['' if t is None else t for t in columns['salaryType']]
+        return columns
+
+    def query_jobs(self, keyword=None, company=None, min_salary=None, since=None, run_id=None, limit=10, offset=0,
+                   text=None):
+        """依條件查詢職缺 (新到舊),回傳和 CSV 欄位名稱相同的 dict 列表
+
+        text 為全文檢索查詢 (語法見 scraper.search),有 text 時依相關程度排序,結果多一個 score 欄位。
+        """
+        sql, params = [_SELECT_JOBS], []
+        where = []
+        if text:
+            if not self.has_search_index:
+                raise ValueError("資料庫沒有全文檢索索引,請先執行 python -m scraper.search --reindex")
+            sql = [_SEARCH_JOBS]
+            where.append("job_search MATCH ?")
+            params.append(to_match_query(text))
+        if keyword:
+            where.append("j.job_id IN (SELECT job_id FROM job_keywords WHERE keyword = ?)")
+            params.append(keyword)
+        if company:
+            where.append("c.name = ?")
+            params.append(company)
+        if min_salary is not None:
+            where.append("j.salary_high >= ?")
+            params.append(int(min_salary))
+        if since:
+            where.append("j.appear_date >= ?")
+            params.append(since)
+        if run_id is not None:
+            where.append("j.last_run_id = ?")
+            params.append(run_id)
+        if where:
+            sql.append("WHERE " + " AND ".join(where))
+        sql.append("ORDER BY job_search.rank" if text else "ORDER BY j.appear_date DESC, j.job_id DESC")
+        sql.append("LIMIT ? OFFSET ?")
+        params += [limit, offset]
+        try:
+            rows = self.db.execute(" ".join(sql), params).fetchall()
+        except sqlite3.OperationalError as e:
+            if not text:
+                raise
+            # 括號不成對、OR 前後沒有詞等
+            raise ValueError(f"查詢語法錯誤: {text!r}") from e
+        return [self._row_to_job(row) for row in rows]
+
+    def _row_to_job(self, row):
+        job = {}
+        for column in row.keys():
+            if column in _COLUMN_FIELDS:
+                job[_COLUMN_FIELDS[column]] = row[column]
+            elif column in ('custName', 'coIndustryDesc', 'jobAddrNoDesc', 'search_keywords', 'score'):
+                job[column] = row[column]
+        if row['extra']:
+            job.update(json.loads(row['extra']))
+        return job
+
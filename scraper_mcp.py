@@ -1,11 +1,14 @@
 from mcp.server.fastmcp import FastMCP
-import subprocess
-import glob
 import os
 import sys
 import pandas as pd
 import json
 
+from scraper.manifest import latest_output
+from scraper.runner import run_crawl
+from scraper.salary import latest_columns, salary_stats
+from scraper.storage import JobDatabase
+
 # 初始化 MCP Server
 mcp = FastMCP("104-Jobs-Scraper")
 
@@ -22,29 +25,20 @@ def run_scraper(keywords: str, pages: int = 1) -> str:
     
     # 確保參數型別正確
     pages = int(pages)
-    
-    # 建構指令
-    # 使用 sys.executable 確保使用當前環境的 Python (即 uv venv)
-    cmd = [
-        sys.executable, "-m", "scrapy", "crawl", "104_ai_jobs",
-        "-a", f"keywords={keywords}",
-        "-a", f"pages={pages}"
-    ]
+    keyword_list = [k.strip() for k in keywords.split(",") if k.strip()]
     
     try:
-        # 執行爬蟲，並捕獲輸出
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        # 在同一個行程內執行爬蟲,直接取得輸出檔,不需要再找最新的 CSV
+        result = run_crawl(keywords=keyword_list, pages=pages, collect_items=False)
         
-        # 尋找最新產生的 CSV 檔案
-        list_of_files = glob.glob('ai_jobs_*.csv') 
-        if not list_of_files:
+        if not result.output or not os.path.exists(result.output):
             return "爬蟲執行完成，但找不到產出的 CSV 檔案。請檢查 logs。"
             
-        latest_file = max(list_of_files, key=os.path.getctime)
-        return f"爬蟲執行成功！\n已產出檔案: {latest_file}\n搜尋條件: {keywords}\n爬取頁數: {pages}"
+        return (f"爬蟲執行成功！\n已產出檔案: {os.path.basename(result.output)}\n"
+                f"職缺數量: {result.item_count}\n搜尋條件: {keywords}\n爬取頁數: {pages}")
         
-    except subprocess.CalledProcessError as e:
-        return f"爬蟲執行失敗:\nError: {e.stderr}"
+    except Exception as e:
+        return f"爬蟲執行失敗:\nError: {e}"
 
 @mcp.tool()
 def get_latest_job_data(limit: int = 10) -> str:
@@ -54,31 +48,99 @@ def get_latest_job_data(limit: int = 10) -> str:
     Args:
         limit: 要返回的資料筆數 (預設 10 筆，避免 context window 爆掉)
     """
-    list_of_files = glob.glob('ai_jobs_*.csv')
-    if not list_of_files:
+    # 有資料庫 (SQLITE_ENABLED=true) 時直接查詢最近一次執行的職缺,不需要讀取整個 CSV
+    db = JobDatabase.open_existing()
+    if db is not None:
+        try:
+            run = db.latest_run()
+            if run is not None:
+                info = {
+                    "database": db.path,
+                    "run": run,
+                    "total_rows": db.count_jobs(run['id']),
+                    "preview_limit": limit,
+                    "data": db.query_jobs(run_id=run['id'], limit=limit),
+                }
+                return json.dumps(info, ensure_ascii=False, indent=2)
+        finally:
+            db.close()
+
+    # 從輸出檔索引取得最新的輸出檔、筆數與預覽,不需要讀取整個 CSV
+    latest = latest_output()
+    if latest is None:
         return "尚未找到任何職缺資料檔案 (ai_jobs_*.csv)。請先執行爬蟲。"
         
-    latest_file = max(list_of_files, key=os.path.getctime)
-    
     try:
-        # 讀取 CSV
-        df = pd.read_csv(latest_file)
-        
-        # 簡單清理或選取重要欄位 (可選)
-        # 假設我們只回傳前 N 筆
-        data = df.head(limit).to_dict(orient='records')
+        if limit <= len(latest['preview']):
+            data = latest['preview'][:limit]
+        elif latest['format'] == 'csv':
+            # 只讀取需要的筆數
+            data = pd.read_csv(latest['path'], nrows=limit).to_dict(orient='records')
+        elif latest['format'] == 'parquet':
+            data = pd.read_parquet(latest['path']).head(limit).to_dict(orient='records')
+        else:
+            data = latest['preview']
         
         info = {
-            "filename": latest_file,
-            "total_rows": len(df),
+            "filename": latest['file'],
+            "total_rows": latest['row_count'],
             "preview_limit": limit,
             "data": data
         }
         
-        return json.dumps(info, ensure_ascii=False, indent=2)
+        return json.dumps(info, ensure_ascii=False, indent=2, default=str)
         
     except Exception as e:
-        return f"讀取檔案失敗 ({latest_file}): {str(e)}"
+        return f"讀取檔案失敗 ({latest['file']}): {str(e)}"
+
+@mcp.tool()
+def search_jobs(keyword: str = "", company: str = "", min_salary: int = 0, since: str = "", limit: int = 10,
+                text: str = "") -> str:
+    """
+    從職缺資料庫查詢職缺 (需啟用 SQLITE_ENABLED=true 後執行過爬蟲)。
+
+    Args:
+        keyword: 搜尋關鍵字 (爬蟲使用的關鍵字，例如 "RPA")
+        text: 全文檢索職稱、描述、公司名稱、科系 (需啟用 SEARCH_INDEX_ENABLED=true)，
+              空白分隔表示都要有，可用 OR 與 "完整片語"，例如 'LLM OR "流程機器人"'，結果依相關程度排序
+        company: 公司名稱 (完全相符)
+        min_salary: 最高薪資至少多少 (例如 60000)
+        since: 刊登日期起始 (例如 "2025-01-01")
+        limit: 要返回的資料筆數 (預設 10 筆)
+    """
+    db = JobDatabase.open_existing()
+    if db is None:
+        return "尚未建立職缺資料庫。請在 .env 設定 SQLITE_ENABLED=true 後執行爬蟲。"
+    try:
+        jobs = db.query_jobs(keyword=keyword or None, company=company or None,
+                             min_salary=min_salary or None, since=since or None, limit=int(limit),
+                             text=text or None)
+        return json.dumps({"count": len(jobs), "data": jobs}, ensure_ascii=False, indent=2)
+    except Exception as e:
+        return f"查詢失敗: {e}"
+    finally:
+        db.close()
+
+@mcp.tool()
+def get_salary_stats(group_by: str = "keyword") -> str:
+    """
+    最近一次爬取的薪資統計：時薪、日薪、年薪都換算成月薪，面議與「XX 元以上」另外計數。
+
+    Args:
+        group_by: 分組方式 "keyword" (關鍵字)、"industry" (產業)、"area" (地區)、"city" (縣市)，空字串表示不分組
+    """
+    source, columns = latest_columns()
+    if columns is None:
+        return "尚未找到任何職缺資料。請先執行爬蟲。"
+    try:
+        stats = salary_stats(columns, group_by or None)
+    except ValueError as e:
+        return str(e)
+    # 直方圖對 LLM 用處不大,只保留百分位數與筆數
+    for group in stats['groups']:
+        group.pop('histogram')
+    return json.dumps({"source": source, "group_by": stats['group_by'], "groups": stats['groups']},
+                      ensure_ascii=False, indent=2)
 
 if __name__ == "__main__":
     # 使用 uv run scraper_mcp.py 執行時，FastMCP 會自動處理 stdio 連線